@@ -98,6 +98,65 @@ DATABASES = {
 }
 
 
+# Cache (dashboard response cache, see garbageData/response_cache.py)
+# CACHE_BACKEND: locmem (per process), file (shared by workers on one host) or redis
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHE_LOCATIONS = {
+    'locmem': 'garbagedata',
+    'file': str(BASE_DIR / '.cache'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_LOCATIONS[CACHE_BACKEND]),
+    }
+}
+
+# Seconds a cached heatmap/route response may be served (predictions drift with time)
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=300, cast=int)
+
+# Local hour trucks start; plan_tomorrow projects fill levels to the next shift start
+SHIFT_START_HOUR = config('SHIFT_START_HOUR', default=6, cast=int)
+
+# Time budget of the local route solver per plan (see garbageData/vrp.py)
+ROUTE_SOLVER_SECONDS = config('ROUTE_SOLVER_SECONDS', default=2.0, cast=float)
+
+# Plans collect the bins projected to overflow within this many days of the target time
+ROUTE_HORIZON_DAYS = config('ROUTE_HORIZON_DAYS', default=1.0, cast=float)
+
+# Fleet plans: total solver time, and worker processes (0 = the CPUs available)
+FLEET_PLAN_SECONDS = config('FLEET_PLAN_SECONDS', default=10.0, cast=float)
+ROUTE_SOLVER_WORKERS = config('ROUTE_SOLVER_WORKERS', default=0, cast=int)
+
+# openrouteservice instance (point it at a self-hosted one to avoid the public API limits)
+ORS_BASE_URL = config('ORS_BASE_URL', default='https://api.openrouteservice.org')
+# Seconds per ORS call, parallel route requests, and total wait for all route lines
+ORS_TIMEOUT = config('ORS_TIMEOUT', default=10, cast=int)
+ORS_MAX_CONCURRENCY = config('ORS_MAX_CONCURRENCY', default=4, cast=int)
+ORS_DEADLINE = config('ORS_DEADLINE', default=15, cast=int)
+
+# Directions cache limits, least recently used entries go first (see garbageData/directions_cache.py)
+DIRECTIONS_CACHE_MAX_ENTRIES = config('DIRECTIONS_CACHE_MAX_ENTRIES', default=5000, cast=int)
+DIRECTIONS_CACHE_MAX_MB = config('DIRECTIONS_CACHE_MAX_MB', default=100, cast=int)
+
+# Precomputed travel costs (see garbageData/distance_matrix.py, build_distance_matrix)
+# DISTANCE_MATRIX_PROVIDER: haversine (straight line) or ors (road network via ORS_BASE_URL)
+DISTANCE_MATRIX_DIR = config('DISTANCE_MATRIX_DIR', default=str(BASE_DIR / '.matrix'))
+DISTANCE_MATRIX_PROVIDER = config('DISTANCE_MATRIX_PROVIDER', default='haversine')
+
+# Columnar fill history for offline analysis (see garbageData/snapshots.py, snapshot_history)
+SNAPSHOT_DIR = config('SNAPSHOT_DIR', default=str(BASE_DIR / '.snapshots'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
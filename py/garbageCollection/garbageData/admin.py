@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import TrashCan, FillRecord, APIKey
+from .models import (TrashCan, FillRecord, BinPrediction, DailyBinSummary, RoutePlan, RouteJob, DirectionsCache,
+                     APIKey, Truck)
+from . import api_keys
 
 @admin.register(TrashCan)
 class TrashCanAdmin(admin.ModelAdmin):
@@ -25,11 +27,75 @@ class TrashCanAdmin(admin.ModelAdmin):
 @admin.register(FillRecord)
 class FillRecordAdmin(admin.ModelAdmin):
     list_display = ('trashcan', 'fill_level', 'source', 'timestamp')
-    list_filter = ('source', 'timestamp', 'trashcan')
+    # No trashcan filter: it lists every bin on each page load (search by bin id instead,
+    # or use the export_records command / /api/export/records/ for bulk history)
+    list_filter = ('source', 'timestamp')
+    list_select_related = ('trashcan',)
     search_fields = ('trashcan__id', 'trashcan__nfc_uid')
     ordering = ('-timestamp',)
     readonly_fields = ('timestamp',)
 
+@admin.register(BinPrediction)
+class BinPredictionAdmin(admin.ModelAdmin):
+    list_display = ('trashcan', 'daily_rate', 'baseline', 'spike_state', 'last_reading', 'last_reading_at', 'updated_at')
+    list_filter = ('spike_state',)
+    search_fields = ('trashcan__id', 'trashcan__nfc_uid')
+    ordering = ('trashcan',)
+    readonly_fields = ('daily_rate', 'baseline', 'spike_state', 'last_reading', 'last_reading_at', 'updated_at')
+
+@admin.register(DailyBinSummary)
+class DailyBinSummaryAdmin(admin.ModelAdmin):
+    list_display = ('trashcan', 'date', 'max_fill', 'collection_count', 'ai_reading_count', 'cycle_rate', 'overflow')
+    list_filter = ('overflow', 'date')
+    search_fields = ('trashcan__id', 'trashcan__nfc_uid')
+    ordering = ('-date', 'trashcan')
+    date_hierarchy = 'date'
+    readonly_fields = ('max_fill', 'collection_count', 'ai_reading_count', 'record_count', 'cycle_rate',
+                       'overflow', 'last_record_id', 'updated_at')
+
+@admin.register(RoutePlan)
+class RoutePlanAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'created_at', 'target_time', 'truck_capacity', 'trucks', 'route_count',
+                    'total_bins', 'total_distance', 'expected_overflows', 'missed_overflows')
+    list_filter = ('kind',)
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'kind', 'target_time', 'truck_capacity', 'trucks', 'total_bins',
+                       'total_distance', 'expected_overflows', 'missed_overflows', 'fleet', 'routes')
+    
+    def route_count(self, obj):
+        return len(obj.routes)
+    route_count.short_description = "Routes"
+
+@admin.register(Truck)
+class TruckAdmin(admin.ModelAdmin):
+    list_display = ('name', 'capacity', 'shift_start', 'shift_end', 'active')
+    list_filter = ('active',)
+    list_editable = ('active',)
+    search_fields = ('name',)
+    ordering = ('name',)
+
+@admin.register(RouteJob)
+class RouteJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'truck_capacity', 'fleet', 'plan', 'created_at', 'started_at', 'finished_at', 'worker')
+    list_filter = ('status', 'fleet')
+    ordering = ('-created_at',)
+    readonly_fields = ('plan', 'error', 'worker', 'created_at', 'started_at', 'finished_at')
+
+@admin.register(DirectionsCache)
+class DirectionsCacheAdmin(admin.ModelAdmin):
+    list_display = ('key_preview', 'profile', 'point_count', 'hits', 'size_bytes', 'last_used', 'created_at')
+    list_filter = ('profile',)
+    ordering = ('-last_used',)
+    readonly_fields = ('key', 'profile', 'coordinates', 'geometry', 'size_bytes', 'hits', 'created_at', 'last_used')
+    
+    def key_preview(self, obj):
+        return f"{obj.key[:12]}..."
+    key_preview.short_description = "Key"
+    
+    def point_count(self, obj):
+        return len(obj.coordinates)
+    point_count.short_description = "Points"
+
 @admin.register(APIKey)
 class APIKeyAdmin(admin.ModelAdmin):
     list_display = ('device_name', 'is_active', 'created_at', 'last_used', 'key_preview')
@@ -65,12 +131,14 @@ class APIKeyAdmin(admin.ModelAdmin):
     def activate_keys(self, request, queryset):
         """Bulk activate API keys"""
         updated = queryset.update(is_active=True)
+        api_keys.invalidate()  # update() sends no post_save
         self.message_user(request, f"✅ Activated {updated} API key(s)")
     activate_keys.short_description = "✅ Activate selected API keys"
     
     def deactivate_keys(self, request, queryset):
         """Bulk deactivate API keys"""
         updated = queryset.update(is_active=False)
+        api_keys.invalidate()
         self.message_user(request, f"❌ Deactivated {updated} API key(s)")
     deactivate_keys.short_description = "❌ Deactivate selected API keys"
 
@@ -0,0 +1,88 @@
+"""
+In-process cache for API key authentication
+
+Active keys are loaded into a dict (one query) and reused for KEY_CACHE_TTL
+seconds, so authenticating a request is a dict lookup. Saving or deleting
+a key and the admin activate/deactivate actions invalidate the cache of the
+current process right away; other worker processes pick the change up
+within the TTL.
+
+last_used is only recorded in memory and written for all keys at once
+every LAST_USED_FLUSH_SECONDS, instead of an UPDATE per request.
+"""
+import atexit
+import threading
+import time
+from collections import namedtuple
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import APIKey
+
+KEY_CACHE_TTL = 60
+LAST_USED_FLUSH_SECONDS = 60
+
+ActiveKey = namedtuple('ActiveKey', ['id', 'device_name'])
+
+_lock = threading.Lock()
+_active_keys = {}
+_loaded_at = None
+_last_used = {}
+_last_flush = time.monotonic()
+
+
+def get_active_key(key):
+    """ActiveKey for a valid, active key string, else None"""
+    global _active_keys, _loaded_at
+    with _lock:
+        if _loaded_at is None or time.monotonic() - _loaded_at > KEY_CACHE_TTL:
+            _active_keys = {
+                value: ActiveKey(key_id, device_name)
+                for value, key_id, device_name in APIKey.objects.filter(is_active=True)
+                .values_list('key', 'id', 'device_name')
+            }
+            _loaded_at = time.monotonic()
+        return _active_keys.get(key)
+
+
+def invalidate():
+    """Reload the active keys on the next request"""
+    global _loaded_at
+    with _lock:
+        _loaded_at = None
+
+
+def touch(active_key):
+    """Remember that a key was used; flushed to the database in bulk"""
+    with _lock:
+        _last_used[active_key.id] = timezone.now()
+        due = time.monotonic() - _last_flush > LAST_USED_FLUSH_SECONDS
+    if due:
+        flush_last_used()
+
+
+def flush_last_used():
+    """Write the pending last_used timestamps (one bulk UPDATE)"""
+    global _last_used, _last_flush
+    with _lock:
+        pending, _last_used = _last_used, {}
+        _last_flush = time.monotonic()
+    if pending:
+        APIKey.objects.bulk_update(
+            [APIKey(id=key_id, last_used=last_used) for key_id, last_used in pending.items()],
+            ['last_used']
+        )
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        flush_last_used()
+    except Exception:
+        pass  # Database may already be gone at interpreter shutdown
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def _api_key_changed(sender, **kwargs):
+    invalidate()
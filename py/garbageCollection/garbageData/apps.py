@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GarbagedataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'garbageData'
+
+    def ready(self):
+        # Connect the cache invalidation signals
+        from . import api_keys, response_cache, selection  # noqa: F401
@@ -0,0 +1,319 @@
+"""
+Backtesting of fill-level predictors against the stored history
+
+The replay walks every bin's FillRecord stream in time order and, at each
+AI reading, asks a predictor what fill it expected at that moment, using
+only the records before it (the same question api_update_fill_level asks
+before it stores a scan). The bin counts as emptied at its latest real
+(AI or manual) 0% reading, which is what mark_as_emptied and
+generate_realistic_data leave behind; readings of a bin with no emptying
+in the loaded history are skipped. 0% readings are emptyings, not scans,
+so they aren't predicted.
+
+Reported per predictor:
+- MAE and bias (mean of predicted - actual, negative = under-predicts)
+- Spike recovery: a reading is a spike when the fill rate it shows since
+  the last emptying is over SPIKE_FACTOR x the bin's median. After each
+  run of spike readings, the readings it takes until the prediction is
+  within RECOVERED_ERROR points again (spikes are found from the actual
+  readings, so every predictor is scored on the same events)
+- Throughput in predictions per second (prediction time only)
+
+Predictors are pluggable: subclass Predictor and implement predict() for
+one reading at a time, or predict_batch() to predict the whole replay at
+once with NumPy. HybridPredictor is the production algorithm
+(get_predicted_fill_level), vectorized on the fleet kernel.
+
+Records come from the columnar snapshot (snapshot_history) when there is
+one, or straight from the database.
+"""
+from collections import namedtuple
+from datetime import timedelta
+import time
+import numpy as np
+from django.utils.module_loading import import_string
+from . import snapshots
+from .fill_rate import (analyze_fill_history, analyze_fleet_arrays, predict_fill_level, from_epoch_us,
+                        DEFAULT_FILL_RATE, LOOKBACK_DAYS, READING_BLEND_HOURS, SOURCE_CODES)
+from .models import FillRecord
+
+# History loaded before the replay starts: the lookback window plus the
+# longest cycle the algorithm accepts, so the first readings have an emptying
+HISTORY_DAYS = LOOKBACK_DAYS + 20
+# Spike: fill rate over SPIKE_FACTOR x the bin's median (the algorithm's threshold)
+SPIKE_FACTOR = 1.5
+# Prediction error (points) that counts as recovered after a spike
+RECOVERED_ERROR = 10
+# Readings predicted per kernel call (bounds the memory of HybridPredictor)
+QUERY_CHUNK = 20000
+
+DAY_US = 24 * 3600 * 10**6
+
+# queries: indexes of the predicted readings in `records`; first: index of
+# the first record of each query's bin; last_emptied: epoch microseconds
+Replay = namedtuple('Replay', ['records', 'queries', 'first', 'last_emptied', 'skipped'])
+
+BacktestResult = namedtuple('BacktestResult', [
+    'predictor', 'predictions', 'skipped', 'mae', 'bias', 'spike_readings', 'spike_mae',
+    'spike_episodes', 'recovered', 'recovery_readings', 'seconds', 'per_second',
+])
+
+
+class Predictor:
+    """
+    Fill-level predictor under test.
+
+    predict() gets one reading's bin history before it, as arrays
+    (timestamps in epoch microseconds, fill levels, SOURCE_CODES) oldest
+    first, the emptying time and the reading time, and returns the
+    predicted fill. Override predict_batch() instead for a vectorized
+    version over the whole replay.
+    """
+    name = 'predictor'
+
+    def predict(self, timestamps, levels, sources, last_emptied, now):
+        raise NotImplementedError
+
+    def predict_batch(self, replay):
+        """Predicted fill for every query of the replay (float array)"""
+        timestamps = replay.records['timestamp']
+        levels = replay.records['fill_level']
+        sources = replay.records['source']
+        return np.array([
+            self.predict(timestamps[first:i], levels[first:i], sources[first:i], int(last_emptied),
+                         int(timestamps[i]))
+            for i, first, last_emptied in zip(replay.queries.tolist(), replay.first.tolist(),
+                                              replay.last_emptied.tolist())
+        ], dtype=np.float64)
+
+
+class HybridPredictor(Predictor):
+    """The production algorithm: self-correcting hybrid rate, blended with a recent reading"""
+    name = 'hybrid'
+
+    def predict(self, timestamps, levels, sources, last_emptied, now):
+        window = timestamps >= now - LOOKBACK_DAYS * DAY_US
+        records = [(from_epoch_us(t), level) for t, level in zip(timestamps[window].tolist(),
+                                                                 levels[window].tolist())]
+        rate = analyze_fill_history(records, from_epoch_us(now)).daily_rate
+        real = (sources != SOURCE_CODES['predicted']) & (timestamps >= now - READING_BLEND_HOURS * 3600 * 10**6)
+        latest = int(levels[real][-1]) if real.any() else None
+        return predict_fill_level(from_epoch_us(last_emptied), rate, latest, from_epoch_us(now))
+
+    def predict_batch(self, replay):
+        """
+        Every reading's lookback window becomes its own segment for
+        analyze_fleet_arrays, with timestamps made relative to the reading
+        so one call covers readings at different times (now = 0).
+        """
+        predicted = np.empty(len(replay.queries))
+        for lo in range(0, len(replay.queries), QUERY_CHUNK):
+            part = slice(lo, lo + QUERY_CHUNK)
+            predicted[part] = self.predict_chunk(replay.records, replay.queries[part], replay.last_emptied[part])
+        return predicted
+
+    def predict_chunk(self, records, queries, last_emptied):
+        bin_ids = records['trashcan_id']
+        timestamps = records['timestamp']
+        now = timestamps[queries]
+        start = window_starts(bin_ids, timestamps, queries, now - LOOKBACK_DAYS * DAY_US)
+
+        # Gather the windows [start, query) one after another
+        lengths = queries - start
+        segment = np.repeat(np.arange(len(queries)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        gather = np.repeat(start, lengths) + offsets
+        analysis = analyze_fleet_arrays(segment, timestamps[gather] - now[segment], records['fill_level'][gather],
+                                        records['source'][gather], 0)
+
+        rate = np.full(len(queries), DEFAULT_FILL_RATE)
+        rate[analysis.bin_ids] = analysis.daily_rate
+        reading = np.full(len(queries), np.nan)
+        reading[analysis.bin_ids] = analysis.last_reading
+
+        # predict_fill_level, with Python's round() so results match it to the digit
+        days = (now - last_emptied) / 1e6 / 3600 / 24
+        predicted = days * rate
+        blended = ~np.isnan(reading)
+        predicted[blended] = predicted[blended] * 0.5 + reading[blended] * 0.5
+        return np.array([max(0, round(value, 1)) for value in predicted.tolist()])
+
+
+class ConstantRatePredictor(Predictor):
+    """Baseline: the default fill rate since the last emptying, no history"""
+    name = 'constant'
+
+    def __init__(self, daily_rate=DEFAULT_FILL_RATE):
+        self.daily_rate = daily_rate
+
+    def predict(self, timestamps, levels, sources, last_emptied, now):
+        return max(0, round((now - last_emptied) / DAY_US * self.daily_rate, 1))
+
+    def predict_batch(self, replay):
+        days = (replay.records['timestamp'][replay.queries] - replay.last_emptied) / DAY_US
+        return np.array([max(0, round(value, 1)) for value in (days * self.daily_rate).tolist()])
+
+
+PREDICTORS = {predictor.name: predictor for predictor in (HybridPredictor, ConstantRatePredictor)}
+
+
+def get_predictor(name):
+    """Predictor instance by registered name or dotted path to a Predictor class"""
+    if name in PREDICTORS:
+        return PREDICTORS[name]()
+    try:
+        predictor = import_string(name)
+    except ImportError:
+        raise ValueError(f"Unknown predictor: {name} (choose from {', '.join(PREDICTORS)} or a dotted path)")
+    return predictor()
+
+
+def window_starts(bin_ids, timestamps, queries, bounds):
+    """
+    For each query, the index of its bin's first record with timestamp >= bound.
+    Records are sorted by (bin, timestamp); the bounds are sorted in with them
+    (before equal timestamps) and the records ahead of each bound counted.
+    """
+    n = len(bin_ids)
+    keys_bin = np.concatenate([bin_ids, bin_ids[queries]])
+    keys_time = np.concatenate([timestamps, bounds])
+    is_bound = np.concatenate([np.zeros(n, dtype=bool), np.ones(len(queries), dtype=bool)])
+    order = np.lexsort((~is_bound, keys_time, keys_bin))
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+    bounds_ahead = np.cumsum(is_bound[order])
+    at = position[n:]
+    return at - (bounds_ahead[at] - 1)
+
+
+def load_records(since=None, until=None, bins=None, source='auto'):
+    """
+    Records from HISTORY_DAYS before `since` up to `until`, sorted by
+    (trashcan_id, timestamp, id), in the snapshot layout. source is
+    'snapshot', 'db' or 'auto' (the snapshot if there is one).
+    Returns (records, source used).
+    """
+    history_from = since - timedelta(days=HISTORY_DAYS) if since else None
+    snapshot = snapshots.load_snapshot() if source in ('auto', 'snapshot') else None
+    if source == 'snapshot' and snapshot is None:
+        raise ValueError("No snapshot yet (run snapshot_history)")
+    if snapshot is not None:
+        return snapshot.records(history_from, until, bins), 'snapshot'
+
+    records = FillRecord.objects.all()
+    if history_from:
+        records = records.filter(timestamp__gte=history_from)
+    if until:
+        records = records.filter(timestamp__lt=until)
+    if bins:
+        records = records.filter(trashcan_id__in=bins)
+    rows = records.order_by('trashcan_id', 'timestamp', 'id').values_list(
+        'id', 'trashcan_id', 'timestamp', 'fill_level', 'source'
+    ).iterator(chunk_size=snapshots.CHUNK_SIZE)
+    predicted = SOURCE_CODES['predicted']
+    parts, chunk = [], []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == snapshots.CHUNK_SIZE:
+            parts.append(snapshots.pack(chunk, predicted))
+            chunk = []
+    parts.append(snapshots.pack(chunk, predicted))
+    return {column: np.concatenate([part[column] for part in parts]) for column in snapshots.RECORD_COLUMNS}, 'db'
+
+
+def build_replay(records, since=None):
+    """The AI readings at or after `since` (epoch microseconds) to predict, with their bin's emptying"""
+    bin_ids = records['trashcan_id']
+    timestamps = records['timestamp']
+    n = len(bin_ids)
+    index = np.arange(n)
+    is_first = np.ones(n, dtype=bool)
+    is_first[1:] = bin_ids[1:] != bin_ids[:-1]
+    first_of = np.maximum.accumulate(np.where(is_first, index, 0))
+
+    # Latest emptying (real 0% reading) strictly before each record
+    emptied = (records['fill_level'] == 0) & (records['source'] != SOURCE_CODES['predicted'])
+    last = np.maximum.accumulate(np.where(emptied, index, -1))
+    before = np.full(n, -1)
+    before[1:] = last[:-1]
+    before = np.where(before >= first_of, before, -1)
+
+    readings = (records['source'] == SOURCE_CODES['ai']) & ~emptied
+    if since is not None:
+        readings &= timestamps >= since
+    queries = np.flatnonzero(readings & (before >= 0))
+    return Replay(records, queries, first_of[queries], timestamps[before[queries]],
+                  int(readings.sum()) - len(queries))
+
+
+def spike_recovery(replay, errors):
+    """(spike reading mask, episodes with readings after them, recovered, mean readings to recover)"""
+    queries = replay.queries
+    actual = replay.records['fill_level'][queries].astype(np.float64)
+    days = (replay.records['timestamp'][queries] - replay.last_emptied) / DAY_US
+    _, group = np.unique(replay.records['trashcan_id'][queries], return_inverse=True)
+    m = len(queries)
+
+    # Fill rate each reading shows, against the median of its bin's readings
+    valid = np.flatnonzero(days >= 0.5)  # Same shortest cycle as the algorithm
+    rate = actual[valid] / days[valid]
+    counts = np.bincount(group[valid], minlength=group.max() + 1 if m else 0)
+    starts = np.cumsum(counts) - counts
+    sorted_rates = rate[np.lexsort((rate, group[valid]))]
+    median = np.full(len(counts), np.inf)
+    has = counts > 0
+    median[has] = sorted_rates[starts[has] + counts[has] // 2]
+    spike = np.zeros(m, dtype=bool)
+    spike[valid] = rate > SPIKE_FACTOR * median[group[valid]]
+
+    # Episodes: runs of spike readings; recovery counts from the first reading after the run
+    same_bin = np.zeros(m, dtype=bool)
+    same_bin[1:] = group[1:] == group[:-1]
+    episodes = np.flatnonzero(spike & ~(np.roll(spike, 1) & same_bin))
+    position = np.arange(m)
+    after = np.minimum.accumulate(np.where(~spike, position, m)[::-1])[::-1]
+    close = np.minimum.accumulate(np.where(~spike & (np.abs(errors) <= RECOVERED_ERROR), position, m)[::-1])[::-1]
+
+    start = np.append(after, m)[episodes]
+    followed = (start < m) & (group[np.minimum(start, m - 1)] == group[episodes])
+    start = start[followed]
+    end = np.append(close, m)[start]
+    recovered = (end < m) & (group[np.minimum(end, m - 1)] == group[start])
+    readings = end[recovered] - start[recovered] + 1
+    return spike, int(followed.sum()), int(recovered.sum()), float(readings.mean()) if len(readings) else None
+
+
+def run_backtest(predictor, replay):
+    """Replay the readings through one predictor and score it (BacktestResult)"""
+    start = time.perf_counter()
+    predicted = np.asarray(predictor.predict_batch(replay), dtype=np.float64)
+    seconds = time.perf_counter() - start
+
+    actual = replay.records['fill_level'][replay.queries].astype(np.float64)
+    errors = predicted - actual
+    count = len(errors)
+    spike, episodes, recovered, recovery_readings = spike_recovery(replay, errors)
+    return BacktestResult(
+        predictor=predictor.name,
+        predictions=count,
+        skipped=replay.skipped,
+        mae=float(np.abs(errors).mean()) if count else None,
+        bias=float(errors.mean()) if count else None,
+        spike_readings=int(spike.sum()),
+        spike_mae=float(np.abs(errors[spike]).mean()) if spike.any() else None,
+        spike_episodes=episodes,
+        recovered=recovered,
+        recovery_readings=recovery_readings,
+        seconds=seconds,
+        per_second=count / seconds if seconds > 0 else None,
+    )
+
+
+def check_parity(predictor, replay, sample):
+    """Queries (up to `sample`) where predict_batch and predict() disagree: [(record index, batch, single)]"""
+    subset = replay._replace(queries=replay.queries[:sample], first=replay.first[:sample],
+                             last_emptied=replay.last_emptied[:sample])
+    batch = predictor.predict_batch(subset)
+    single = Predictor.predict_batch(predictor, subset)
+    differ = np.flatnonzero(~np.isclose(batch, single, rtol=0, atol=1e-9))
+    return [(int(subset.queries[i]), float(batch[i]), float(single[i])) for i in differ]
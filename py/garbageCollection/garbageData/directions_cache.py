@@ -0,0 +1,107 @@
+"""
+Persistent cache of ORS directions
+
+The same ordered stop sequence (and the depot/landfill legs) comes back on
+many route plans, so directions GeoJSON is stored in DirectionsCache,
+keyed by a sha256 of the profile and the coordinates rounded to
+COORD_DECIMALS (~1 m). Lookups and stores are batched per plan (one
+SELECT, one UPDATE of last_used/hits, one INSERT), and the pool threads
+that call ORS never touch the database.
+
+Entries beyond settings.DIRECTIONS_CACHE_MAX_ENTRIES or
+DIRECTIONS_CACHE_MAX_MB are evicted least recently used first. Hit and
+miss counters live in the Django cache (shared by workers with the file or
+redis backend), see stats().
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from .models import DirectionsCache
+
+COORD_DECIMALS = 5
+COUNTER_KEYS = {'hits': 'garbagedata:directions_cache:hits', 'misses': 'garbagedata:directions_cache:misses'}
+
+
+def rounded(coordinates):
+    return [[round(lon, COORD_DECIMALS), round(lat, COORD_DECIMALS)] for lon, lat in coordinates]
+
+
+def cache_key(coordinates, profile):
+    """Content address of a directions request"""
+    payload = json.dumps([profile, rounded(coordinates)], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def count(counter, amount):
+    if not amount:
+        return
+    try:
+        cache.incr(COUNTER_KEYS[counter], amount)
+    except ValueError:  # Not set yet (or evicted)
+        cache.add(COUNTER_KEYS[counter], 0, timeout=None)
+        cache.incr(COUNTER_KEYS[counter], amount)
+
+
+def lookup(keys):
+    """{key: geometry} for the cached keys; counts hits and misses and marks hits as used"""
+    unique = set(keys)
+    found = dict(DirectionsCache.objects.filter(key__in=unique).values_list('key', 'geometry'))
+    if found:
+        DirectionsCache.objects.filter(key__in=list(found)).update(last_used=timezone.now(), hits=F('hits') + 1)
+    count('hits', sum(1 for key in keys if key in found))
+    count('misses', sum(1 for key in keys if key not in found))
+    return found
+
+
+def store(entries, profile):
+    """Save {key: (coordinates, geometry)} and evict old entries if over the limits"""
+    if not entries:
+        return
+    DirectionsCache.objects.bulk_create([
+        DirectionsCache(
+            key=key,
+            profile=profile,
+            coordinates=rounded(coordinates),
+            geometry=geometry,
+            size_bytes=len(json.dumps(geometry)),
+        )
+        for key, (coordinates, geometry) in entries.items()
+    ], ignore_conflicts=True)  # Another worker may have stored the same route meanwhile
+    evict()
+
+
+def evict():
+    """Delete least recently used entries until within the entry and size limits; returns how many"""
+    max_entries = settings.DIRECTIONS_CACHE_MAX_ENTRIES
+    max_bytes = settings.DIRECTIONS_CACHE_MAX_MB * 1024 * 1024
+    totals = DirectionsCache.objects.aggregate(entries=Count('key'), size=Sum('size_bytes'))
+    entries, size = totals['entries'], totals['size'] or 0
+    if entries <= max_entries and size <= max_bytes:
+        return 0
+
+    doomed = []
+    for key, size_bytes in DirectionsCache.objects.order_by('last_used').values_list('key', 'size_bytes').iterator():
+        if entries <= max_entries and size <= max_bytes:
+            break
+        doomed.append(key)
+        entries -= 1
+        size -= size_bytes
+    for i in range(0, len(doomed), 500):
+        DirectionsCache.objects.filter(key__in=doomed[i:i + 500]).delete()
+    return len(doomed)
+
+
+def stats():
+    totals = DirectionsCache.objects.aggregate(entries=Count('key'), size=Sum('size_bytes'))
+    hits = cache.get(COUNTER_KEYS['hits'], 0)
+    misses = cache.get(COUNTER_KEYS['misses'], 0)
+    return {
+        'entries': totals['entries'],
+        'size_mb': round((totals['size'] or 0) / 1024 / 1024, 2),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+    }
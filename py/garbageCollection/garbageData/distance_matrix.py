@@ -0,0 +1,232 @@
+"""
+Persistent distance/duration matrix between bins, depot and landfill
+
+Bins are placed once (initialfill or the admin), so travel costs between
+them are computed ahead of time by the build_distance_matrix command and
+stored as float32 .npy files next to an index.json listing the nodes and
+their coordinates. Readers memory-map the arrays, so a lookup is an array
+index and only the rows a route plan touches are read from disk.
+
+Updates are incremental: surviving nodes keep their rows and columns, and
+only bins that were added or moved are sent to the provider. Each build
+writes new versioned files and switches index.json last, so a reader never
+sees a half-written matrix.
+
+Providers:
+- haversine: straight-line metres, duration at AVERAGE_SPEED_KMH (no network)
+- ors: road distances from an openrouteservice instance (settings.ORS_BASE_URL,
+  e.g. a self-hosted one), requested in chunks
+"""
+import json
+import os
+import numpy as np
+from django.conf import settings
+from .spatial import EARTH_RADIUS_M
+
+INDEX_FILE = 'index.json'
+METRICS = ('distance', 'duration')
+
+AVERAGE_SPEED_KMH = 30
+# Rows copied/computed at once during a build / elements per ORS request
+BLOCK_ROWS = 256
+ORS_MAX_ELEMENTS = 3500
+
+
+class HaversineProvider:
+    name = 'haversine'
+
+    def table(self, sources, destinations):
+        """(distance m, duration s) arrays of shape (len(sources), len(destinations))"""
+        src = np.radians(np.asarray(sources, dtype=float).reshape(-1, 2))
+        dst = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+        lat1, lon1 = src[:, :1], src[:, 1:]
+        lat2, lon2 = dst[:, 0][None, :], dst[:, 1][None, :]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distance = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        return distance, distance / (AVERAGE_SPEED_KMH / 3.6)
+
+
+class ORSProvider:
+    name = 'ors'
+
+    def __init__(self, client, profile='driving-car'):
+        self.client = client
+        self.profile = profile
+        self.fallback = HaversineProvider()
+
+    def table(self, sources, destinations):
+        distance = np.empty((len(sources), len(destinations)))
+        duration = np.empty_like(distance)
+        dst_step = min(len(destinations), ORS_MAX_ELEMENTS)
+        src_step = max(1, ORS_MAX_ELEMENTS // dst_step)
+
+        for i in range(0, len(sources), src_step):
+            for j in range(0, len(destinations), dst_step):
+                src, dst = sources[i:i + src_step], destinations[j:j + dst_step]
+                response = self.client.distance_matrix(
+                    locations=[[lon, lat] for lat, lon in src + dst],
+                    profile=self.profile,
+                    sources=list(range(len(src))),
+                    destinations=list(range(len(src), len(src) + len(dst))),
+                    metrics=list(METRICS),
+                )
+                block_distance = np.array(response['distances'], dtype=float)
+                block_duration = np.array(response['durations'], dtype=float)
+                # Unroutable pairs come back as null: use the straight line instead
+                missing = np.isnan(block_distance) | np.isnan(block_duration)
+                if missing.any():
+                    line_distance, line_duration = self.fallback.table(src, dst)
+                    block_distance[missing] = line_distance[missing]
+                    block_duration[missing] = line_duration[missing]
+                distance[i:i + src_step, j:j + dst_step] = block_distance
+                duration[i:i + src_step, j:j + dst_step] = block_duration
+        return distance, duration
+
+
+def get_provider(name):
+    if name == 'haversine':
+        return HaversineProvider()
+    if name == 'ors':
+        from .routing import get_ors_client
+        client = get_ors_client()
+        if client is None:
+            raise ValueError("ORS provider needs an openrouteservice client (API_KEY / ORS_BASE_URL)")
+        return ORSProvider(client)
+    raise ValueError(f"Unknown distance matrix provider: {name}")
+
+
+class DistanceMatrix:
+    """Read-only view of a stored matrix (arrays are memory-mapped)"""
+
+    def __init__(self, directory, index):
+        self.directory = directory
+        self.index = index
+        self.provider = index['provider']
+        self.keys = [node[0] for node in index['nodes']]
+        self.coords = {node[0]: (node[1], node[2]) for node in index['nodes']}
+        self.position = {key: pos for pos, key in enumerate(self.keys)}
+        self.arrays = {
+            metric: np.load(os.path.join(directory, index['files'][metric]), mmap_mode='r')
+            for metric in METRICS
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    def covers(self, points):
+        """True if every (key, lat, lon) is stored with the same coordinates"""
+        return all(same_place(self.coords.get(key), (lat, lon)) for key, lat, lon in points)
+
+    def lookup(self, a, b, metric='distance'):
+        return float(self.arrays[metric][self.position[a], self.position[b]])
+
+    def submatrix(self, keys, metric='distance'):
+        """Costs between the given nodes, in that order, as a float64 array"""
+        positions = np.array([self.position[key] for key in keys])
+        return np.asarray(self.arrays[metric][np.ix_(positions, positions)], dtype=float)
+
+
+def same_place(stored, current):
+    return stored is not None and abs(stored[0] - current[0]) < 1e-7 and abs(stored[1] - current[1]) < 1e-7
+
+
+def matrix_dir():
+    return str(settings.DISTANCE_MATRIX_DIR)
+
+
+_loaded = {'mtime': None, 'matrix': None}
+
+
+def load_matrix(directory=None):
+    """The stored DistanceMatrix (reloaded when a build replaced it), None if there is none"""
+    directory = directory or matrix_dir()
+    path = os.path.join(directory, INDEX_FILE)
+    try:
+        mtime = (directory, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    if _loaded['mtime'] != mtime:
+        with open(path) as f:
+            _loaded['matrix'] = DistanceMatrix(directory, json.load(f))
+        _loaded['mtime'] = mtime
+    return _loaded['matrix']
+
+
+def update_matrix(points, provider, full=False, directory=None):
+    """
+    Bring the stored matrix in line with points [(key, lat, lon)]: keep the
+    costs of unchanged nodes, compute rows and columns of new or moved ones.
+
+    Returns (nodes, computed, removed).
+    """
+    directory = directory or matrix_dir()
+    os.makedirs(directory, exist_ok=True)
+    previous = old = load_matrix(directory)
+    if old is not None and (full or old.provider != provider.name):
+        old = None
+
+    # Surviving nodes keep their order, new ones are appended
+    current = {key: (lat, lon) for key, lat, lon in points}
+    keys = [key for key in old.keys if key in current] if old else []
+    removed = len(old) - len(keys) if old else 0
+    known = set(keys)
+    keys += [key for key, _, _ in points if key not in known]
+    kept = [key for key in keys if old and same_place(old.coords.get(key), current[key])]
+    kept_set = set(kept)
+    changed = [key for key in keys if key not in kept_set]
+
+    if old is not None and not changed and not removed:
+        return len(keys), 0, 0
+
+    version = (previous.index['version'] + 1) if previous else 1
+    files = {metric: f'{metric}-{version}.npy' for metric in METRICS}
+    n = len(keys)
+    position = {key: pos for pos, key in enumerate(keys)}
+    arrays = {
+        metric: np.lib.format.open_memmap(os.path.join(directory, files[metric]), mode='w+',
+                                          dtype=np.float32, shape=(n, n))
+        for metric in METRICS
+    }
+
+    # Copy unchanged costs block by block
+    if kept:
+        new_pos = np.array([position[key] for key in kept])
+        old_pos = np.array([old.position[key] for key in kept])
+        for start in range(0, len(kept), BLOCK_ROWS):
+            rows = slice(start, start + BLOCK_ROWS)
+            for metric in METRICS:
+                arrays[metric][np.ix_(new_pos[rows], new_pos)] = old.arrays[metric][np.ix_(old_pos[rows], old_pos)]
+
+    # Rows and columns of changed nodes
+    all_points = [current[key] for key in keys]
+    changed_pos = np.array([position[key] for key in changed])
+    for start in range(0, len(changed), BLOCK_ROWS):
+        block = changed[start:start + BLOCK_ROWS]
+        block_pos = changed_pos[start:start + BLOCK_ROWS]
+        block_points = [current[key] for key in block]
+        rows = provider.table(block_points, all_points)
+        columns = provider.table(all_points, block_points)
+        for metric, row_values, column_values in zip(METRICS, rows, columns):
+            arrays[metric][block_pos, :] = row_values
+            arrays[metric][:, block_pos] = column_values
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    index = {
+        'version': version,
+        'provider': provider.name,
+        'files': files,
+        'nodes': [[key, current[key][0], current[key][1]] for key in keys],
+    }
+    tmp_path = os.path.join(directory, INDEX_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+
+    # Old versions can go; open memory maps keep working until closed
+    for name in os.listdir(directory):
+        if name.endswith('.npy') and name not in files.values():
+            os.remove(os.path.join(directory, name))
+    return n, len(changed), removed
@@ -0,0 +1,97 @@
+"""
+Streaming export of raw FillRecord history
+
+Records are read with a server-side cursor (QuerySet.iterator) in
+CHUNK_SIZE batches and written out as they arrive, so memory stays flat
+however many months are exported. Used by the /api/export/records/
+endpoint (StreamingHttpResponse) and the export_records command.
+
+Formats:
+- ndjson: one JSON object per line
+- csv: a header line, then one row per record
+
+Timestamps are ISO 8601 in UTC. Records come in (timestamp, id) order.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import FillRecord
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+FIELDS = ('id', 'trashcan_id', 'timestamp', 'fill_level', 'source')
+SOURCES = [choice for choice, _ in FillRecord._meta.get_field('source').choices]
+# Rows fetched per round trip and written per chunk
+CHUNK_SIZE = 2000
+
+
+def parse_time_bound(value):
+    """Aware datetime from an ISO date (local midnight) or datetime (naive: local time); None if empty"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value}")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(since=None, until=None, bins=None, sources=None):
+    """Records with since <= timestamp < until, optionally only some bins and sources"""
+    unknown = set(sources or []) - set(SOURCES)
+    if unknown:
+        raise ValueError(f"Unknown source(s): {', '.join(sorted(unknown))} (choose from {', '.join(SOURCES)})")
+    records = FillRecord.objects.all()
+    if since:
+        records = records.filter(timestamp__gte=since)
+    if until:
+        records = records.filter(timestamp__lt=until)
+    if bins:
+        records = records.filter(trashcan_id__in=bins)
+    if sources:
+        records = records.filter(source__in=sources)
+    return records.order_by('timestamp', 'id').values_list(*FIELDS)
+
+
+def ndjson_lines(rows):
+    for record_id, bin_id, timestamp, fill_level, source in rows:
+        yield json.dumps({
+            'id': record_id,
+            'trashcan_id': bin_id,
+            'timestamp': timestamp.astimezone(dt_timezone.utc).isoformat(),
+            'fill_level': fill_level,
+            'source': source,
+        }) + '\n'
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for record_id, bin_id, timestamp, fill_level, source in rows:
+        writer.writerow((record_id, bin_id, timestamp.astimezone(dt_timezone.utc).isoformat(), fill_level, source))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # Header of an empty export
+        yield buffer.getvalue()
+
+
+def stream_records(queryset, fmt):
+    """Text chunks of the export, about CHUNK_SIZE records each"""
+    lines = ndjson_lines if fmt == 'ndjson' else csv_lines
+    chunk = []
+    for line in lines(queryset.iterator(chunk_size=CHUNK_SIZE)):
+        chunk.append(line)
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
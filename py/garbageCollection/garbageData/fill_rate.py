@@ -0,0 +1,358 @@
+"""
+Fill-rate algorithm shared by the per-bin model methods and the fleet-level
+engine. Everything in here works on plain (timestamp, fill_level) sequences so
+it can be fed from one bin's queryset or from a single query over all bins.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+
+LOOKBACK_DAYS = 10  # Changed from 30 to 10 for faster adaptation
+DEFAULT_FILL_RATE = 10.0  # Default safe rate
+READING_BLEND_HOURS = 12  # Real readings newer than this are blended in
+
+# Spike state reported alongside the rate (stored on BinPrediction)
+SPIKE_STATES = [
+    ('default', 'Not enough data'),
+    ('normal', 'Normal'),
+    ('spike', 'First spike (+15%)'),
+    ('sustained', 'Validated spike (+20%)'),
+    ('false_alarm', 'False alarm (+10%)'),
+    ('unvalidated', 'Unvalidated spike (+15%)'),
+]
+
+# daily_rate is what every caller uses; baseline/spike_state explain it
+FillRateAnalysis = namedtuple('FillRateAnalysis', ['daily_rate', 'baseline', 'spike_state'])
+
+DEFAULT_ANALYSIS = FillRateAnalysis(DEFAULT_FILL_RATE, None, 'default')
+
+# Packed representation used by the NumPy kernel
+SOURCE_CODES = {'manual': 0, 'ai': 1, 'predicted': 2}
+SPIKE_STATE_CODES = [state for state, _ in SPIKE_STATES]
+SPIKE_MULTIPLIERS = {'default': 1.0, 'normal': 1.0, 'spike': 1.15, 'sustained': 1.20,
+                     'false_alarm': 1.10, 'unvalidated': 1.15}
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# Kernel output, one entry per distinct bin_id (sorted). spike_state holds
+# indexes into SPIKE_STATE_CODES; baseline and last_reading* are NaN when unknown.
+FleetAnalysis = namedtuple('FleetAnalysis', [
+    'bin_ids', 'daily_rate', 'baseline', 'spike_state', 'last_reading', 'last_reading_at',
+])
+
+
+def calculate_fill_rate(records, now):
+    """Daily fill rate for one bin (see analyze_fill_history)"""
+    return analyze_fill_history(records, now).daily_rate
+
+
+def analyze_fill_history(records, now):
+    """
+    🧠 SELF-CORRECTING HYBRID ALGORITHM
+
+    `records` is a list of (timestamp, fill_level) tuples from the lookback
+    window, ordered by timestamp. `now` closes the current incomplete cycle.
+    """
+    if len(records) < 3:  # Need minimum 3 cycles
+        return DEFAULT_ANALYSIS
+
+    # ============ STEP 1: EXTRACT COLLECTION CYCLES ============
+    fill_rates = []
+    spike_context = []  # Track (rate, was_next_high?)
+    cycles, cycle_start = collection_cycles(records)
+
+    for i, timestamp, rate in cycles:
+        fill_rates.append(min(rate, 50))  # Cap at 50%/day
+
+        # Was next cycle >60%? (validates spike was real)
+        next_high = any(level >= 60 for _, level in records[i+1:i+4])
+        spike_context.append((rate, next_high))
+
+    # Include current incomplete cycle
+    prev_level = records[-1][1]
+    if cycle_start and prev_level >= 30:
+        hours = (now - cycle_start).total_seconds() / 3600
+        days = hours / 24
+        if 0.5 <= days <= 20:
+            rate = prev_level / days
+            fill_rates.append(min(rate, 50))
+            spike_context.append((rate, None))  # Don't know validation yet
+
+    if not fill_rates:
+        return DEFAULT_ANALYSIS
+
+    # ============ STEP 2: CALCULATE WEIGHTED BASELINE ============
+    # Recent cycles get more weight (more important)
+    weights = [i + 1 for i in range(len(fill_rates))]  # [1, 2, 3, 4...]
+    weighted_sum = sum(rate * weight for rate, weight in zip(fill_rates, weights))
+    weight_sum = sum(weights)
+    baseline = weighted_sum / weight_sum
+
+    # Also calculate median for spike threshold (outlier-resistant)
+    sorted_rates = sorted(fill_rates)
+    median = sorted_rates[len(sorted_rates) // 2]
+
+    # ============ STEP 3: SPIKE DETECTION ============
+    latest_rate = fill_rates[-1]
+    spike_threshold = median * 1.5  # 50% above median = spike
+    is_spike = latest_rate > spike_threshold
+
+    # ============ STEP 4: SPIKE VALIDATION & ADJUSTMENT ============
+    if is_spike and len(spike_context) >= 2:
+        # Check if previous spike was validated
+        prev_rate, was_validated = spike_context[-2]
+
+        if was_validated:
+            # Previous spike was REAL! (next cycle was also high)
+            # This suggests sustained high demand (construction continues)
+            # Adjust baseline up by 20%
+            adjusted = baseline * 1.20
+            return FillRateAnalysis(round(adjusted, 1), baseline, 'sustained')
+
+        elif was_validated is False:
+            # Previous spike was FALSE ALARM! (next cycle was normal)
+            # Current spike is likely also one-time event
+            # Give small boost (10%) but don't trust it fully
+            adjusted = baseline * 1.10
+            return FillRateAnalysis(round(adjusted, 1), baseline, 'false_alarm')
+
+        else:
+            # Previous spike not yet validated
+            # Give medium boost (15%)
+            adjusted = baseline * 1.15
+            return FillRateAnalysis(round(adjusted, 1), baseline, 'unvalidated')
+
+    elif is_spike:
+        # First spike detected - give benefit of doubt
+        # Small boost (15%) to be cautious
+        adjusted = baseline * 1.15
+        return FillRateAnalysis(round(adjusted, 1), baseline, 'spike')
+
+    else:
+        # ============ STEP 5: NORMAL OPERATION ============
+        # No spike - use weighted average
+        # This naturally adapts to gradual changes over time
+        return FillRateAnalysis(round(baseline, 1), baseline, 'normal')
+
+
+def collection_cycles(records):
+    """
+    Completed collection cycles in (timestamp, fill_level) records.
+
+    Returns ([(index, timestamp, rate)], cycle_start): one entry per
+    collection event (high fill → emptied) that closes a cycle of reasonable
+    length, with the uncapped %/day rate, plus the start of the open cycle.
+    """
+    cycles = []
+    cycle_start = None
+    prev_level = 0
+
+    for i, (timestamp, current) in enumerate(records):
+        # Detect collection event (high fill → emptied)
+        if prev_level >= 70 and current <= 20:
+            if cycle_start:
+                hours = (timestamp - cycle_start).total_seconds() / 3600
+                days = hours / 24
+
+                # Reasonable cycle length (12 hours to 20 days)
+                if 0.5 <= days <= 20:
+                    cycles.append((i, timestamp, prev_level / days))
+
+            cycle_start = timestamp
+
+        elif cycle_start is None and current <= 20:
+            cycle_start = timestamp
+
+        prev_level = current
+
+    return cycles, cycle_start
+
+
+def predict_fill_level(last_emptied, daily_rate, latest_reading, now):
+    """Predict current fill based on time + rate, blended with a recent reading"""
+    hours_since = (now - last_emptied).total_seconds() / 3600
+    days_since = hours_since / 24
+
+    predicted = days_since * daily_rate
+
+    if latest_reading is not None:
+        # 50% time-based prediction + 50% actual reading
+        predicted = (predicted * 0.5) + (latest_reading * 0.5)
+
+    return max(0, round(predicted, 1))
+
+
+def days_until_full(current, rate):
+    """Days until 100% full"""
+    if current >= 100:
+        return 0.0
+    if rate <= 0:
+        return 99.9
+
+    return round((100 - current) / rate, 1)
+
+
+def to_epoch_us(dt):
+    """Aware datetime → integer microseconds since the epoch (exact)"""
+    return (dt - EPOCH) // ONE_MICROSECOND
+
+
+def from_epoch_us(value):
+    """Inverse of to_epoch_us"""
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def analyze_fleet_arrays(bin_ids, timestamps, fill_levels, sources, now):
+    """
+    Vectorized analyze_fill_history for the whole fleet at once.
+    
+    Takes packed arrays sorted by (bin_id, timestamp):
+    - bin_ids:     int64
+    - timestamps:  int64 epoch microseconds (see to_epoch_us)
+    - fill_levels: int64
+    - sources:     int8 codes from SOURCE_CODES
+    `now` is epoch microseconds as well.
+    
+    Collection events are found with array shifts, per-bin cycle statistics
+    with segmented reductions and the spike adjustments as masked operations.
+    Results are identical to running analyze_fill_history bin by bin.
+    """
+    bin_ids = np.asarray(bin_ids, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    levels = np.asarray(fill_levels, dtype=np.int64)
+    sources = np.asarray(sources, dtype=np.int8)
+    n = len(bin_ids)
+    if n == 0:
+        empty = np.zeros(0)
+        return FleetAnalysis(np.zeros(0, dtype=np.int64), empty, empty,
+                             np.zeros(0, dtype=np.int8), empty, empty)
+    
+    # ============ SEGMENTS: one contiguous run of records per bin ============
+    is_first = np.ones(n, dtype=bool)
+    is_first[1:] = bin_ids[1:] != bin_ids[:-1]
+    seg_start = np.flatnonzero(is_first)
+    seg_end = np.append(seg_start[1:], n)  # exclusive
+    seg_count = seg_end - seg_start
+    seg_of = np.cumsum(is_first) - 1
+    n_segs = len(seg_start)
+    first_of = seg_start[seg_of]
+    index = np.arange(n)
+    
+    # ============ STEP 1: COLLECTION EVENTS AND CYCLE STARTS ============
+    prev = np.empty(n, dtype=np.int64)
+    prev[0] = 0
+    prev[1:] = levels[:-1]
+    prev[is_first] = 0
+    is_event = (prev >= 70) & (levels <= 20)
+    
+    # A cycle starts at every collection event and at the first low reading
+    low = levels <= 20
+    low_idx = np.flatnonzero(low)
+    first_low = np.zeros(n, dtype=bool)
+    if len(low_idx):
+        low_seg = seg_of[low_idx]
+        keep = np.ones(len(low_idx), dtype=bool)
+        keep[1:] = low_seg[1:] != low_seg[:-1]
+        first_low[low_idx[keep]] = True
+    is_start = is_event | first_low
+    
+    # Latest cycle start at or before each record (-1 if none in this bin)
+    last_start = np.maximum.accumulate(np.where(is_start, index, -1))
+    last_start = np.where(last_start >= first_of, last_start, -1)
+    start_before = np.empty(n, dtype=np.int64)
+    start_before[0] = -1
+    start_before[1:] = last_start[:-1]
+    start_before = np.where(start_before >= first_of, start_before, -1)
+    
+    # Completed cycles: collection event with an earlier cycle start
+    ev = np.flatnonzero(is_event & (start_before >= 0))
+    ev_days = ((timestamps[ev] - timestamps[start_before[ev]]) / 1e6 / 3600) / 24
+    ev_ok = (ev_days >= 0.5) & (ev_days <= 20)
+    ev = ev[ev_ok]
+    ev_rate = prev[ev] / ev_days[ev_ok]
+    
+    # Spike validation: any of the next 3 records (same bin) >= 60
+    high = levels >= 60
+    ev_next_high = np.zeros(len(ev), dtype=bool)
+    for k in (1, 2, 3):
+        nxt = ev + k
+        inside = nxt < seg_end[seg_of[ev]]
+        ev_next_high |= inside & high[np.minimum(nxt, n - 1)]
+    
+    # Current incomplete cycle per bin
+    last = seg_end - 1
+    open_start = last_start[last]
+    open_mask = (open_start >= 0) & (levels[last] >= 30)
+    open_seg = np.flatnonzero(open_mask)
+    open_days = ((now - timestamps[open_start[open_seg]]) / 1e6 / 3600) / 24
+    open_ok = (open_days >= 0.5) & (open_days <= 20)
+    open_seg = open_seg[open_ok]
+    open_rate = levels[last[open_seg]] / open_days[open_ok]
+    
+    # All cycles in chronological order per bin; context 1/0 = validated
+    # or not, -1 = incomplete cycle (unknown yet)
+    cyc_seg = np.concatenate([seg_of[ev], open_seg])
+    cyc_key = np.concatenate([ev, last[open_seg]]).astype(np.float64)
+    cyc_key[len(ev):] += 0.5
+    cyc_rate = np.concatenate([ev_rate, open_rate])
+    cyc_ctx = np.concatenate([ev_next_high.astype(np.int8), np.full(len(open_seg), -1, dtype=np.int8)])
+    order = np.argsort(cyc_key, kind='stable')
+    cyc_seg, cyc_rate, cyc_ctx = cyc_seg[order], cyc_rate[order], cyc_ctx[order]
+    
+    # Bins with fewer than 3 records keep the default rate
+    enough = seg_count[cyc_seg] >= 3
+    cyc_seg, cyc_rate, cyc_ctx = cyc_seg[enough], cyc_rate[enough], cyc_ctx[enough]
+    capped = np.minimum(cyc_rate, 50)  # Cap at 50%/day
+    
+    # ============ STEP 2: WEIGHTED BASELINE (segmented reductions) ============
+    m = np.bincount(cyc_seg, minlength=n_segs)
+    cyc_first = np.concatenate([[0], np.cumsum(m)[:-1]])
+    pos = np.arange(len(cyc_seg)) - cyc_first[cyc_seg]
+    weighted_sum = np.bincount(cyc_seg, weights=capped * (pos + 1), minlength=n_segs)
+    weight_sum = m * (m + 1) // 2
+    has_rates = m > 0
+    baseline = np.full(n_segs, np.nan)
+    baseline[has_rates] = weighted_sum[has_rates] / weight_sum[has_rates]
+    
+    # Median (upper) of each bin's rates
+    by_rate = np.lexsort((capped, cyc_seg))
+    sorted_rates = capped[by_rate]
+    median = np.full(n_segs, np.nan)
+    median[has_rates] = sorted_rates[cyc_first[has_rates] + m[has_rates] // 2]
+    
+    # ============ STEP 3/4: SPIKE DETECTION, VALIDATION & ADJUSTMENT ============
+    latest = np.full(n_segs, np.nan)
+    latest[has_rates] = capped[cyc_first[has_rates] + m[has_rates] - 1]
+    is_spike = has_rates & (latest > median * 1.5)
+    
+    prev_ctx = np.full(n_segs, -2, dtype=np.int8)
+    two = m >= 2
+    prev_ctx[two] = cyc_ctx[cyc_first[two] + m[two] - 2]
+    
+    state = np.full(n_segs, SPIKE_STATE_CODES.index('default'), dtype=np.int8)
+    state[has_rates] = SPIKE_STATE_CODES.index('normal')
+    state[is_spike & ~two] = SPIKE_STATE_CODES.index('spike')
+    state[is_spike & two & (prev_ctx == 1)] = SPIKE_STATE_CODES.index('sustained')
+    state[is_spike & two & (prev_ctx == 0)] = SPIKE_STATE_CODES.index('false_alarm')
+    state[is_spike & two & (prev_ctx == -1)] = SPIKE_STATE_CODES.index('unvalidated')
+    
+    multiplier = np.array([SPIKE_MULTIPLIERS[code] for code in SPIKE_STATE_CODES])[state]
+    adjusted = np.where(has_rates, baseline * multiplier, DEFAULT_FILL_RATE)
+    # Normal operation returns the baseline itself (no 1.0 multiply)
+    adjusted = np.where(state == SPIKE_STATE_CODES.index('normal'), baseline, adjusted)
+    # Python's round() so results match the per-bin algorithm to the digit
+    daily_rate = np.array([round(value, 1) for value in adjusted.tolist()])
+    
+    # ============ LATEST REAL READING (AI/manual) IN THE BLEND WINDOW ============
+    blend_from = now - READING_BLEND_HOURS * 3600 * 10**6
+    real = np.flatnonzero(((sources == SOURCE_CODES['ai']) | (sources == SOURCE_CODES['manual']))
+                          & (timestamps >= blend_from))
+    real_seg = seg_of[real]
+    keep = np.ones(len(real), dtype=bool)
+    keep[:-1] = real_seg[1:] != real_seg[:-1]  # last reading per bin
+    last_reading = np.full(n_segs, np.nan)
+    last_reading_at = np.full(n_segs, np.nan)
+    last_reading[real_seg[keep]] = levels[real[keep]]
+    last_reading_at[real_seg[keep]] = timestamps[real[keep]]
+    
+    return FleetAnalysis(bin_ids[seg_start], daily_rate, baseline, state, last_reading, last_reading_at)
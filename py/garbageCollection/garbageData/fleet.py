@@ -0,0 +1,255 @@
+"""
+Fleet route planning
+
+Several trucks work the same shift, each with its own capacity and shift
+window. The bins to collect are split between the trucks, each truck's
+trips are solved on its own (in parallel worker processes), and the
+results are fitted into the shifts:
+
+1. Partition: a sweep around the depot. Bins are ordered by bearing,
+   starting after the widest empty sector, and cut into contiguous sectors
+   sized by how many stops each truck can make in its shift. When the
+   greedy trips show the fleet can't do every bin in time, only as many of
+   the most urgent bins as fit are partitioned, so that a busy sector
+   doesn't lose urgent bins while its neighbours collect quiet ones.
+2. Solve: greedy nearest-neighbour trips per truck, improved with
+   vrp.solve_routes. Trucks are solved in a process pool, so the wall time
+   is about ceil(trucks / workers) x the per-truck limit, capped by the
+   total budget; a truck that isn't done in time keeps its greedy trips.
+3. Fit: while a truck's trips don't fit its shift the least urgent bins
+   are dropped, then every dropped bin, most urgent first, is inserted
+   where it is cheapest on a truck that still has time and room. A bin
+   that fits nowhere takes the place of a less urgent bin nearby if the
+   shift allows; the bins left over are returned as unassigned.
+
+Like vrp.py this works on plain node matrices (0 = depot, 1 = landfill,
+2.. = bins) and doesn't touch the database, so worker processes only need
+numpy.
+"""
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+from .vrp import DEPOT, LANDFILL, MAX_SOLVER_BINS, solve_routes, trip_start
+
+# Time at each bin and for emptying the truck at the landfill
+STOP_SECONDS = 120
+UNLOAD_SECONDS = 900
+# Less urgent bins tried as a swap for each unassigned one
+SWAP_CANDIDATES = 15
+
+
+def stops_per_shift(capacity, shift_seconds):
+    """Partition weight: stops a truck can make, counting its landfill visits"""
+    return shift_seconds / (STOP_SECONDS + UNLOAD_SECONDS / capacity)
+
+
+def sweep_partition(points, nodes, weights):
+    """Split the bin nodes into len(weights) sectors around the depot: [[node]]"""
+    depot_lat, depot_lon = points[DEPOT]
+    scale = math.cos(math.radians(depot_lat))
+    bins = list(nodes)
+    if not bins:
+        return [[] for _ in weights]
+    bearing = {node: math.atan2(points[node][0] - depot_lat, (points[node][1] - depot_lon) * scale)
+               for node in bins}
+    bins.sort(key=bearing.get)
+
+    # Start after the widest gap so no cluster is cut in two by the wrap-around
+    gaps = [(bearing[bins[(i + 1) % len(bins)]] - bearing[bins[i]]) % (2 * math.pi) for i in range(len(bins))]
+    start = (max(range(len(bins)), key=gaps.__getitem__) + 1) % len(bins)
+    bins = bins[start:] + bins[:start]
+
+    total = sum(weights)
+    groups, taken, cumulative = [], 0, 0.0
+    for weight in weights:
+        cumulative += weight
+        end = round(len(bins) * cumulative / total) if total else len(bins)
+        groups.append(bins[taken:end])
+        taken = end
+    return groups
+
+
+def greedy_trips(d, nodes, capacity):
+    """Nearest-neighbour trips of at most `capacity` bins: [[node]]"""
+    remaining = set(nodes)
+    trips = []
+    while remaining:
+        trip, current = [], trip_start(len(trips))
+        while remaining and len(trip) < capacity:
+            current = min(remaining, key=lambda node: d[current][node])
+            remaining.remove(current)
+            trip.append(current)
+        trips.append(trip)
+    return trips
+
+
+def shift_duration(t, trips):
+    """Seconds to drive and serve the trips, unload after each and return to the depot"""
+    seconds = 0.0
+    for idx, trip in enumerate(trips):
+        prev = trip_start(idx)
+        for node in trip:
+            seconds += t[prev][node] + STOP_SECONDS
+            prev = node
+        seconds += t[prev][LANDFILL] + UNLOAD_SECONDS
+    if trips:
+        seconds += t[LANDFILL][DEPOT]
+    return seconds
+
+
+def solve_vehicle(distance, nodes, capacity, seed, time_limit):
+    """Solve one truck's trips on its own submatrix (runs in a worker process)"""
+    local = [DEPOT, LANDFILL] + nodes
+    position = {node: pos for pos, node in enumerate(local)}
+    sub = distance[np.ix_(local, local)]
+    solved = solve_routes(sub, capacity, [[position[node] for node in trip] for trip in seed], time_limit)
+    return [[local[pos] for pos in trip] for trip in solved]
+
+
+def solve_all(distance, groups, seeds, vehicles, time_limit, time_budget, workers):
+    """Improved trips per truck; trucks not solved within the budget keep their seed"""
+    results = list(seeds)
+    jobs = [k for k, nodes in enumerate(groups) if 0 < len(nodes) <= MAX_SOLVER_BINS]
+    if not jobs:
+        return results
+
+    workers = max(1, min(workers, len(jobs)))
+    waves = math.ceil(len(jobs) / workers)
+    per_vehicle = min(time_limit, time_budget / waves)
+    if workers == 1:
+        deadline = time.monotonic() + time_budget
+        for k in jobs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            results[k] = solve_vehicle(distance, groups[k], vehicles[k][0], seeds[k], min(per_vehicle, remaining))
+        return results
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(solve_vehicle, distance, groups[k], vehicles[k][0], seeds[k], per_vehicle): k
+                   for k in jobs}
+        # A little slack for process start-up and shipping the matrices
+        done, _ = wait(futures, timeout=time_budget + 1.0)
+        for future in done:
+            if future.exception() is None:
+                results[futures[future]] = future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def trim_to_shift(t, trips, shift_seconds, rank):
+    """Drop the least urgent bins until the trips fit the shift; returns the dropped nodes"""
+    dropped = []
+    while trips and shift_duration(t, trips) > shift_seconds:
+        node = max((node for trip in trips for node in trip), key=rank.get)
+        for trip in trips:
+            if node in trip:
+                trip.remove(node)
+        trips[:] = [trip for trip in trips if trip]
+        dropped.append(node)
+    return dropped
+
+
+def cheapest_insertion(t, trips, capacity, node):
+    """(added seconds, trip index, position) of the cheapest place for node, a new trip included"""
+    if not trips:
+        # First trip starts at the depot, and the truck then drives back from the landfill
+        return (t[DEPOT][node] + t[node][LANDFILL] + t[LANDFILL][DEPOT] + STOP_SECONDS + UNLOAD_SECONDS, 0, 0)
+    best = (t[LANDFILL][node] + t[node][LANDFILL] + STOP_SECONDS + UNLOAD_SECONDS, len(trips), 0)
+    for idx, trip in enumerate(trips):
+        if len(trip) >= capacity:
+            continue
+        seq = [trip_start(idx)] + trip + [LANDFILL]
+        for pos in range(len(trip) + 1):
+            u, v = seq[pos], seq[pos + 1]
+            added = t[u][node] + t[node][v] - t[u][v] + STOP_SECONDS
+            if added < best[0]:
+                best = (added, idx, pos)
+    return best
+
+
+def reinsert(t, fleet_trips, vehicles, nodes):
+    """Insert dropped bins (most urgent first) where they fit; returns the ones that didn't"""
+    used = [shift_duration(t, trips) for trips in fleet_trips]
+    unassigned = []
+    for node in nodes:
+        options = []
+        for k, trips in enumerate(fleet_trips):
+            added, idx, pos = cheapest_insertion(t, trips, vehicles[k][0], node)
+            if used[k] + added <= vehicles[k][1]:
+                options.append((added, k, idx, pos))
+        if not options:
+            unassigned.append(node)
+            continue
+        added, k, idx, pos = min(options)
+        if idx == len(fleet_trips[k]):
+            fleet_trips[k].append([node])
+        else:
+            fleet_trips[k][idx].insert(pos, node)
+        used[k] += added
+    return unassigned
+
+
+def swap_in(t, fleet_trips, vehicles, nodes, rank):
+    """Unassigned bins (most urgent first) replace less urgent bins nearby; returns the bins left over"""
+    left_over = []
+    for node in nodes:
+        truck_of = {other: k for k, trips in enumerate(fleet_trips) for trip in trips for other in trip}
+        candidates = sorted((other for other in truck_of if rank[other] > rank[node]),
+                            key=lambda other: t[node][other])[:SWAP_CANDIDATES]
+        for other in candidates:
+            k = truck_of[other]
+            trips = [[stop for stop in trip if stop != other] for trip in fleet_trips[k]]
+            trips = [trip for trip in trips if trip]
+            added, idx, pos = cheapest_insertion(t, trips, vehicles[k][0], node)
+            if shift_duration(t, trips) + added <= vehicles[k][1]:
+                if idx == len(trips):
+                    trips.append([node])
+                else:
+                    trips[idx].insert(pos, node)
+                fleet_trips[k] = trips
+                left_over.append(other)
+                break
+        else:
+            left_over.append(node)
+    return sorted(left_over, key=rank.get)
+
+
+def solve_fleet(points, distance, duration, vehicles, priority, time_limit, time_budget, workers):
+    """
+    Trips for every truck (see the module docstring).
+
+    points: (lat, lon) per node; distance/duration: node matrices;
+    vehicles: [(capacity, shift seconds)]; priority: bin nodes, most urgent
+    first. Returns ([[trip] per truck], unassigned bin nodes).
+    """
+    d = distance.tolist()
+    t = duration.tolist()
+    weights = [stops_per_shift(capacity, shift) for capacity, shift in vehicles]
+    rank = {node: i for i, node in enumerate(priority)}
+
+    def partition(nodes):
+        groups = sweep_partition(points, nodes, weights)
+        return groups, [greedy_trips(d, group, capacity) for group, (capacity, _) in zip(groups, vehicles)]
+
+    groups, seeds = partition(priority)
+    # How many bins the greedy trips get done within the shifts
+    fitting = 0
+    for trips, (_, shift_seconds) in zip(seeds, vehicles):
+        trips = [list(trip) for trip in trips]
+        trim_to_shift(t, trips, shift_seconds, rank)
+        fitting += sum(len(trip) for trip in trips)
+    excluded = priority[fitting:]
+    if excluded:
+        groups, seeds = partition(priority[:fitting])
+    fleet_trips = solve_all(distance, groups, seeds, vehicles, time_limit, time_budget, workers)
+
+    dropped = list(excluded)
+    for trips, (_, shift_seconds) in zip(fleet_trips, vehicles):
+        dropped += trim_to_shift(t, trips, shift_seconds, rank)
+    dropped.sort(key=rank.get)
+    unassigned = reinsert(t, fleet_trips, vehicles, dropped)
+    return fleet_trips, swap_in(t, fleet_trips, vehicles, unassigned, rank)
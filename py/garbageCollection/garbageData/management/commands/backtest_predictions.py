@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand, CommandError
+from garbageData import backtest
+from garbageData.exports import parse_time_bound
+from garbageData.fill_rate import to_epoch_us
+import time
+
+class Command(BaseCommand):
+    help = "Replay the fill history through fill-level predictors and report MAE, bias, spike recovery and speed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--predictor',
+            action='append',
+            dest='predictors',
+            help=f"Predictor to test: {', '.join(backtest.PREDICTORS)} or a dotted path to a "
+                 f"Predictor subclass (repeat to compare; default: all built-in)"
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='First day or time to predict, e.g. 2025-01-01 (local time)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Stop before this day or time, e.g. 2025-04-01 (local time)'
+        )
+        parser.add_argument(
+            '--bin',
+            type=int,
+            action='append',
+            dest='bins',
+            help='Only this bin (repeat for several)'
+        )
+        parser.add_argument(
+            '--source',
+            choices=['auto', 'snapshot', 'db'],
+            default='auto',
+            help='Read records from the snapshot or the database (default: snapshot if there is one)'
+        )
+        parser.add_argument(
+            '--check',
+            type=int,
+            default=0,
+            help='Also re-predict this many readings one at a time and compare (default: 0)'
+        )
+        parser.add_argument(
+            '--max-mae',
+            type=float,
+            help='Fail if the first predictor\'s MAE is above this (for CI)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_time_bound(options['since'])
+            until = parse_time_bound(options['until'])
+            predictors = [backtest.get_predictor(name)
+                          for name in options['predictors'] or list(backtest.PREDICTORS)]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS("🔁 PREDICTION BACKTEST"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        start = time.perf_counter()
+        try:
+            records, source = backtest.load_records(since, until, options['bins'], options['source'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        replay = backtest.build_replay(records, to_epoch_us(since) if since else None)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"Range: {options['since'] or 'start'} → {options['until'] or 'now'}")
+        if options['bins']:
+            self.stdout.write(f"Bins: {', '.join(map(str, options['bins']))}")
+        self.stdout.write(f"Loaded {len(records['id'])} records from the {source} in {elapsed:.2f}s")
+        self.stdout.write(f"AI readings to predict: {len(replay.queries)} "
+                          f"({replay.skipped} skipped, no emptying before them)\n")
+        if not len(replay.queries):
+            self.stdout.write(self.style.WARNING("⚠️  No readings to replay"))
+            return
+
+        results = []
+        mismatches = 0
+        for predictor in predictors:
+            result = backtest.run_backtest(predictor, replay)
+            results.append(result)
+            self.stdout.write(self.style.SUCCESS(f"📈 {result.predictor}"))
+            self.stdout.write(f"   MAE:  {result.mae:.2f} points")
+            self.stdout.write(f"   Bias: {result.bias:+.2f} points")
+            if result.spike_readings:
+                self.stdout.write(f"   Spikes: {result.spike_readings} readings, MAE {result.spike_mae:.2f}")
+                if result.spike_episodes:
+                    recovery = (f", {result.recovery_readings:.1f} readings on average"
+                                if result.recovery_readings is not None else "")
+                    self.stdout.write(f"   Recovered within ±{backtest.RECOVERED_ERROR}: "
+                                      f"{result.recovered}/{result.spike_episodes} spikes{recovery}")
+            self.stdout.write(f"   Speed: {result.per_second:,.0f} predictions/s ({result.seconds:.2f}s)")
+
+            if options['check']:
+                differ = backtest.check_parity(predictor, replay, options['check'])
+                for index, batch, single in differ[:10]:
+                    self.stdout.write(self.style.ERROR(
+                        f"   ✗ Record {int(records['id'][index])}: batch {batch}, single {single}"
+                    ))
+                if differ:
+                    mismatches += len(differ)
+                else:
+                    self.stdout.write(f"   Batch matches one-at-a-time on "
+                                      f"{min(options['check'], len(replay.queries))} readings")
+            self.stdout.write("")
+
+        if len(results) > 1:
+            self.stdout.write(f"{'Predictor':<20}{'MAE':>8}{'Bias':>9}{'Spike MAE':>11}{'Pred/s':>14}")
+            for result in results:
+                spike_mae = f"{result.spike_mae:.2f}" if result.spike_mae is not None else "-"
+                self.stdout.write(f"{result.predictor:<20}{result.mae:>8.2f}{result.bias:>+9.2f}"
+                                  f"{spike_mae:>11}{result.per_second:>14,.0f}")
+            self.stdout.write("")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} readings predicted differently one at a time")
+        if options['max_mae'] is not None and results[0].mae > options['max_mae']:
+            raise CommandError(f"{results[0].predictor} MAE {results[0].mae:.2f} is above {options['max_mae']}")
+
+        self.stdout.write(self.style.SUCCESS("✅ Backtest complete"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
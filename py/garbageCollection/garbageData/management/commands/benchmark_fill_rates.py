@@ -0,0 +1,115 @@
+from django.core.management.base import BaseCommand, CommandError
+from garbageData.models import TrashCan
+from garbageData.fill_rate import (analyze_fill_history, analyze_fleet_arrays, to_epoch_us,
+                                   SOURCE_CODES, SPIKE_STATE_CODES, LOOKBACK_DAYS, DEFAULT_FILL_RATE)
+from django.utils import timezone
+from datetime import timedelta
+import numpy as np
+import random
+import time
+
+class Command(BaseCommand):
+    help = "Benchmark the vectorized fill-rate kernel and check parity with the per-bin algorithm"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bins', type=int, default=100000, help='Synthetic bins to benchmark (default: 100000)')
+        parser.add_argument('--sample', type=int, default=2000,
+                            help='Synthetic bins re-checked with the per-bin algorithm (default: 2000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for synthetic data')
+        parser.add_argument('--db', action='store_true',
+                            help='Also compare the fleet engine against get_average_daily_fill_rate() for every bin in the database')
+
+    def handle(self, *args, **options):
+        num_bins = options['bins']
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS("⚡ FILL RATE KERNEL BENCHMARK"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        # ============ SYNTHETIC FLEET ============
+        histories = [self.generate_history(rng, now) for _ in range(num_bins)]
+        bin_ids, timestamps, levels, sources = [], [], [], []
+        for bin_id, history in enumerate(histories, start=1):
+            for timestamp, fill_level, source in history:
+                bin_ids.append(bin_id)
+                timestamps.append(to_epoch_us(timestamp))
+                levels.append(fill_level)
+                sources.append(SOURCE_CODES[source])
+
+        arrays = (np.array(bin_ids, dtype=np.int64), np.array(timestamps, dtype=np.int64),
+                  np.array(levels, dtype=np.int64), np.array(sources, dtype=np.int8))
+
+        start = time.perf_counter()
+        analysis = analyze_fleet_arrays(*arrays, to_epoch_us(now))
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"Bins:    {num_bins:,}")
+        self.stdout.write(f"Records: {len(bin_ids):,}")
+        self.stdout.write(self.style.SUCCESS(f"Kernel:  {elapsed * 1000:.1f} ms ({num_bins / elapsed:,.0f} bins/s)"))
+
+        # ============ PARITY: SYNTHETIC SAMPLE ============
+        position = {bin_id: i for i, bin_id in enumerate(analysis.bin_ids.tolist())}
+        sample = min(options['sample'], num_bins)
+        mismatches = 0
+
+        start = time.perf_counter()
+        for bin_id in range(1, sample + 1):
+            expected = analyze_fill_history([(t, level) for t, level, _ in histories[bin_id - 1]], now)
+            i = position.get(bin_id)
+            if i is None:
+                got = (DEFAULT_FILL_RATE, 'default')
+            else:
+                got = (float(analysis.daily_rate[i]), SPIKE_STATE_CODES[analysis.spike_state[i]])
+            if got != (expected.daily_rate, expected.spike_state):
+                mismatches += 1
+                self.stdout.write(self.style.ERROR(f"   ✗ Bin {bin_id}: expected {expected}, got {got}"))
+        per_bin = time.perf_counter() - start
+
+        self.stdout.write(f"\nPer-bin algorithm on {sample:,} bins: {per_bin * 1000:.1f} ms")
+
+        # ============ PARITY: DATABASE ============
+        if options['db']:
+            fleet = TrashCan.get_fleet_fill_rates()
+            for can in TrashCan.objects.all():
+                expected = can.get_average_daily_fill_rate()
+                if fleet[can.id] != expected:
+                    mismatches += 1
+                    self.stdout.write(self.style.ERROR(
+                        f"   ✗ Bin {can.id}: per-bin {expected}, fleet {fleet[can.id]}"
+                    ))
+            self.stdout.write(f"Checked {len(fleet)} database bins")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} parity mismatches")
+
+        self.stdout.write(self.style.SUCCESS("\n✅ Kernel matches the per-bin algorithm"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+    def generate_history(self, rng, now):
+        """Random 10-day history with collections, spikes and noise"""
+        records = []
+        current_time = now - timedelta(days=LOOKBACK_DAYS) + timedelta(seconds=rng.uniform(0, 3600))
+        current_fill = rng.choice([0, 0, 50, 80])
+        base_rate = rng.uniform(3, 30)
+
+        for _ in range(rng.choice([0, 2, 5, 10, 20, 40])):
+            current_time += timedelta(hours=rng.uniform(0, 48), microseconds=rng.randint(0, 999999))
+            if current_time > now:
+                break
+
+            # Occasional spike days (3-4× normal rate)
+            multiplier = rng.choice([1, 1, 1, 3, 4])
+            current_fill += base_rate * rng.uniform(0.2, 1.5) * multiplier
+
+            if current_fill >= 70 and rng.random() < 0.6:
+                # Collection: AI reading then emptied
+                records.append((current_time, min(int(current_fill), 110), 'ai'))
+                records.append((current_time + timedelta(minutes=1), rng.choice([0, 5, 15, 25]), 'manual'))
+                current_fill = 0
+            else:
+                level = int(current_fill) if rng.random() < 0.8 else rng.randint(0, 110)
+                records.append((current_time, level, rng.choice(['ai', 'predicted', 'manual'])))
+
+        return records
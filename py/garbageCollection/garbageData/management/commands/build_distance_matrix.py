@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from garbageData.models import TrashCan
+from garbageData.distance_matrix import get_provider, load_matrix, matrix_dir, update_matrix
+from garbageData.routing import matrix_points
+import time
+
+class Command(BaseCommand):
+    help = "Compute travel costs between all bins, the depot and the landfill (incremental; run after adding or moving bins)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider',
+            choices=['haversine', 'ors'],
+            default=settings.DISTANCE_MATRIX_PROVIDER,
+            help='haversine (straight line, offline) or ors (road network via ORS_BASE_URL)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every pair instead of only new or moved bins'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS("🗺️  DISTANCE MATRIX"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        try:
+            provider = get_provider(options['provider'])
+        except ValueError as e:
+            self.stdout.write(self.style.ERROR(f"❌ {e}"))
+            return
+
+        points = matrix_points(TrashCan.objects.only('id', 'latitude', 'longitude').order_by('id'))
+        self.stdout.write(f"Nodes: {len(points)} (depot, landfill, {len(points) - 2} bins)")
+        self.stdout.write(f"Provider: {provider.name}")
+        self.stdout.write(f"Directory: {matrix_dir()}\n")
+
+        start = time.perf_counter()
+        nodes, computed, removed = update_matrix(points, provider, full=options['full'])
+        elapsed = time.perf_counter() - start
+
+        if computed or removed:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Computed {computed} node(s), dropped {removed} in {elapsed:.2f}s"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Matrix already up to date"))
+
+        matrix = load_matrix()
+        size_mb = sum(array.nbytes for array in matrix.arrays.values()) / 1024 / 1024
+        self.stdout.write(f"\n📊 {nodes} nodes, version {matrix.index['version']}, {size_mb:.1f} MB on disk")
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from garbageData.models import FillRecord
+from garbageData.models import FillRecord, RoutePlan, RouteJob
+from garbageData.partitions import is_partitioned, list_partitions, drop_partitions_before
+from garbageData.rollups import rollup_records
 from django.utils import timezone
 from datetime import timedelta
 
@@ -18,12 +20,29 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting'
         )
+        parser.add_argument(
+            '--detach',
+            action='store_true',
+            help='Detach old monthly partitions instead of dropping them (PostgreSQL only)'
+        )
+        parser.add_argument(
+            '--plan-days',
+            type=int,
+            default=7,
+            help='Keep route plans and finished route jobs from last N days (default: 7)'
+        )
+        parser.add_argument(
+            '--no-input',
+            action='store_true',
+            help='Do not ask for confirmation (for cron)'
+        )
 
     def handle(self, *args, **options):
         days = options['days']
         dry_run = options['dry_run']
         
         cutoff_date = timezone.now() - timedelta(days=days)
+        partitioned = is_partitioned()
         
         # Get records to delete
         old_records = FillRecord.objects.filter(timestamp__lt=cutoff_date)
@@ -44,20 +63,54 @@ class Command(BaseCommand):
         self.stdout.write(f"  • AI: {ai_count}")
         self.stdout.write(f"  • Predicted: {predicted_count}")
         
+        if partitioned:
+            old_partitions = [name for name, start, end in list_partitions() if end <= cutoff_date]
+            action = "detach" if options['detach'] else "drop"
+            self.stdout.write(f"Partitions to {action}: {len(old_partitions)}")
+            for name in old_partitions:
+                self.stdout.write(f"  • {name}")
+        
         if dry_run:
             self.stdout.write(self.style.WARNING("\n🔍 DRY RUN - No records deleted"))
         else:
             if total_count > 0:
-                confirm = input(f"\n⚠️  Delete {total_count} records older than {days} days? (yes/no): ")
+                if options['no_input']:
+                    confirm = 'yes'
+                else:
+                    confirm = input(f"\n⚠️  Delete {total_count} records older than {days} days? (yes/no): ")
                 if confirm.lower() == 'yes':
-                    deleted_count, _ = old_records.delete()
+                    # Summarize first so the daily history outlives the raw records
+                    days_written, _ = rollup_records()
+                    self.stdout.write(f"\n📦 Rolled up {days_written} daily summaries")
+                    if partitioned:
+                        self.remove_partitions(cutoff_date, options['detach'])
+                    # Whatever is left: everything when not partitioned, otherwise
+                    # just the boundary month (pruned to that one partition)
+                    deleted_count, _ = FillRecord.objects.filter(timestamp__lt=cutoff_date).delete()
                     self.stdout.write(self.style.SUCCESS(f"\n✅ Deleted {deleted_count} old records"))
                 else:
                     self.stdout.write(self.style.WARNING("\n❌ Cleanup cancelled"))
             else:
                 self.stdout.write(self.style.SUCCESS("\n✅ No old records to delete"))
+            
+            # Stored route plans are only re-rendered while on screen
+            plan_cutoff = timezone.now() - timedelta(days=options['plan_days'])
+            deleted_plans, _ = RoutePlan.objects.filter(created_at__lt=plan_cutoff).delete()
+            if deleted_plans:
+                self.stdout.write(self.style.SUCCESS(f"✅ Deleted {deleted_plans} old route plans"))
+            deleted_jobs, _ = RouteJob.objects.filter(
+                status__in=['done', 'failed'], created_at__lt=plan_cutoff
+            ).delete()
+            if deleted_jobs:
+                self.stdout.write(self.style.SUCCESS(f"✅ Deleted {deleted_jobs} finished route jobs"))
         
         # Show current database stats
         total_remaining = FillRecord.objects.count()
         self.stdout.write(f"\n📊 Current database size: {total_remaining} records")
-        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+    def remove_partitions(self, cutoff_date, detach):
+        """Drop/detach whole months instead of deleting row by row"""
+        for name, rows in drop_partitions_before(cutoff_date, detach=detach):
+            verb = "Detached" if detach else "Dropped"
+            self.stdout.write(self.style.SUCCESS(f"   ✓ {verb} {name} ({rows} records)"))
@@ -0,0 +1,131 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from garbageData.models import TrashCan, FillRecord
+from garbageData.fill_rate import LOOKBACK_DAYS, READING_BLEND_HOURS
+from django.utils import timezone
+from datetime import timedelta
+import random
+
+# Plan fragments that mean "an index was used" / "the table was scanned"
+INDEX_MARKERS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'USING INDEX', 'USING COVERING INDEX')
+
+
+class Rollback(Exception):
+    """Raised to undo the seeded dataset"""
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN (ANALYZE on PostgreSQL) on the hot FillRecord queries and check they use an index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-bins', type=int, default=250,
+                            help='Seed N synthetic bins for the run, rolled back afterwards (default: 250, 0 = use existing data)')
+        parser.add_argument('--seed-days', type=int, default=90, help='Days of seeded history (default: 90)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS(f"🔍 QUERY PLANS ({connection.vendor})"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        failures = []
+        try:
+            with transaction.atomic():
+                if options['seed_bins']:
+                    self.seed(options['seed_bins'], options['seed_days'])
+                failures = self.explain_all(options['verbose_plans'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"Not using an index: {', '.join(failures)}")
+
+        self.stdout.write(self.style.SUCCESS("\n✅ All hot queries use an index"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+    def hot_queries(self):
+        """(name, queryset, must_use_index) for every hot FillRecord query"""
+        now = timezone.now()
+        bin_id = FillRecord.objects.aggregate(Max('trashcan_id'))['trashcan_id__max'] or 0
+        lookback = now - timedelta(days=LOOKBACK_DAYS)
+
+        return [
+            ('per-bin lookback window',
+             FillRecord.objects.filter(trashcan_id=bin_id, timestamp__gte=lookback)
+             .order_by('timestamp', 'id').values_list('timestamp', 'fill_level'), True),
+            ('per-bin latest real reading',
+             FillRecord.objects.filter(trashcan_id=bin_id,
+                                       timestamp__gte=now - timedelta(hours=READING_BLEND_HOURS),
+                                       source__in=['ai', 'manual']).order_by('-timestamp')[:1], True),
+            ('per-bin latest record',
+             FillRecord.objects.filter(trashcan_id=bin_id).order_by('-timestamp')[:1], True),
+            ('per-bin weekly collections',
+             FillRecord.objects.filter(trashcan_id=bin_id, fill_level=0,
+                                       timestamp__gte=now - timedelta(days=7)), True),
+            ('fleet weekly collections',
+             FillRecord.objects.filter(fill_level=0, timestamp__gte=now - timedelta(days=7))
+             .values('trashcan').annotate(count=Count('id')), True),
+            # Reads a large share of the table, a sequential scan can be the right plan
+            ('fleet lookback window',
+             FillRecord.objects.filter(timestamp__gte=lookback)
+             .order_by('trashcan_id', 'timestamp', 'id')
+             .values_list('trashcan_id', 'timestamp', 'fill_level', 'source'), False),
+        ]
+
+    def explain_all(self, verbose):
+        failures = []
+        for name, queryset, must_use_index in self.hot_queries():
+            if connection.vendor == 'postgresql':
+                plan = queryset.explain(analyze=True)
+            else:
+                plan = queryset.explain()
+            uses_index = any(marker in plan for marker in INDEX_MARKERS)
+
+            if uses_index:
+                self.stdout.write(self.style.SUCCESS(f"✅ {name}: index scan"))
+            elif must_use_index:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"❌ {name}: sequential scan"))
+            else:
+                self.stdout.write(self.style.WARNING(f"⚠️  {name}: sequential scan (acceptable)"))
+
+            if verbose or (must_use_index and not uses_index):
+                for line in plan.splitlines():
+                    self.stdout.write(f"      {line}")
+        return failures
+
+    def seed(self, num_bins, days):
+        """Synthetic bins with one reading every ~12 hours and regular collections"""
+        now = timezone.now()
+        first_id = (TrashCan.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        bins = TrashCan.objects.bulk_create([
+            TrashCan(id=first_id + i, latitude=42.6 + random.uniform(0, 0.05),
+                     longitude=25.38 + random.uniform(0, 0.08))
+            for i in range(num_bins)
+        ])
+
+        records = []
+        for can in bins:
+            current_time = now - timedelta(days=days)
+            current_fill = 0
+            while current_time < now:
+                current_time += timedelta(hours=random.uniform(8, 16))
+                current_fill += random.uniform(3, 8)
+                if current_fill >= 90:
+                    records.append(FillRecord(trashcan=can, fill_level=int(current_fill), source='ai',
+                                              timestamp=current_time))
+                    records.append(FillRecord(trashcan=can, fill_level=0, source='manual',
+                                              timestamp=current_time + timedelta(minutes=5)))
+                    current_fill = 0
+                else:
+                    records.append(FillRecord(trashcan=can, fill_level=int(current_fill), source='predicted',
+                                              timestamp=current_time))
+
+        FillRecord.objects.bulk_create(records, batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE "{FillRecord._meta.db_table}"')
+
+        self.stdout.write(f"🌱 Seeded {num_bins} bins, {len(records):,} records ({days} days)\n")
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand, CommandError
+from garbageData import exports
+import sys
+import time
+
+class Command(BaseCommand):
+    help = "Export raw fill records as NDJSON or CSV, streamed with constant memory (to stdout or --output)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=exports.FORMATS,
+            default='ndjson',
+            help='ndjson (one JSON object per line) or csv (default: ndjson)'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='First day or time to include, e.g. 2025-01-01 (local time)'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Stop before this day or time, e.g. 2025-04-01 (local time)'
+        )
+        parser.add_argument(
+            '--bin',
+            type=int,
+            action='append',
+            dest='bins',
+            help='Only this bin (repeat for several)'
+        )
+        parser.add_argument(
+            '--source',
+            choices=exports.SOURCES,
+            action='append',
+            dest='sources',
+            help='Only this source (repeat for several)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='File to write (default: stdout)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            records = exports.export_queryset(
+                since=exports.parse_time_bound(options['since']),
+                until=exports.parse_time_bound(options['until']),
+                bins=options['bins'],
+                sources=options['sources'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Progress goes to stderr when the data goes to stdout
+        log = self.stdout if options['output'] else self.stderr
+        log.write(self.style.SUCCESS("\n" + "="*70))
+        log.write(self.style.SUCCESS("📤 EXPORT FILL RECORDS"))
+        log.write(self.style.SUCCESS("="*70 + "\n"))
+        log.write(f"Format: {options['format']}")
+        log.write(f"Range: {options['since'] or 'start'} → {options['until'] or 'now'}")
+        if options['bins']:
+            log.write(f"Bins: {', '.join(map(str, options['bins']))}")
+        if options['sources']:
+            log.write(f"Sources: {', '.join(options['sources'])}")
+
+        start = time.perf_counter()
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        size = lines = 0
+        try:
+            for chunk in exports.stream_records(records, options['format']):
+                out.write(chunk)
+                size += len(chunk)
+                lines += chunk.count('\n')
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
+        elapsed = time.perf_counter() - start
+        count = lines - 1 if options['format'] == 'csv' else lines  # CSV header
+
+        log.write(self.style.SUCCESS(
+            f"\n✅ Wrote {count} records ({size / 1024 / 1024:.1f} MB) to {options['output'] or 'stdout'} "
+            f"in {elapsed:.2f}s"
+        ))
+        log.write(self.style.SUCCESS("="*70 + "\n"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from garbageData.partitions import is_partitioned, ensure_partitions, list_partitions, partition_row_count, MONTHS_AHEAD
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly FillRecord partitions and list existing ones (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                            help=f'Create partitions up to N months ahead (default: {MONTHS_AHEAD})')
+        parser.add_argument('--list', action='store_true', help='List partitions with row counts')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING("\n⚠️  Fill records are not partitioned on this database\n"))
+            return
+        
+        created = ensure_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f"✓ Created {name}"))
+        if not created:
+            self.stdout.write("✓ All partitions already exist")
+        
+        if options['list']:
+            self.stdout.write("")
+            for name, start, end in list_partitions():
+                self.stdout.write(
+                    f"{name}: {start.strftime('%Y-%m-%d')} → {end.strftime('%Y-%m-%d')} "
+                    f"({partition_row_count(name)} records)"
+                )
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from garbageData.models import Truck
+from garbageData.routing import plan_routes, plan_fleet, get_ors_client, next_shift_start
+import time
+
+class Command(BaseCommand):
+    help = "Plan the next shift's routes from fill levels projected to the shift start (run after update_predictions)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--truck-capacity',
+            type=int,
+            default=20,
+            help='Bins per truck load (default: 20)'
+        )
+        parser.add_argument(
+            '--trucks',
+            type=int,
+            help='Trucks available; collect at most trucks x capacity bins, most urgent first (default: no limit)'
+        )
+        parser.add_argument(
+            '--fleet',
+            action='store_true',
+            help='Plan for all active trucks, with their own capacities and shifts (see the admin)'
+        )
+        parser.add_argument(
+            '--horizon-days',
+            type=float,
+            help='Collect bins projected to overflow within this many days of the target (default: ROUTE_HORIZON_DAYS)'
+        )
+        parser.add_argument(
+            '--target',
+            type=str,
+            help='Project fill levels to this local time, e.g. "2025-06-01 06:00" (default: next shift start)'
+        )
+
+    def handle(self, *args, **options):
+        if options['target']:
+            target_time = parse_datetime(options['target'])
+            if target_time is None:
+                raise CommandError(f"Invalid --target: {options['target']}")
+            if timezone.is_naive(target_time):
+                target_time = timezone.make_aware(target_time)
+        else:
+            target_time = next_shift_start()
+
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS("🌙 NEXT SHIFT PLAN"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+        self.stdout.write(f"Target time: {timezone.localtime(target_time):%Y-%m-%d %H:%M}")
+        if options['fleet']:
+            vehicles = list(Truck.objects.filter(active=True))
+            if not vehicles:
+                raise CommandError("No active trucks, add them in the admin")
+            for truck in vehicles:
+                self.stdout.write(f"Truck: {truck}")
+            self.stdout.write("")
+        else:
+            self.stdout.write(f"Truck capacity: {options['truck_capacity']} bins")
+            self.stdout.write(f"Trucks: {options['trucks'] or 'as many as needed'}\n")
+
+        start = time.perf_counter()
+        if options['fleet']:
+            plan = plan_fleet(vehicles, get_ors_client(), target_time=target_time, kind='scheduled',
+                              horizon_days=options['horizon_days'])
+        else:
+            plan = plan_routes(options['truck_capacity'], get_ors_client(), target_time=target_time, kind='scheduled',
+                               trucks=options['trucks'], horizon_days=options['horizon_days'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Plan {plan.id} computed in {elapsed:.2f}s"))
+        self.stdout.write(f"\n📊 Routes: {len(plan.routes)}")
+        self.stdout.write(f"📊 Bins to collect: {plan.total_bins}")
+        self.stdout.write(f"📊 Total distance: {plan.total_distance} km")
+        for truck in plan.fleet:
+            self.stdout.write(f"   🚛 {truck['truck']}: {truck['bins']} bins in {truck['trips']} trip(s), "
+                              f"{truck['hours']}h of its {truck['shift']} shift")
+        if plan.expected_overflows:
+            self.stdout.write(self.style.WARNING(f"⚠️  Expected overflowing by then: {plan.expected_overflows} bins"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✓ No bins expected to overflow by then"))
+        if plan.missed_overflows:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {plan.missed_overflows} bins due within the horizon didn't fit on the trucks"
+            ))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
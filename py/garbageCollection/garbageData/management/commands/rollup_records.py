@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from garbageData.models import DailyBinSummary
+from garbageData.rollups import rollup_records, watermark
+import time
+
+class Command(BaseCommand):
+    help = "Roll up new fill records into per-bin daily summaries (run from cron, e.g. hourly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every day that still has raw records (summaries of purged days are kept)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS("📦 DAILY ROLLUP"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        self.stdout.write(f"Watermark: record #{watermark()}")
+
+        start = time.perf_counter()
+        days, bins = rollup_records(rebuild=options['rebuild'])
+        elapsed = time.perf_counter() - start
+
+        if days:
+            self.stdout.write(self.style.SUCCESS(f"✅ Wrote {days} daily summaries for {bins} bins in {elapsed:.2f}s"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Summaries already up to date"))
+
+        self.stdout.write(f"\n📊 Stored summaries: {DailyBinSummary.objects.count()} (watermark #{watermark()})")
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from garbageData import route_jobs
+import time
+
+class Command(BaseCommand):
+    help = "Compute queued route plans (dashboard route jobs) outside the web workers; run as a service"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=1.0,
+            help='Seconds between queue checks when idle (default: 1)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs currently queued, then exit'
+        )
+
+    def handle(self, *args, **options):
+        worker = route_jobs.worker_name()
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS(f"🚛 ROUTE WORKER {worker}"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                requeued = route_jobs.requeue_stale()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f"⚠️  Requeued {requeued} stale job(s)"))
+
+                job = route_jobs.claim(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                start = time.perf_counter()
+                job = route_jobs.run(job)
+                elapsed = time.perf_counter() - start
+                processed += 1
+                if job.status == 'done':
+                    self.stdout.write(self.style.SUCCESS(
+                        f"✅ Job {job.id}: plan {job.plan_id} "
+                        f"({len(job.plan.routes)} routes, {job.plan.total_bins} bins) in {elapsed:.2f}s"
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f"❌ Job {job.id} failed: {job.error}"))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("\n⚠️  Stopped"))
+
+        self.stdout.write(f"\n📊 Processed {processed} job(s)")
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from garbageData.snapshots import load_snapshot, snapshot_dir, update_snapshot
+import time
+
+class Command(BaseCommand):
+    help = "Write columnar NumPy snapshots of fill records (by month) and bins for offline analysis (incremental)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild from the records in the database instead of appending new ones'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("\n" + "="*70))
+        self.stdout.write(self.style.SUCCESS("🗄️  HISTORY SNAPSHOT"))
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
+
+        previous = load_snapshot()
+        self.stdout.write(f"Directory: {snapshot_dir()}")
+        if previous and not options['full']:
+            self.stdout.write(f"Watermark: record #{previous.manifest['watermark']}\n")
+        else:
+            self.stdout.write("Mode: full rebuild\n")
+
+        start = time.perf_counter()
+        added, months = update_snapshot(full=options['full'])
+        elapsed = time.perf_counter() - start
+
+        if added:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Added {added} records to {months} month(s) in {elapsed:.2f}s"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ No new records, bin table refreshed"))
+
+        snapshot = load_snapshot()
+        self.stdout.write(f"\n📊 {len(snapshot)} records in {len(snapshot.months)} month(s), "
+                          f"{len(snapshot.trashcans()['id'])} bins, version {snapshot.manifest['version']}")
+        if snapshot.months:
+            self.stdout.write(f"📊 Months: {snapshot.months[0]} → {snapshot.months[-1]}")
+        self.stdout.write(self.style.SUCCESS("="*70 + "\n"))
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from garbageData.models import TrashCan, FillRecord
+from garbageData.models import TrashCan, FillRecord, BinPrediction
+from garbageData.partitions import ensure_partitions
+from garbageData.response_cache import bump_data_version
 from django.utils import timezone
 
 class Command(BaseCommand):
@@ -8,19 +10,28 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS(f"🔄 Updating predictions at {timezone.now()}"))
         
-        trash_cans = TrashCan.objects.all()
+        # Keep monthly partitions ahead of the writes (no-op when not partitioned)
+        for name in ensure_partitions():
+            self.stdout.write(self.style.SUCCESS(f"✓ Created partition {name}"))
         
+        trash_cans = list(TrashCan.objects.all())
+        
+        # Recompute the materialized state (rates drift as the 10-day window slides)
+        BinPrediction.refresh_fleet(trash_cans)
+        predictions = TrashCan.get_fleet_predictions(trash_cans)
+        
+        records = []
         for can in trash_cans:
-            predicted_fill = can.get_predicted_fill_level()
-            daily_rate = can.get_average_daily_fill_rate()
-            days_until_full = can.get_days_until_full()
+            predicted_fill = predictions[can.id]['predicted_fill']
+            daily_rate = predictions[can.id]['daily_rate']
+            days_until_full = predictions[can.id]['days_until_full']
             
             # Create predicted fill record
-            FillRecord.objects.create(
+            records.append(FillRecord(
                 trashcan=can,
                 fill_level=round(predicted_fill),
                 source='predicted'
-            )
+            ))
             
             self.stdout.write(
                 self.style.SUCCESS(
@@ -29,4 +40,8 @@ class Command(BaseCommand):
                 )
             )
         
-        self.stdout.write(self.style.SUCCESS(f"\n✅ Updated predictions for {trash_cans.count()} bins!"))
\ No newline at end of file
+        FillRecord.objects.bulk_create(records)
+        # Cached dashboard maps are stale (shared with the web workers unless CACHE_BACKEND=locmem)
+        bump_data_version()
+        
+        self.stdout.write(self.style.SUCCESS(f"\n✅ Updated predictions for {len(trash_cans)} bins!"))
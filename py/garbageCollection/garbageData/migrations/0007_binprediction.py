@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0006_trashcan_nfc_uid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BinPrediction',
+            fields=[
+                ('trashcan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prediction', serialize=False, to='garbageData.trashcan')),
+                ('daily_rate', models.FloatField(default=10.0)),
+                ('baseline', models.FloatField(blank=True, help_text='Weighted baseline before spike adjustment', null=True)),
+                ('spike_state', models.CharField(choices=[('default', 'Not enough data'), ('normal', 'Normal'), ('spike', 'First spike (+15%)'), ('sustained', 'Validated spike (+20%)'), ('false_alarm', 'False alarm (+10%)'), ('unvalidated', 'Unvalidated spike (+15%)')], default='default', max_length=20)),
+                ('last_reading', models.IntegerField(blank=True, help_text='Latest AI/manual fill level', null=True)),
+                ('last_reading_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Bin Prediction',
+                'verbose_name_plural': 'Bin Predictions',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0007_binprediction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fillrecord',
+            name='trashcan',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='fill_records', to='garbageData.trashcan'),
+        ),
+        migrations.AddIndex(
+            model_name='fillrecord',
+            index=models.Index(fields=['trashcan', 'timestamp'], name='fillrecord_bin_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fillrecord',
+            index=models.Index(fields=['trashcan', 'source', 'timestamp'], name='fillrecord_bin_src_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fillrecord',
+            index=models.Index(fields=['timestamp'], name='fillrecord_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fillrecord',
+            index=models.Index(condition=models.Q(('fill_level', 0)), fields=['trashcan', 'timestamp'], name='fillrecord_collection_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Converts garbageData_fillrecord into a PostgreSQL table partitioned by
+# month on "timestamp". The Django model state does not change; on other
+# databases this migration does nothing.
+
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+TABLE = 'garbageData_fillrecord'
+OLD_TABLE = 'garbageData_fillrecord_unpartitioned'
+SEQUENCE = 'garbageData_fillrecord_id_seq'
+MONTHS_AHEAD = 3
+
+# Same definitions as FillRecord.Meta.indexes (migration 0008)
+INDEXES = [
+    ('fillrecord_bin_time_idx', '("trashcan_id", "timestamp")', ''),
+    ('fillrecord_bin_src_time_idx', '("trashcan_id", "source", "timestamp")', ''),
+    ('fillrecord_time_idx', '("timestamp")', ''),
+    ('fillrecord_collection_idx', '("trashcan_id", "timestamp")', 'WHERE "fill_level" = 0'),
+]
+
+
+def add_months(dt, months):
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def partition_fill_records(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE]
+        )
+        if cursor.fetchone():
+            return  # Already partitioned
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        cursor.execute(f'''
+            CREATE TABLE "{TABLE}" (
+                "id" bigint NOT NULL,
+                "fill_level" integer NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                "source" varchar(20) NOT NULL,
+                "trashcan_id" integer NOT NULL
+                    REFERENCES "garbageData_trashcan" ("id") DEFERRABLE INITIALLY DEFERRED
+            ) PARTITION BY RANGE ("timestamp")
+        ''')
+
+        # One partition per month from the oldest record to MONTHS_AHEAD from now
+        cursor.execute(f'SELECT min("timestamp") FROM "{OLD_TABLE}"')
+        oldest = cursor.fetchone()[0]
+        now = datetime.now(timezone.utc)
+        start = (oldest or now).astimezone(timezone.utc)
+        start = datetime(start.year, start.month, 1, tzinfo=timezone.utc)
+        last = add_months(datetime(now.year, now.month, 1, tzinfo=timezone.utc), MONTHS_AHEAD)
+        while start <= last:
+            end = add_months(start, 1)
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_y{start.year}m{start.month:02d}" PARTITION OF "{TABLE}" '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [start, end]
+            )
+            start = end
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'''
+            INSERT INTO "{TABLE}" ("id", "fill_level", "timestamp", "source", "trashcan_id")
+            SELECT "id", "fill_level", "timestamp", "source", "trashcan_id" FROM "{OLD_TABLE}"
+        ''')
+        # Drops the old indexes and id sequence with it
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+
+        # The primary key of a partitioned table must include the partition key
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "timestamp")')
+
+        for name, columns, condition in INDEXES:
+            cursor.execute(f'CREATE INDEX "{name}" ON "{TABLE}" {columns} {condition}')
+
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'SELECT setval(\'"{SEQUENCE}"\', COALESCE(max("id"), 0) + 1, false) FROM "{TABLE}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0008_fillrecord_indexes'),
+    ]
+
+    operations = [
+        # Not reversible in place: a partitioned table keeps working with the
+        # old model definition, so going back simply leaves it partitioned.
+        migrations.RunPython(partition_fill_records, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0009_partition_fillrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBinSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('max_fill', models.IntegerField(default=0)),
+                ('collection_count', models.IntegerField(default=0, help_text='Records at 0% (bin emptied)')),
+                ('ai_reading_count', models.IntegerField(default=0)),
+                ('record_count', models.IntegerField(default=0)),
+                ('cycle_rate', models.FloatField(blank=True, help_text='Mean fill rate (%/day) of the cycles that ended this day', null=True)),
+                ('overflow', models.BooleanField(default=False)),
+                ('last_record_id', models.BigIntegerField(default=0, help_text='Highest FillRecord id included')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trashcan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='garbageData.trashcan')),
+            ],
+            options={
+                'verbose_name': 'Daily Bin Summary',
+                'verbose_name_plural': 'Daily Bin Summaries',
+                'ordering': ['-date', 'trashcan'],
+                'indexes': [models.Index(fields=['date'], name='dailybinsummary_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('trashcan', 'date'), name='dailybinsummary_bin_date_uniq')],
+            },
+        ),
+    ]
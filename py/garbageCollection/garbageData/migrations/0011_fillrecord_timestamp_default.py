@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0010_dailybinsummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fillrecord',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0011_fillrecord_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoutePlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('truck_capacity', models.IntegerField()),
+                ('total_bins', models.IntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0, help_text='Driving distance in km')),
+                ('routes', models.JSONField(default=list, help_text='[{route_number, stops, geometry, distance}]')),
+            ],
+            options={
+                'verbose_name': 'Route Plan',
+                'verbose_name_plural': 'Route Plans',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0012_routeplan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectionsCache',
+            fields=[
+                ('key', models.CharField(help_text='sha256 of profile + rounded coordinates', max_length=64, primary_key=True, serialize=False)),
+                ('profile', models.CharField(max_length=30)),
+                ('coordinates', models.JSONField(help_text='Rounded [lon, lat] sequence')),
+                ('geometry', models.JSONField(help_text='ORS directions GeoJSON')),
+                ('size_bytes', models.IntegerField()),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Directions Cache Entry',
+                'verbose_name_plural': 'Directions Cache',
+                'ordering': ['-last_used'],
+            },
+        ),
+    ]
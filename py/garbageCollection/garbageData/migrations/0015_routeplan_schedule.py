@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0014_routejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routeplan',
+            name='expected_overflows',
+            field=models.IntegerField(default=0, help_text='Planned bins projected to be overflowing at target_time'),
+        ),
+        migrations.AddField(
+            model_name='routeplan',
+            name='kind',
+            field=models.CharField(choices=[('on_demand', 'On demand'), ('scheduled', 'Scheduled')], default='on_demand', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='routeplan',
+            name='target_time',
+            field=models.DateTimeField(blank=True, help_text='Time the fill levels were projected to', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='routeplan',
+            index=models.Index(fields=['kind', 'target_time'], name='routeplan_kind_target_idx'),
+        ),
+    ]
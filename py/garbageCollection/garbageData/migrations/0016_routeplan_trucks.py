@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0015_routeplan_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routeplan',
+            name='missed_overflows',
+            field=models.IntegerField(default=0, help_text="Bins due within the horizon that didn't fit on the trucks"),
+        ),
+        migrations.AddField(
+            model_name='routeplan',
+            name='trucks',
+            field=models.IntegerField(blank=True, help_text='Trucks available (empty: as many as needed)', null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:27
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0016_routeplan_trucks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Truck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('capacity', models.IntegerField(default=20, help_text='Bins per load')),
+                ('shift_start', models.TimeField(default=datetime.time(6, 0))),
+                ('shift_end', models.TimeField(default=datetime.time(14, 0), help_text='Before shift_start for a shift past midnight')),
+                ('active', models.BooleanField(default=True, help_text='Included in fleet plans')),
+            ],
+            options={
+                'verbose_name': 'Truck',
+                'verbose_name_plural': 'Trucks',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='routeplan',
+            name='fleet',
+            field=models.JSONField(blank=True, default=list, help_text='Fleet plans: [{truck, capacity, shift, bins, trips, hours, routes}]'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:50
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_scans(apps, schema_editor):
+    """Keep the first of any AI scans stored twice by a retried upload"""
+    FillRecord = apps.get_model('garbageData', 'FillRecord')
+    duplicates = FillRecord.objects.filter(source='ai').order_by().values('trashcan_id', 'timestamp').annotate(
+        count=Count('id'), keep=Min('id')
+    ).filter(count__gt=1)
+    for duplicate in duplicates.iterator():
+        FillRecord.objects.filter(
+            trashcan_id=duplicate['trashcan_id'], timestamp=duplicate['timestamp'], source='ai'
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0017_truck'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_scans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='fillrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('source', 'ai')), fields=('trashcan', 'timestamp', 'source'), name='fillrecord_unique_ai_scan'),
+        ),
+    ]
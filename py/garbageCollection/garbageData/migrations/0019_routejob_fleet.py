@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0018_fillrecord_unique_ai_scan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routejob',
+            name='fleet',
+            field=models.BooleanField(default=False, help_text='Plan for all active trucks (see Truck)'),
+        ),
+        migrations.AlterField(
+            model_name='routejob',
+            name='truck_capacity',
+            field=models.IntegerField(blank=True, help_text='Empty for fleet plans', null=True),
+        ),
+    ]
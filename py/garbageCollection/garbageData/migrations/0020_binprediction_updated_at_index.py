@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('garbageData', '0019_routejob_fleet'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='binprediction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
 from django.utils import timezone
-from datetime import timedelta
+from datetime import timedelta, time as dt_time
 import secrets
+import numpy as np
+from .fill_rate import (analyze_fill_history, analyze_fleet_arrays, predict_fill_level, days_until_full,
+                        to_epoch_us, from_epoch_us, FillRateAnalysis, DEFAULT_ANALYSIS,
+                        LOOKBACK_DAYS, READING_BLEND_HOURS, DEFAULT_FILL_RATE,
+                        SPIKE_STATES, SPIKE_STATE_CODES, SOURCE_CODES)
 
 class TrashCan(models.Model):
     id = models.IntegerField(primary_key=True)
@@ -37,149 +42,141 @@ class TrashCan(models.Model):
         - Doesn't permanently corrupt baseline
         - Recovers 5× faster than simple average (2 cycles vs 10)
         - Handles both one-time events and sustained changes
-        """
-        lookback_days = 10  # Changed from 30 to 10 for faster adaptation
-        lookback_date = timezone.now() - timedelta(days=lookback_days)
-        records = self.fill_records.filter(timestamp__gte=lookback_date).order_by('timestamp')
-        
-        if records.count() < 3:  # Need minimum 3 cycles
-            return 10.0  # Default safe rate
-        
-        # ============ STEP 1: EXTRACT COLLECTION CYCLES ============
-        fill_rates = []
-        spike_context = []  # Track (rate, was_next_high?)
-        cycle_start = None
-        prev_level = 0
-        
-        for i, record in enumerate(records):
-            current = record.fill_level
-            
-            # Detect collection event (high fill → emptied)
-            if prev_level >= 70 and current <= 20:
-                if cycle_start:
-                    hours = (record.timestamp - cycle_start).total_seconds() / 3600
-                    days = hours / 24
-                    
-                    # Reasonable cycle length (12 hours to 20 days)
-                    if 0.5 <= days <= 20:
-                        rate = prev_level / days
-                        fill_rates.append(min(rate, 50))  # Cap at 50%/day
-                        
-                        # Check if next cycle was also high (spike validation)
-                        next_records = list(records[i+1:i+10])
-                        # Was next cycle >60%? (validates spike was real)
-                        next_high = any(r.fill_level >= 60 for r in next_records[:3])
-                        spike_context.append((rate, next_high))
-                
-                cycle_start = record.timestamp
-            
-            elif cycle_start is None and current <= 20:
-                cycle_start = record.timestamp
-            
-            prev_level = current
-        
-        # Include current incomplete cycle
-        if cycle_start and prev_level >= 30:
-            hours = (timezone.now() - cycle_start).total_seconds() / 3600
-            days = hours / 24
-            if 0.5 <= days <= 20:
-                rate = prev_level / days
-                fill_rates.append(min(rate, 50))
-                spike_context.append((rate, None))  # Don't know validation yet
-        
-        if not fill_rates:
-            return 10.0
-        
-        # ============ STEP 2: CALCULATE WEIGHTED BASELINE ============
-        # Recent cycles get more weight (more important)
-        weights = [i + 1 for i in range(len(fill_rates))]  # [1, 2, 3, 4...]
-        weighted_sum = sum(rate * weight for rate, weight in zip(fill_rates, weights))
-        weight_sum = sum(weights)
-        baseline = weighted_sum / weight_sum
         
-        # Also calculate median for spike threshold (outlier-resistant)
-        sorted_rates = sorted(fill_rates)
-        median = sorted_rates[len(sorted_rates) // 2]
-        
-        # ============ STEP 3: SPIKE DETECTION ============
-        latest_rate = fill_rates[-1]
-        spike_threshold = median * 1.5  # 50% above median = spike
-        is_spike = latest_rate > spike_threshold
-        
-        # ============ STEP 4: SPIKE VALIDATION & ADJUSTMENT ============
-        if is_spike and len(spike_context) >= 2:
-            # Check if previous spike was validated
-            prev_rate, was_validated = spike_context[-2]
-            
-            if was_validated:
-                # Previous spike was REAL! (next cycle was also high)
-                # This suggests sustained high demand (construction continues)
-                # Adjust baseline up by 20%
-                adjusted = baseline * 1.20
-                return round(adjusted, 1)
-            
-            elif was_validated is False:
-                # Previous spike was FALSE ALARM! (next cycle was normal)
-                # Current spike is likely also one-time event
-                # Give small boost (10%) but don't trust it fully
-                adjusted = baseline * 1.10
-                return round(adjusted, 1)
-            
-            else:
-                # Previous spike not yet validated
-                # Give medium boost (15%)
-                adjusted = baseline * 1.15
-                return round(adjusted, 1)
-        
-        elif is_spike:
-            # First spike detected - give benefit of doubt
-            # Small boost (15%) to be cautious
-            adjusted = baseline * 1.15
-            return round(adjusted, 1)
-        
-        else:
-            # ============ STEP 5: NORMAL OPERATION ============
-            # No spike - use weighted average
-            # This naturally adapts to gradual changes over time
-            return round(baseline, 1)
+        The algorithm itself lives in fill_rate.analyze_fill_history so the
+        fleet engine (get_fleet_fill_rates) gives identical results.
+        """
+        return self.analyze_fill_rate().daily_rate
     
-    def get_predicted_fill_level(self):
-        """Predict current fill based on time + rate"""
-        hours_since = (timezone.now() - self.last_emptied).total_seconds() / 3600
-        days_since = hours_since / 24
-        
-        daily_rate = self.get_average_daily_fill_rate()
-        predicted = days_since * daily_rate
-        
-        # Blend with recent actual reading if available (last 12 hours)
-        latest = self.fill_records.filter(
-            timestamp__gte=timezone.now() - timedelta(hours=12),
+    def analyze_fill_rate(self):
+        """Fill rate plus the baseline and spike state behind it"""
+        now = timezone.now()
+        lookback_date = now - timedelta(days=LOOKBACK_DAYS)
+        records = list(
+            self.fill_records.filter(timestamp__gte=lookback_date)
+            .order_by('timestamp', 'id')
+            .values_list('timestamp', 'fill_level')
+        )
+        return analyze_fill_history(records, now)
+    
+    def get_latest_reading(self):
+        """Latest real measurement (AI or manual) from the last 12 hours"""
+        return self.fill_records.filter(
+            timestamp__gte=timezone.now() - timedelta(hours=READING_BLEND_HOURS),
             source__in=['ai', 'manual']  # Only real measurements
         ).order_by('-timestamp').first()
-        
-        if latest:
-            # 50% time-based prediction + 50% actual reading
-            predicted = (predicted * 0.5) + (latest.fill_level * 0.5)
-        
-        return max(0, round(predicted, 1))
+    
+    def get_predicted_fill_level(self, daily_rate=None):
+        """Predict current fill based on time + rate"""
+        if daily_rate is None:
+            daily_rate = self.get_average_daily_fill_rate()
+        latest = self.get_latest_reading()
+        return predict_fill_level(self.last_emptied, daily_rate,
+                                  latest.fill_level if latest else None, timezone.now())
     
     def get_days_until_full(self):
         """Days until 100% full"""
-        current = self.get_predicted_fill_level()
         rate = self.get_average_daily_fill_rate()
+        current = self.get_predicted_fill_level(daily_rate=rate)
+        return days_until_full(current, rate)
+    
+    def get_cached_prediction(self):
+        """
+        Predictions from the materialized BinPrediction row:
+        {'daily_rate', 'predicted_fill', 'days_until_full'}
         
-        if current >= 100:
-            return 0.0
-        if rate <= 0:
-            return 99.9
+        One indexed row fetch; only the time-based extrapolation runs here.
+        """
+        try:
+            state = self.prediction
+        except BinPrediction.DoesNotExist:
+            state = BinPrediction.refresh(self)
+        return state.get_predictions(self.last_emptied)
+    
+    @classmethod
+    def analyze_fleet(cls, trash_cans=None):
+        """
+        Run the fill-rate algorithm for many bins at once.
         
-        return round((100 - current) / rate, 1)
+        Pulls the lookback window for every bin in ONE ordered query, packs it
+        into arrays and runs the vectorized kernel (fill_rate.analyze_fleet_arrays),
+        which gives the same results as get_average_daily_fill_rate per bin.
+        Returns (bin_ids, FleetAnalysis); bins without records are missing
+        from the FleetAnalysis and get the default rate.
+        """
+        now = timezone.now()
+        records = FillRecord.objects.filter(
+            timestamp__gte=now - timedelta(days=LOOKBACK_DAYS)
+        ).order_by('trashcan_id', 'timestamp', 'id').values_list(
+            'trashcan_id', 'timestamp', 'fill_level', 'source'
+        )
+        if trash_cans is None:
+            bin_ids = list(cls.objects.values_list('id', flat=True))
+        else:
+            bin_ids = [can.id for can in trash_cans]
+            records = records.filter(trashcan_id__in=bin_ids)
+        
+        rows = list(records)
+        predicted = SOURCE_CODES['predicted']
+        analysis = analyze_fleet_arrays(
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((to_epoch_us(row[1]) for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((SOURCE_CODES.get(row[3], predicted) for row in rows), dtype=np.int8, count=len(rows)),
+            to_epoch_us(now),
+        )
+        return bin_ids, analysis
+    
+    @classmethod
+    def get_fleet_fill_analysis(cls, trash_cans=None):
+        """Fill rate analysis for many bins at once: {bin_id: FillRateAnalysis}"""
+        bin_ids, analysis = cls.analyze_fleet(trash_cans)
+        position = {bin_id: i for i, bin_id in enumerate(analysis.bin_ids.tolist())}
+        
+        results = {}
+        for bin_id in bin_ids:
+            i = position.get(bin_id)
+            if i is None:
+                results[bin_id] = DEFAULT_ANALYSIS
+                continue
+            baseline = analysis.baseline[i]
+            results[bin_id] = FillRateAnalysis(
+                float(analysis.daily_rate[i]),
+                None if np.isnan(baseline) else float(baseline),
+                SPIKE_STATE_CODES[analysis.spike_state[i]],
+            )
+        return results
+    
+    @classmethod
+    def get_fleet_fill_rates(cls, trash_cans=None):
+        """Fill rate for many bins at once: {bin_id: daily_rate}"""
+        analysis = cls.get_fleet_fill_analysis(trash_cans)
+        return {bin_id: result.daily_rate for bin_id, result in analysis.items()}
+    
+    @classmethod
+    def get_fleet_predictions(cls, trash_cans=None, now=None):
+        """
+        Predictions for many bins in O(1) queries:
+        {bin_id: {'daily_rate', 'predicted_fill', 'days_until_full'}}
+        
+        Reads the materialized BinPrediction rows; bins that don't have one
+        yet are computed from raw records and stored in the same pass.
+        """
+        if trash_cans is None:
+            trash_cans = cls.objects.all()
+        trash_cans = list(trash_cans)
+        states = BinPrediction.for_bins(trash_cans)
+        
+        if now is None:
+            now = timezone.now()
+        return {can.id: states[can.id].get_predictions(can.last_emptied, now) for can in trash_cans}
     
     def mark_as_emptied(self):
         """Mark bin as collected"""
         self.last_emptied = timezone.now()
         self.save()
         FillRecord.objects.create(trashcan=self, fill_level=0, source='manual')
+        BinPrediction.refresh(self)
 
     class Meta:
         verbose_name = "Trash Can"
@@ -187,9 +184,12 @@ class TrashCan(models.Model):
 
 
 class FillRecord(models.Model):
-    trashcan = models.ForeignKey(TrashCan, on_delete=models.CASCADE, related_name='fill_records')
+    # No single-column index: every (trashcan, ...) index below starts with it
+    trashcan = models.ForeignKey(TrashCan, on_delete=models.CASCADE, related_name='fill_records',
+                                 db_index=False)
     fill_level = models.IntegerField(default=0)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: batched uploads carry the time the scan happened
+    timestamp = models.DateTimeField(default=timezone.now)
     source = models.CharField(max_length=20, default='manual', 
                              choices=[('manual', 'Manual'), ('ai', 'AI'), ('predicted', 'Predicted')])
 
@@ -199,6 +199,296 @@ class FillRecord(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Per-bin lookback window ordered by time (fill rate, latest record)
+            models.Index(fields=['trashcan', 'timestamp'], name='fillrecord_bin_time_idx'),
+            # Latest real reading (source__in=['ai', 'manual']) per bin
+            models.Index(fields=['trashcan', 'source', 'timestamp'], name='fillrecord_bin_src_time_idx'),
+            # Fleet-wide window queries and cleanup by age
+            models.Index(fields=['timestamp'], name='fillrecord_time_idx'),
+            # Collection events (fill_level=0) counted per bin per week
+            models.Index(fields=['trashcan', 'timestamp'], condition=models.Q(fill_level=0),
+                         name='fillrecord_collection_idx'),
+        ]
+        constraints = [
+            # One AI scan per bin and scan time, so a retried batch upload can't
+            # store a scan twice (includes the PostgreSQL partition key, timestamp)
+            models.UniqueConstraint(fields=['trashcan', 'timestamp', 'source'], condition=models.Q(source='ai'),
+                                    name='fillrecord_unique_ai_scan'),
+        ]
+
+
+class BinPrediction(models.Model):
+    """
+    Materialized prediction state for one bin
+    
+    Refreshed whenever the bin is scanned or emptied and by update_predictions,
+    so read paths fetch one row instead of re-running the fill-rate algorithm.
+    The time-based extrapolation (fill since last_emptied) is done on read.
+    """
+    trashcan = models.OneToOneField(TrashCan, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='prediction')
+    daily_rate = models.FloatField(default=DEFAULT_FILL_RATE)
+    baseline = models.FloatField(null=True, blank=True, help_text="Weighted baseline before spike adjustment")
+    spike_state = models.CharField(max_length=20, default='default', choices=SPIKE_STATES)
+    last_reading = models.IntegerField(null=True, blank=True, help_text="Latest AI/manual fill level")
+    last_reading_at = models.DateTimeField(null=True, blank=True)
+    # Indexed: the selection heap reads the rows changed since its last sync
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Bin {self.trashcan_id}: {self.daily_rate}%/day ({self.spike_state})"
+    
+    def get_predictions(self, last_emptied, now=None):
+        """Extrapolate the stored state to `now`"""
+        if now is None:
+            now = timezone.now()
+        
+        # Only blend readings that are still recent enough
+        latest_reading = None
+        if self.last_reading_at and self.last_reading_at >= now - timedelta(hours=READING_BLEND_HOURS):
+            latest_reading = self.last_reading
+        
+        predicted_fill = predict_fill_level(last_emptied, self.daily_rate, latest_reading, now)
+        return {
+            'daily_rate': self.daily_rate,
+            'predicted_fill': predicted_fill,
+            'days_until_full': days_until_full(predicted_fill, self.daily_rate),
+        }
+    
+    @classmethod
+    def for_bins(cls, trash_cans):
+        """Stored state of many bins in one query, computing missing rows: {bin_id: BinPrediction}"""
+        states = {
+            state.trashcan_id: state
+            for state in cls.objects.filter(trashcan_id__in=[can.id for can in trash_cans])
+        }
+        missing = [can for can in trash_cans if can.id not in states]
+        if missing:
+            states.update(cls.refresh_fleet(missing))
+        return states
+    
+    @classmethod
+    def refresh(cls, trashcan):
+        """Recompute the state of one bin from its recent records"""
+        analysis = trashcan.analyze_fill_rate()
+        latest = trashcan.get_latest_reading()
+        
+        state, _ = cls.objects.update_or_create(
+            trashcan=trashcan,
+            defaults={
+                'daily_rate': analysis.daily_rate,
+                'baseline': analysis.baseline,
+                'spike_state': analysis.spike_state,
+                'last_reading': latest.fill_level if latest else None,
+                'last_reading_at': latest.timestamp if latest else None,
+            }
+        )
+        trashcan.prediction = state
+        return state
+    
+    @classmethod
+    def refresh_fleet(cls, trash_cans=None):
+        """Recompute and upsert the state of many bins in O(1) queries: {bin_id: BinPrediction}"""
+        bin_ids, analysis = TrashCan.analyze_fleet(trash_cans)
+        position = {bin_id: i for i, bin_id in enumerate(analysis.bin_ids.tolist())}
+        
+        states = []
+        for bin_id in bin_ids:
+            i = position.get(bin_id)
+            if i is None:
+                states.append(cls(trashcan_id=bin_id))
+                continue
+            baseline = analysis.baseline[i]
+            has_reading = not np.isnan(analysis.last_reading[i])
+            states.append(cls(
+                trashcan_id=bin_id,
+                daily_rate=float(analysis.daily_rate[i]),
+                baseline=None if np.isnan(baseline) else float(baseline),
+                spike_state=SPIKE_STATE_CODES[analysis.spike_state[i]],
+                last_reading=int(analysis.last_reading[i]) if has_reading else None,
+                last_reading_at=from_epoch_us(analysis.last_reading_at[i]) if has_reading else None,
+            ))
+        
+        cls.objects.bulk_create(
+            states,
+            update_conflicts=True,
+            unique_fields=['trashcan'],
+            update_fields=['daily_rate', 'baseline', 'spike_state', 'last_reading', 'last_reading_at', 'updated_at'],
+        )
+        return {state.trashcan_id: state for state in states}
+
+    class Meta:
+        verbose_name = "Bin Prediction"
+        verbose_name_plural = "Bin Predictions"
+
+
+class DailyBinSummary(models.Model):
+    """
+    Per-bin daily rollup of FillRecord (local calendar day)
+    
+    Written incrementally by rollup_records and kept after the raw records
+    are purged by cleanup_old_records, so long-range history stays available.
+    """
+    trashcan = models.ForeignKey(TrashCan, on_delete=models.CASCADE, related_name='daily_summaries')
+    date = models.DateField()
+    max_fill = models.IntegerField(default=0)
+    collection_count = models.IntegerField(default=0, help_text="Records at 0% (bin emptied)")
+    ai_reading_count = models.IntegerField(default=0)
+    record_count = models.IntegerField(default=0)
+    cycle_rate = models.FloatField(null=True, blank=True,
+                                   help_text="Mean fill rate (%/day) of the cycles that ended this day")
+    overflow = models.BooleanField(default=False)
+    last_record_id = models.BigIntegerField(default=0, help_text="Highest FillRecord id included")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        overflow = " ⚠️ OVERFLOW" if self.overflow else ""
+        return f"Bin {self.trashcan_id} {self.date}: max {self.max_fill}%{overflow}"
+
+    class Meta:
+        verbose_name = "Daily Bin Summary"
+        verbose_name_plural = "Daily Bin Summaries"
+        ordering = ['-date', 'trashcan']
+        constraints = [
+            models.UniqueConstraint(fields=['trashcan', 'date'], name='dailybinsummary_bin_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='dailybinsummary_date_idx'),
+        ]
+
+
+class Truck(models.Model):
+    """A collection truck available to the fleet planner (see fleet.py)"""
+    name = models.CharField(max_length=50, unique=True)
+    capacity = models.IntegerField(default=20, help_text="Bins per load")
+    shift_start = models.TimeField(default=dt_time(6, 0))
+    shift_end = models.TimeField(default=dt_time(14, 0), help_text="Before shift_start for a shift past midnight")
+    active = models.BooleanField(default=True, help_text="Included in fleet plans")
+
+    def __str__(self):
+        return f"{self.name} ({self.capacity} bins, {self.shift_start:%H:%M}-{self.shift_end:%H:%M})"
+
+    def shift_seconds(self):
+        start = self.shift_start.hour * 3600 + self.shift_start.minute * 60
+        end = self.shift_end.hour * 3600 + self.shift_end.minute * 60
+        return (end - start) % 86400 or 86400
+
+    def available_seconds(self, at):
+        """Working time left in the shift under way at `at` (local time), else a whole shift (the next one)"""
+        local = timezone.localtime(at)
+        start = self.shift_start.hour * 3600 + self.shift_start.minute * 60
+        elapsed = (local.hour * 3600 + local.minute * 60 + local.second - start) % 86400
+        shift = self.shift_seconds()
+        return shift - elapsed if elapsed < shift else shift
+
+    class Meta:
+        verbose_name = "Truck"
+        verbose_name_plural = "Trucks"
+        ordering = ['name']
+
+
+class RoutePlan(models.Model):
+    """
+    A computed set of truck routes
+    
+    Keeps the ordered stops (with the prediction snapshot shown in the map
+    popups) and the ORS route geometry, so the plan can be re-rendered, e.g.
+    with one route highlighted, without recomputing it or calling ORS.
+    Scheduled plans are computed ahead of a shift by plan_tomorrow, with
+    fill levels projected to the shift start. With a limited number of trucks,
+    bins that were due but didn't fit are counted in missed_overflows.
+    """
+    KIND_CHOICES = [
+        ('on_demand', 'On demand'),
+        ('scheduled', 'Scheduled'),
+    ]
+    
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='on_demand')
+    target_time = models.DateTimeField(null=True, blank=True, help_text="Time the fill levels were projected to")
+    truck_capacity = models.IntegerField()
+    trucks = models.IntegerField(null=True, blank=True, help_text="Trucks available (empty: as many as needed)")
+    total_bins = models.IntegerField(default=0)
+    total_distance = models.FloatField(default=0, help_text="Driving distance in km")
+    expected_overflows = models.IntegerField(default=0, help_text="Planned bins projected to be overflowing at target_time")
+    missed_overflows = models.IntegerField(default=0, help_text="Bins due within the horizon that didn't fit on the trucks")
+    fleet = models.JSONField(default=list, blank=True,
+                             help_text="Fleet plans: [{truck, capacity, shift, bins, trips, hours, routes}]")
+    routes = models.JSONField(default=list, help_text="[{route_number, stops, geometry, distance}]")
+
+    def __str__(self):
+        return f"Plan {self.id}: {len(self.routes)} routes, {self.total_bins} bins"
+
+    class Meta:
+        verbose_name = "Route Plan"
+        verbose_name_plural = "Route Plans"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['kind', 'target_time'], name='routeplan_kind_target_idx'),
+        ]
+
+
+class RouteJob(models.Model):
+    """
+    A route plan requested from the dashboard, computed by the route_worker
+    command instead of inside a web request
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    truck_capacity = models.IntegerField(null=True, blank=True, help_text="Empty for fleet plans")
+    fleet = models.BooleanField(default=False, help_text="Plan for all active trucks (see Truck)")
+    plan = models.ForeignKey(RoutePlan, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True, help_text="host:pid of the worker that ran it")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        if self.fleet:
+            return f"Job {self.id}: {self.status} (fleet)"
+        return f"Job {self.id}: {self.status} (capacity {self.truck_capacity})"
+
+    class Meta:
+        verbose_name = "Route Job"
+        verbose_name_plural = "Route Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='routejob_status_created_idx'),
+        ]
+
+
+class DirectionsCache(models.Model):
+    """
+    Cached ORS directions GeoJSON
+    
+    Content-addressed: the key is a hash of the profile and the rounded
+    coordinate sequence, so the same ordered stops are only routed once.
+    Least recently used entries are evicted (see garbageData/directions_cache.py).
+    """
+    key = models.CharField(max_length=64, primary_key=True, help_text="sha256 of profile + rounded coordinates")
+    profile = models.CharField(max_length=30)
+    coordinates = models.JSONField(help_text="Rounded [lon, lat] sequence")
+    geometry = models.JSONField(help_text="ORS directions GeoJSON")
+    size_bytes = models.IntegerField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.profile}: {len(self.coordinates)} points ({self.hits} hits)"
+
+    class Meta:
+        verbose_name = "Directions Cache Entry"
+        verbose_name_plural = "Directions Cache"
+        ordering = ['-last_used']
 
 
 class APIKey(models.Model):
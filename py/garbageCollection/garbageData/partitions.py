@@ -0,0 +1,159 @@
+"""
+Monthly range partitions for FillRecord (PostgreSQL only)
+
+Migration 0009 turns the fill record table into a table partitioned by
+RANGE (timestamp), one partition per calendar month plus a DEFAULT
+partition as a safety net. These helpers keep future partitions created
+and let retention drop whole months instead of running a massive DELETE.
+
+On any other database (SQLite for local development) the table is a
+plain table and every helper reports that nothing is partitioned.
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import FillRecord
+
+TABLE = FillRecord._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+MONTHS_AHEAD = 3
+
+
+def is_partitioned():
+    """True if the fill record table is a partitioned PostgreSQL table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(dt):
+    """First instant of dt's month (UTC)"""
+    dt = dt.astimezone(dt_timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(dt, months):
+    """Shift a month start by N months"""
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(start):
+    """e.g. garbageData_fillrecord_y2025m11"""
+    return f'{TABLE}_y{start.year}m{start.month:02d}'
+
+
+def list_partitions():
+    """Monthly partitions as [(name, start, end)] ordered by start"""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    prefix = f'{TABLE}_y'
+    for name in names:
+        if not name.startswith(prefix):
+            continue  # DEFAULT partition
+        year, month = name[len(prefix):].split('m')
+        start = datetime(int(year), int(month), 1, tzinfo=dt_timezone.utc)
+        partitions.append((name, start, add_months(start, 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partition(start):
+    """
+    Create the partition for the month starting at `start`.
+
+    Rows that already landed in the DEFAULT partition for that month are
+    moved into the new partition (PostgreSQL refuses to attach otherwise).
+    Returns True if a partition was created.
+    """
+    name = partition_name(start)
+    end = add_months(start, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [f'"{name}"'])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(f'CREATE TEMP TABLE fillrecord_moved (LIKE "{TABLE}") ON COMMIT DROP')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO fillrecord_moved SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM fillrecord_moved')
+        cursor.execute('DROP TABLE fillrecord_moved')
+    return True
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD, now=None):
+    """
+    Make sure partitions exist from the current month to N months ahead.
+
+    Months that only have rows in the DEFAULT partition (backfilled history,
+    a missed cron run) get their own partition too. Returns created names.
+    """
+    if not is_partitioned():
+        return []
+    start = month_start(now or timezone.now())
+    last = add_months(start, months_ahead)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min("timestamp"), max("timestamp") FROM "{DEFAULT_PARTITION}"')
+        oldest, newest = cursor.fetchone()
+    if oldest is not None:
+        start = min(start, month_start(oldest))
+        last = max(last, month_start(newest))
+
+    created = []
+    while start <= last:
+        if create_partition(start):
+            created.append(partition_name(start))
+        start = add_months(start, 1)
+    return created
+
+
+def partition_row_count(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM "{name}"')
+        return cursor.fetchone()[0]
+
+
+def drop_partitions_before(cutoff, detach=False):
+    """
+    Drop (or just detach) every monthly partition that ends before `cutoff`.
+
+    Detached partitions stay in the database as standalone tables so they
+    can be archived with pg_dump before being dropped by hand.
+    Returns [(name, row_count)].
+    """
+    removed = []
+    for name, start, end in list_partitions():
+        if end > cutoff:
+            continue
+        rows = partition_row_count(name)
+        with connection.cursor() as cursor:
+            if detach:
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            else:
+                cursor.execute(f'DROP TABLE "{name}"')
+        removed.append((name, rows))
+    return removed
@@ -0,0 +1,76 @@
+"""
+Response cache for the dashboard map endpoints
+
+Cached responses are keyed on a global data version plus the request
+parameters that change the output. Anything that changes what the maps show
+(ingest endpoints, update_predictions, bin and truck edits) calls bump_data_version(),
+which makes every cached response unreachable at once; unchanged dashboard
+refreshes between truck scans are served straight from the cache.
+
+Predictions drift with time even without new data, so entries also expire
+after settings.RESPONSE_CACHE_TTL. The version lives in the configured
+Django cache: with locmem every worker process has its own, use the file or
+redis backend to share it between workers.
+"""
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.http import HttpResponse
+from .models import TrashCan, Truck
+
+DATA_VERSION_KEY = 'garbagedata:data_version'
+
+
+def get_data_version():
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Time-based start, so an evicted version never reuses old cache keys
+        cache.add(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every cached response"""
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:  # Not set (first use or evicted)
+        cache.set(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cached_by_data_version(prefix, params=()):
+    """
+    Cache successful responses of a GET view per data version and the given
+    query parameters (the X-Cache header tells HIT from MISS).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            values = '&'.join(f"{name}={request.GET.get(name, '')}" for name in params)
+            key = f'garbagedata:response:{prefix}:{get_data_version()}:{values}'
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.content, response['Content-Type']), settings.RESPONSE_CACHE_TTL)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+@receiver(post_save, sender=TrashCan)
+@receiver(post_delete, sender=TrashCan)
+@receiver(post_save, sender=Truck)
+@receiver(post_delete, sender=Truck)
+def _trashcan_changed(sender, **kwargs):
+    bump_data_version()
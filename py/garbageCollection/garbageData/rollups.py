@@ -0,0 +1,227 @@
+"""
+Daily rollups of FillRecord into DailyBinSummary
+
+Rollups are incremental: every summary remembers the highest record id it
+has seen, and the next run only looks at records above the fleet-wide
+watermark. Every (bin, day) touched by a new record is recomputed from the
+raw records, so late records (offline RPi uploads) land in the right day.
+
+Ids are handed out when a row is inserted, not when it commits, so a slow
+transaction (a large batch ingest) can commit rows below ids that were
+already rolled up. Every run re-checks the WATERMARK_OVERLAP_IDS ids below
+the watermark and recomputes the days whose summary counts fewer records
+than the database holds (summarizing a day again is idempotent).
+
+A new record can also open or close a collection cycle, so the days up
+to CYCLE_LOOKBACK_DAYS after it are recomputed as well.
+
+If the raw records of a day were already purged by cleanup_old_records,
+the recomputed day would be smaller than the stored one; in that case the
+late records are merged into the stored summary instead of replacing it.
+Likewise a stored cycle rate is kept when the history it was computed
+from is no longer complete.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db.models import Count, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .fill_rate import collection_cycles
+from .models import FillRecord, DailyBinSummary
+
+# Longest cycle counted by collection_cycles (20 days), plus a day of slack
+CYCLE_LOOKBACK_DAYS = 21
+BATCH_BINS = 500
+# Ids below the watermark re-checked for late commits on every run
+WATERMARK_OVERLAP_IDS = 10000
+
+
+def local_date(dt):
+    return timezone.localtime(dt).date()
+
+
+def day_start(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def watermark():
+    """Highest FillRecord id already rolled up"""
+    return DailyBinSummary.objects.aggregate(Max('last_record_id'))['last_record_id__max'] or 0
+
+
+def purge_horizon():
+    """Oldest raw record if older records were purged (summaries reach further back), else None"""
+    oldest_raw = FillRecord.objects.aggregate(Min('timestamp'))['timestamp__min']
+    if oldest_raw and DailyBinSummary.objects.filter(date__lt=local_date(oldest_raw)).exists():
+        return oldest_raw
+    return None
+
+
+def summarize_day(trashcan_id, date, records, cycle_rates):
+    """DailyBinSummary for one day from its (id, timestamp, fill_level, source) records"""
+    max_fill = max(level for _, _, level, _ in records)
+    return DailyBinSummary(
+        trashcan_id=trashcan_id,
+        date=date,
+        max_fill=max_fill,
+        collection_count=sum(1 for _, _, level, _ in records if level == 0),
+        ai_reading_count=sum(1 for _, _, _, source in records if source == 'ai'),
+        record_count=len(records),
+        cycle_rate=round(sum(cycle_rates) / len(cycle_rates), 1) if cycle_rates else None,
+        overflow=max_fill > 100,
+        last_record_id=max(record_id for record_id, _, _, _ in records),
+    )
+
+
+def merge_late_records(existing, records):
+    """Add records missing from a summary whose raw history was purged"""
+    late = [r for r in records if r[0] > existing.last_record_id]
+    merged = summarize_day(existing.trashcan_id, existing.date, late or records, [])
+    if late:
+        merged.max_fill = max(existing.max_fill, merged.max_fill)
+        merged.collection_count += existing.collection_count
+        merged.ai_reading_count += existing.ai_reading_count
+        merged.record_count += existing.record_count
+        merged.last_record_id = max(existing.last_record_id, merged.last_record_id)
+    else:
+        for field in ('max_fill', 'collection_count', 'ai_reading_count', 'record_count', 'last_record_id'):
+            setattr(merged, field, getattr(existing, field))
+    merged.cycle_rate = existing.cycle_rate
+    merged.overflow = merged.max_fill > 100
+    return merged
+
+
+def rollup_bins(affected):
+    """Recompute the summaries for {bin_id: set(dates)}; returns the upserted summaries"""
+    if not affected:
+        return []
+    # Later days whose cycles may start or end at the new records
+    affected = {
+        trashcan_id: {date + timedelta(days=offset) for date in dates for offset in range(CYCLE_LOOKBACK_DAYS + 1)}
+        for trashcan_id, dates in affected.items()
+    }
+    first_day = min(min(dates) for dates in affected.values())
+    last_day = max(max(dates) for dates in affected.values())
+    purged_before = purge_horizon()
+
+    # One query for the whole batch: affected days plus enough history for cycles
+    rows = FillRecord.objects.filter(
+        trashcan_id__in=list(affected),
+        timestamp__gte=day_start(first_day) - timedelta(days=CYCLE_LOOKBACK_DAYS),
+        timestamp__lt=day_start(last_day + timedelta(days=1)),
+    ).order_by('trashcan_id', 'timestamp', 'id').values_list('trashcan_id', 'id', 'timestamp', 'fill_level', 'source')
+
+    history = defaultdict(list)
+    for trashcan_id, record_id, timestamp, fill_level, source in rows.iterator(chunk_size=5000):
+        history[trashcan_id].append((record_id, timestamp, fill_level, source))
+
+    existing = {
+        (s.trashcan_id, s.date): s
+        for s in DailyBinSummary.objects.filter(
+            trashcan_id__in=list(affected), date__gte=first_day, date__lte=last_day
+        )
+    }
+
+    summaries = []
+    for trashcan_id, dates in affected.items():
+        records = history.get(trashcan_id, [])
+        by_day = defaultdict(list)
+        for record in records:
+            date = local_date(record[1])
+            if date in dates:
+                by_day[date].append(record)
+
+        cycle_rates = defaultdict(list)
+        cycles, _ = collection_cycles([(timestamp, level) for _, timestamp, level, _ in records])
+        for _, timestamp, rate in cycles:
+            cycle_rates[local_date(timestamp)].append(min(rate, 50))  # Same cap as the fill rate
+
+        for date in sorted(dates):
+            day_records = by_day.get(date)
+            stored = existing.get((trashcan_id, date))
+            if not day_records:
+                continue  # Nothing left to summarize (purged, deleted or in the future)
+            if stored and stored.record_count > len(day_records):
+                summaries.append(merge_late_records(stored, day_records))
+                continue
+            summary = summarize_day(trashcan_id, date, day_records, cycle_rates.get(date, []))
+            if stored and purged_before and day_start(date) - timedelta(days=CYCLE_LOOKBACK_DAYS) < purged_before:
+                summary.cycle_rate = stored.cycle_rate  # Cycle history partly purged
+            summaries.append(summary)
+
+    DailyBinSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['trashcan', 'date'],
+        update_fields=['max_fill', 'collection_count', 'ai_reading_count', 'record_count',
+                       'cycle_rate', 'overflow', 'last_record_id', 'updated_at'],
+    )
+    return summaries
+
+
+def affected_days(after_id=0, up_to_id=None):
+    """{bin_id: set(local dates)} touched by records with after_id < id (<= up_to_id)"""
+    records = FillRecord.objects.filter(id__gt=after_id)
+    if up_to_id is not None:
+        records = records.filter(id__lte=up_to_id)
+    pairs = records.annotate(
+        date=TruncDate('timestamp', tzinfo=timezone.get_current_timezone())
+    ).order_by().values_list('trashcan_id', 'date').distinct()
+
+    affected = defaultdict(set)
+    for trashcan_id, date in pairs.iterator(chunk_size=5000):
+        affected[trashcan_id].add(date)
+    return affected
+
+
+def late_days(last_id):
+    """
+    {bin_id: set(local dates)} of the days touched by the overlap below the
+    watermark whose summary counts fewer records than the database holds
+    """
+    overlap = affected_days(max(0, last_id - WATERMARK_OVERLAP_IDS), last_id)
+    if not overlap:
+        return {}
+    first_day = min(min(dates) for dates in overlap.values())
+    last_day = max(max(dates) for dates in overlap.values())
+
+    counts = FillRecord.objects.filter(
+        trashcan_id__in=list(overlap),
+        timestamp__gte=day_start(first_day),
+        timestamp__lt=day_start(last_day + timedelta(days=1)),
+    ).annotate(
+        date=TruncDate('timestamp', tzinfo=timezone.get_current_timezone())
+    ).order_by().values('trashcan_id', 'date').annotate(count=Count('id')).values_list('trashcan_id', 'date', 'count')
+    stored = {
+        (trashcan_id, date): record_count
+        for trashcan_id, date, record_count in DailyBinSummary.objects.filter(
+            trashcan_id__in=list(overlap), date__gte=first_day, date__lte=last_day
+        ).values_list('trashcan_id', 'date', 'record_count')
+    }
+
+    late = defaultdict(set)
+    for trashcan_id, date, count in counts.iterator(chunk_size=5000):
+        if date in overlap.get(trashcan_id, ()) and count > stored.get((trashcan_id, date), 0):
+            late[trashcan_id].add(date)
+    return late
+
+
+def rollup_records(rebuild=False):
+    """
+    Roll up every record above the watermark, and late commits below it
+    (all raw records with rebuild=True).
+
+    Returns (days_written, bins_touched).
+    """
+    last_id = 0 if rebuild else watermark()
+    affected = affected_days(last_id)
+    if last_id:
+        for trashcan_id, dates in late_days(last_id).items():
+            affected.setdefault(trashcan_id, set()).update(dates)
+
+    written = 0
+    bin_ids = sorted(affected)
+    for i in range(0, len(bin_ids), BATCH_BINS):
+        batch = {bin_id: affected[bin_id] for bin_id in bin_ids[i:i + BATCH_BINS]}
+        written += len(rollup_bins(batch))
+    return written, len(bin_ids)
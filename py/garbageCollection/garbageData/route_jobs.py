@@ -0,0 +1,130 @@
+"""
+Background route planning
+
+The dashboard submits a RouteJob and polls it, and a separate
+`manage.py route_worker` process runs plan_routes(), or plan_fleet() for
+all active trucks when the job is a fleet job. The queue is the
+RouteJob table itself, so no broker is needed. Several workers can run:
+a job is claimed with SELECT ... FOR UPDATE SKIP LOCKED where the database
+supports it (PostgreSQL), elsewhere a conditional status update decides
+which worker gets it. Jobs left running by a worker that died are
+requeued after STALE_JOB_SECONDS.
+
+Submitting is open to the dashboard (CSRF-protected), so the queue is
+bounded: capacities outside 1..MAX_TRUCK_CAPACITY are refused, an identical
+pending job is reused, and no new job is queued while MAX_PENDING_JOBS wait.
+"""
+import os
+import socket
+from datetime import timedelta
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from .models import RouteJob, Truck
+from .routing import plan_routes, plan_fleet, get_ors_client
+
+STALE_JOB_SECONDS = 600
+# Pending jobs tried per claim when the database has no SKIP LOCKED
+CLAIM_CANDIDATES = 5
+# Same range as the dashboard's capacity input
+MAX_TRUCK_CAPACITY = 50
+# Jobs waiting for a worker before new submissions are refused
+MAX_PENDING_JOBS = 20
+
+
+def submit(truck_capacity=None, fleet=False):
+    """
+    Queue a plan (one capacity, or the active trucks with fleet=True); an
+    identical job still pending or running is reused. None if the queue is full.
+    """
+    if fleet:
+        truck_capacity = None
+    existing = RouteJob.objects.filter(
+        truck_capacity=truck_capacity, fleet=fleet, status__in=['pending', 'running']
+    ).order_by('-created_at').first()
+    if existing:
+        return existing
+    if RouteJob.objects.filter(status='pending').count() >= MAX_PENDING_JOBS:
+        return None
+    return RouteJob.objects.create(truck_capacity=truck_capacity, fleet=fleet)
+
+
+def requeue_stale():
+    """Put jobs of workers that died mid-plan back in the queue"""
+    cutoff = timezone.now() - timedelta(seconds=STALE_JOB_SECONDS)
+    return RouteJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='pending', started_at=None, worker=''
+    )
+
+
+def claim(worker):
+    """Take the oldest pending job for this worker, None if the queue is empty"""
+    pending = RouteJob.objects.filter(status='pending').order_by('created_at')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = pending.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            return mark_running(job, worker)
+
+    # No row locks (SQLite): the conditional update alone decides who wins
+    for job in pending[:CLAIM_CANDIDATES]:
+        job = mark_running(job, worker)
+        if job is not None:
+            return job
+    return None
+
+
+def mark_running(job, worker):
+    """Flip a pending job to running; None if another worker got it first"""
+    started_at = timezone.now()
+    claimed = RouteJob.objects.filter(id=job.id, status='pending').update(
+        status='running', started_at=started_at, worker=worker
+    )
+    if not claimed:
+        return None
+    job.status, job.started_at, job.worker = 'running', started_at, worker
+    return job
+
+
+def run(job):
+    """Compute the plan of a claimed job and record the outcome"""
+    try:
+        if job.fleet:
+            vehicles = list(Truck.objects.filter(active=True))
+            if not vehicles:
+                raise ValueError("No active trucks, add them in the admin")
+            job.plan = plan_fleet(vehicles, get_ors_client())
+        else:
+            job.plan = plan_routes(job.truck_capacity, get_ors_client())
+        job.status = 'done'
+    except Exception as e:
+        job.status = 'failed'
+        job.error = f"{type(e).__name__}: {e}"
+    job.finished_at = timezone.now()
+    job.save(update_fields=['plan', 'status', 'error', 'finished_at'])
+    return job
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_status(job):
+    """JSON-friendly state of a job for the polling endpoint"""
+    status = {
+        'job_id': job.id,
+        'status': job.status,
+        'truck_capacity': job.truck_capacity,
+        'fleet': job.fleet,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'plan_id': job.plan_id,
+        'error': job.error or None,
+        'status_url': reverse('garbageData:api_route_job_status', args=[job.id]),
+        'result_url': reverse('garbageData:api_route_job_result', args=[job.id]),
+    }
+    if job.status == 'pending':
+        status['queue_position'] = RouteJob.objects.filter(status='pending', created_at__lte=job.created_at).count()
+    return status
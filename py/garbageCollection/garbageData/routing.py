@@ -0,0 +1,525 @@
+"""
+Collection route planning
+
+Bins that need collection are split into truck loads (greedy nearest
+neighbour over a KD-tree), the loads are improved by the local capacitated
+route solver in vrp.py and drawn with ORS directions (cached in the database,
+misses fetched concurrently). The result is stored as a RoutePlan: ordered stops with
+the prediction snapshot shown in the popups plus the route geometry, so a
+plan can be re-rendered (e.g. highlighting one route) without recomputing
+it or calling ORS again.
+
+plan_fleet() plans several trucks working at once, each with its own
+capacity and shift window (see fleet.py).
+"""
+import heapq
+import logging
+import os
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from decouple import config
+from django.conf import settings
+from django.utils import timezone
+import folium
+import openrouteservice
+from . import directions_cache, fleet, selection
+from .models import TrashCan, RoutePlan
+from .distance_matrix import AVERAGE_SPEED_KMH, load_matrix
+from .spatial import KDTree, haversine_m
+from .vrp import MAX_SOLVER_BINS, haversine_matrix, solve_routes
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURABLE LOCATIONS ---
+DEPOT_LOCATION = {
+    'lat': 42.616416,
+    'lon': 25.420107,
+    'name': 'Depot (Starting Point)'
+}
+
+LANDFILL_LOCATION = {
+    'lat': 42.592689,
+    'lon': 25.469143,
+    'name': 'Landfill (Disposal Site)'
+}
+
+DIRECTIONS_PROFILE = 'driving-car'
+
+ROUTE_COLORS = ['blue', 'red', 'green', 'purple', 'orange', 'brown', 'pink', 'cyan']
+
+# Bins shown when nothing needs collection
+FALLBACK_BINS = 20
+
+
+def get_ors_client():
+    """openrouteservice client, or None if it can't be configured"""
+    try:
+        return openrouteservice.Client(
+            key=config('API_KEY', default=None),
+            base_url=settings.ORS_BASE_URL,
+            timeout=settings.ORS_TIMEOUT,
+            retry_timeout=settings.ORS_TIMEOUT,
+        )
+    except Exception:
+        return None
+
+
+def route_start(route_idx):
+    """First truck load starts at the depot, the others at the landfill: (lat, lon)"""
+    location = DEPOT_LOCATION if route_idx == 0 else LANDFILL_LOCATION
+    return (location['lat'], location['lon'])
+
+
+def fallback_bins():
+    """No urgent bins: the FALLBACK_BINS closest to the depot"""
+    return heapq.nsmallest(
+        FALLBACK_BINS, TrashCan.objects.all(),
+        key=lambda b: haversine_m(b.latitude, b.longitude, DEPOT_LOCATION['lat'], DEPOT_LOCATION['lon'])
+    )
+
+
+def build_routes(bins_to_collect, truck_capacity):
+    """Split bins into truck loads with greedy nearest neighbour: [[TrashCan]]"""
+    routes = []
+    remaining = KDTree((idx, b.latitude, b.longitude) for idx, b in enumerate(bins_to_collect))
+
+    while len(remaining):
+        current_route = []
+
+        # Greedy nearest-neighbor algorithm for this route
+        current_location = route_start(len(routes))
+
+        while len(current_route) < truck_capacity and len(remaining):
+            # Find nearest unvisited bin to current location
+            idx = remaining.nearest(*current_location)
+            remaining.remove(idx)
+            nearest_bin = bins_to_collect[idx]
+
+            current_route.append(nearest_bin)
+            current_location = (nearest_bin.latitude, nearest_bin.longitude)
+
+        routes.append(current_route)
+    return routes
+
+
+def matrix_points(bins):
+    """(key, lat, lon) of the depot, the landfill and the bins, as stored in the distance matrix"""
+    return [('depot',) + route_start(0), ('landfill',) + route_start(1)] + \
+        [(b.id, b.latitude, b.longitude) for b in bins]
+
+
+def cost_matrix(bins, metric='distance'):
+    """
+    Solver costs between depot, landfill and bins: the stored distance matrix
+    when it is up to date for these bins (see build_distance_matrix), else
+    straight-line metres (seconds at AVERAGE_SPEED_KMH for durations).
+    """
+    points = matrix_points(bins)
+    stored = load_matrix()
+    if stored is not None and stored.covers(points):
+        return stored.submatrix([key for key, _, _ in points], metric)
+    matrix = haversine_matrix([(lat, lon) for _, lat, lon in points])
+    return matrix / (AVERAGE_SPEED_KMH / 3.6) if metric == 'duration' else matrix
+
+
+def solve_loads(bins_to_collect, greedy_routes, truck_capacity):
+    """Improve the greedy loads with the local route solver: [[TrashCan]]"""
+    if not bins_to_collect or len(bins_to_collect) > MAX_SOLVER_BINS:
+        return greedy_routes
+
+    # Solver nodes: 0 = depot, 1 = landfill, 2.. = bins
+    node_of = {b.id: idx + 2 for idx, b in enumerate(bins_to_collect)}
+    seed = [[node_of[b.id] for b in route] for route in greedy_routes]
+
+    solved = solve_routes(cost_matrix(bins_to_collect), truck_capacity, seed, settings.ROUTE_SOLVER_SECONDS)
+    return [[bins_to_collect[node - 2] for node in route] for route in solved]
+
+
+def route_coordinates(route_bins, route_idx):
+    """[lon, lat] sequence of one trip: start, stops, landfill"""
+    start_lat, start_lon = route_start(route_idx)
+    coords = [[start_lon, start_lat]]
+    coords += [[bin.longitude, bin.latitude] for bin in route_bins]
+    coords.append([LANDFILL_LOCATION['lon'], LANDFILL_LOCATION['lat']])
+    return coords
+
+
+def fetch_directions(client, coords, route_idx):
+    """ORS driving directions (GeoJSON) for one route, None on failure"""
+    try:
+        return client.directions(
+            coordinates=coords,
+            profile=DIRECTIONS_PROFILE,
+            format='geojson'
+        )
+    except Exception as e:
+        logger.warning("Route drawing failed for route %d: %s", route_idx + 1, e)
+        return None
+
+
+def fetch_all_directions(client, routes, trips=None):
+    """
+    Directions for all routes: from the directions cache, the rest from ORS
+    at once with at most ORS_MAX_CONCURRENCY in flight. Returns [directions
+    or None] in route order; routes still missing after ORS_DEADLINE seconds
+    are drawn without a road line.
+
+    trips: each route's trip number on its truck (default: one truck, so the
+    route index), which decides whether it starts at the depot.
+    """
+    results = [None] * len(routes)
+    trips = trips or range(len(routes))
+    coords = [route_coordinates(route_bins, trip) if route_bins else None
+              for route_bins, trip in zip(routes, trips)]
+    keys = [directions_cache.cache_key(c, DIRECTIONS_PROFILE) if c else None for c in coords]
+    cached = directions_cache.lookup([key for key in keys if key])
+
+    pending = []
+    for route_idx, key in enumerate(keys):
+        if key in cached:
+            results[route_idx] = cached[key]
+        elif key:
+            pending.append(route_idx)
+    if not client or not pending:
+        return results
+
+    pool = ThreadPoolExecutor(max_workers=min(settings.ORS_MAX_CONCURRENCY, len(pending)))
+    futures = {pool.submit(fetch_directions, client, coords[route_idx], route_idx): route_idx
+               for route_idx in pending}
+    try:
+        for future in as_completed(futures, timeout=settings.ORS_DEADLINE):
+            results[futures[future]] = future.result()
+    except FuturesTimeout:
+        missing = sum(1 for result in results if result is None)
+        logger.warning("Route drawing timed out after %ss, %d route(s) without geometry",
+                       settings.ORS_DEADLINE, missing)
+    finally:
+        # Don't wait for stragglers; their sockets time out on their own
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    directions_cache.store({
+        keys[route_idx]: (coords[route_idx], results[route_idx])
+        for route_idx in pending if results[route_idx] is not None
+    }, DIRECTIONS_PROFILE)
+    return results
+
+
+def route_distance_km(directions):
+    """Total driving distance of an ORS directions response"""
+    return directions['features'][0]['properties']['summary']['distance'] / 1000
+
+
+def stop_snapshot(can, prediction):
+    """What the route popups show for one stop, frozen at planning time"""
+    return {
+        'id': can.id,
+        'lat': can.latitude,
+        'lon': can.longitude,
+        'predicted_fill': prediction['predicted_fill'],
+        'daily_rate': prediction['daily_rate'],
+        'days_until_full': prediction['days_until_full'],
+        'last_emptied': can.last_emptied.strftime('%Y-%m-%d'),
+    }
+
+
+def next_shift_start(now=None):
+    """Next SHIFT_START_HOUR (local time) after now"""
+    local_now = timezone.localtime(now or timezone.now())
+    start = local_now.replace(hour=settings.SHIFT_START_HOUR, minute=0, second=0, microsecond=0)
+    if start <= local_now:
+        start += timedelta(days=1)
+    return start
+
+
+def plan_routes(truck_capacity, client=None, target_time=None, kind='on_demand', trucks=None, horizon_days=None):
+    """
+    Compute truck routes for the bins that need collection and store them as a
+    RoutePlan. Fill levels are projected to target_time (default: now).
+
+    Bins projected to overflow within horizon_days (default
+    settings.ROUTE_HORIZON_DAYS) are collected, earliest first; with a number
+    of trucks, at most trucks x truck_capacity of them.
+    """
+    target_time = target_time or timezone.now()
+    if horizon_days is None:
+        horizon_days = settings.ROUTE_HORIZON_DAYS
+    slots = trucks * truck_capacity if trucks else None
+    bin_ids, missed = selection.select_due_bins(target_time, horizon_days, slots)
+    bins_to_collect = list(TrashCan.objects.filter(id__in=bin_ids)) or fallback_bins()
+    predictions = TrashCan.get_fleet_predictions(bins_to_collect, now=target_time)
+
+    greedy_routes = build_routes(bins_to_collect, truck_capacity)
+    loads = solve_loads(bins_to_collect, greedy_routes, truck_capacity)
+    return store_plan(loads, predictions, client, kind=kind, target_time=target_time,
+                      truck_capacity=truck_capacity, trucks=trucks, missed_overflows=missed)
+
+
+def solver_workers():
+    """Worker processes for fleet planning (ROUTE_SOLVER_WORKERS, default: the CPUs this process may use)"""
+    if settings.ROUTE_SOLVER_WORKERS:
+        return settings.ROUTE_SOLVER_WORKERS
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def plan_fleet(vehicles, client=None, target_time=None, kind='on_demand', horizon_days=None):
+    """
+    Plan routes for several trucks working at the same time ([Truck], each
+    with its own capacity and shift window) and store them as a RoutePlan.
+    Due bins are selected as in plan_routes; fleet.py splits them between
+    the trucks and fits every truck's trips into its shift. A truck whose
+    shift is under way at target_time only gets the rest of it, any other
+    truck its whole next shift; fill levels are projected to target_time
+    for every truck.
+    """
+    target_time = target_time or timezone.now()
+    if horizon_days is None:
+        horizon_days = settings.ROUTE_HORIZON_DAYS
+    bin_ids, _ = selection.select_due_bins(target_time, horizon_days)
+    urgency = {bin_id: i for i, bin_id in enumerate(bin_ids)}
+    bins = sorted(TrashCan.objects.filter(id__in=bin_ids), key=lambda b: urgency[b.id]) or fallback_bins()
+    predictions = TrashCan.get_fleet_predictions(bins, now=target_time)
+
+    points = [(lat, lon) for _, lat, lon in matrix_points(bins)]
+    durations = cost_matrix(bins, 'duration')
+    fleet_trips, unassigned = fleet.solve_fleet(
+        points, cost_matrix(bins), durations,
+        [(truck.capacity, truck.available_seconds(target_time)) for truck in vehicles],
+        priority=[idx + 2 for idx in range(len(bins))],
+        time_limit=settings.ROUTE_SOLVER_SECONDS,
+        time_budget=settings.FLEET_PLAN_SECONDS,
+        workers=solver_workers(),
+    )
+
+    durations = durations.tolist()
+    loads, trips, truck_names, summary = [], [], [], []
+    for truck, truck_trips in zip(vehicles, fleet_trips):
+        summary.append({
+            'truck': truck.name,
+            'capacity': truck.capacity,
+            'shift': f"{truck.shift_start:%H:%M}-{truck.shift_end:%H:%M}",
+            'bins': sum(len(trip) for trip in truck_trips),
+            'trips': len(truck_trips),
+            'hours': round(fleet.shift_duration(durations, truck_trips) / 3600, 1),
+            'routes': list(range(len(loads), len(loads) + len(truck_trips))),
+        })
+        for trip_idx, trip in enumerate(truck_trips):
+            loads.append([bins[node - 2] for node in trip])
+            trips.append(trip_idx)
+            truck_names.append(truck.name)
+
+    return store_plan(
+        loads, predictions, client, trips=trips, truck_names=truck_names,
+        kind=kind, target_time=target_time,
+        truck_capacity=max((truck.capacity for truck in vehicles), default=0),
+        trucks=len(vehicles),
+        missed_overflows=len(unassigned) if bin_ids else 0,
+        fleet=summary,
+    )
+
+
+def store_plan(loads, predictions, client, trips=None, truck_names=None, **fields):
+    """
+    Fetch the road geometry of the truck loads and save them as a RoutePlan.
+    trips/truck_names: per load, its trip number and truck (fleet plans).
+    """
+    routes = []
+    total_distance = 0
+    all_directions = fetch_all_directions(client, loads, trips)
+    for route_idx, (route_bins, directions) in enumerate(zip(loads, all_directions)):
+        distance = None
+        if directions is not None:
+            distance = round(route_distance_km(directions), 1)
+            total_distance += route_distance_km(directions)
+
+        route = {
+            'route_number': route_idx + 1,
+            'stops': [stop_snapshot(can, predictions[can.id]) for can in route_bins],
+            'geometry': directions,
+            'distance': distance,
+        }
+        if truck_names:
+            route['truck'] = truck_names[route_idx]
+            route['trip'] = trips[route_idx] + 1
+        routes.append(route)
+
+    planned = [can for route_bins in loads for can in route_bins]
+    return RoutePlan.objects.create(
+        total_bins=len(planned),
+        total_distance=round(total_distance, 1),
+        expected_overflows=sum(1 for can in planned if predictions[can.id]['predicted_fill'] >= 100),
+        routes=routes,
+        **fields,
+    )
+
+
+def render_route_map(plan, highlight_route=None):
+    """Folium map HTML of a stored plan (no database or ORS access)"""
+    all_lats = [DEPOT_LOCATION['lat'], LANDFILL_LOCATION['lat']]
+    all_lons = [DEPOT_LOCATION['lon'], LANDFILL_LOCATION['lon']]
+    for route in plan.routes:
+        all_lats += [stop['lat'] for stop in route['stops']]
+        all_lons += [stop['lon'] for stop in route['stops']]
+
+    # Center map
+    avg_lat = sum(all_lats) / len(all_lats)
+    avg_lon = sum(all_lons) / len(all_lons)
+
+    m = folium.Map(location=[avg_lat, avg_lon], zoom_start=14,
+                   tiles='OpenStreetMap',
+                   zoom_control=True,
+                   scrollWheelZoom=True,
+                   dragging=True)
+
+    # Add Depot marker
+    folium.Marker(
+        location=[DEPOT_LOCATION['lat'], DEPOT_LOCATION['lon']],
+        popup=f"<b>{DEPOT_LOCATION['name']}</b>",
+        icon=folium.Icon(color='green', icon='home', prefix='fa'),
+        tooltip=DEPOT_LOCATION['name']
+    ).add_to(m)
+
+    # Add Landfill marker
+    folium.Marker(
+        location=[LANDFILL_LOCATION['lat'], LANDFILL_LOCATION['lon']],
+        popup=f"<b>{LANDFILL_LOCATION['name']}</b>",
+        icon=folium.Icon(color='black', icon='recycle', prefix='fa'),
+        tooltip=LANDFILL_LOCATION['name']
+    ).add_to(m)
+
+    bin_counter = 1
+
+    # Draw each route
+    for route_idx, route in enumerate(plan.routes):
+        route_color = ROUTE_COLORS[route_idx % len(ROUTE_COLORS)]
+        label = f"Route {route_idx + 1}"
+        if route.get('truck'):
+            label += f" ({route['truck']}, trip {route['trip']})"
+
+        # Adjust opacity based on highlight
+        if highlight_route is not None:
+            opacity = 1.0 if route_idx == highlight_route else 0.15
+            weight = 7 if route_idx == highlight_route else 2
+            show_markers = (route_idx == highlight_route)
+        else:
+            opacity = 0.7
+            weight = 5
+            show_markers = True
+
+        # Add numbered markers
+        for stop in route['stops']:
+            predicted_fill = stop['predicted_fill']
+
+            if show_markers:
+                # Determine status
+                if predicted_fill >= 100:
+                    status = '🚨 OVERFLOWING'
+                    status_color = '#d32f2f'
+                elif predicted_fill >= 80:
+                    status = '⚠️ FULL'
+                    status_color = '#f44336'
+                elif predicted_fill >= 60:
+                    status = '⚡ HIGH'
+                    status_color = '#ff9800'
+                else:
+                    status = '✓ MEDIUM'
+                    status_color = '#4caf50'
+
+                popup_html = f"""
+                <div style="font-family: Arial; font-size: 13px;">
+                    <b>🚛 {label}, Stop {bin_counter}</b><br>
+                    <div style="background: {status_color};
+                                color: white;
+                                padding: 5px;
+                                margin: 5px 0;
+                                border-radius: 3px;
+                                text-align: center;">
+                        <strong>{status}</strong>
+                    </div>
+                    <hr style="margin: 5px 0;">
+                    <b>Bin ID:</b> {stop['id']}<br>
+                    <b>Predicted Fill:</b> {predicted_fill:.1f}%<br>
+                    <b>Fill Rate:</b> {stop['daily_rate']:.1f}% /day<br>
+                    <b>Days Until Full:</b> {stop['days_until_full']:.1f}<br>
+                    <b>Last Emptied:</b> {stop['last_emptied']}
+                </div>
+                """
+
+                # Use different marker color for overflowing bins
+                marker_color = 'darkred' if predicted_fill >= 100 else 'red'
+
+                folium.Marker(
+                    location=[stop['lat'], stop['lon']],
+                    popup=folium.Popup(popup_html, max_width=250),
+                    icon=folium.Icon(color=marker_color, icon='trash', prefix='fa'),
+                    tooltip=f"Stop {bin_counter}: {predicted_fill:.0f}%"
+                ).add_to(m)
+
+                # Add number label
+                folium.Marker(
+                    location=[stop['lat'] - 0.0002, stop['lon']],
+                    icon=folium.DivIcon(html=f"""
+                        <div style="
+                            font-size: 14px;
+                            font-weight: bold;
+                            color: white;
+                            background-color: {route_color};
+                            border-radius: 50%;
+                            width: 32px;
+                            height: 32px;
+                            display: flex;
+                            align-items: center;
+                            justify-content: center;
+                            border: 3px solid white;
+                            box-shadow: 0 2px 8px rgba(0,0,0,0.5);
+                        ">
+                            {bin_counter}
+                        </div>
+                    """)
+                ).add_to(m)
+
+            bin_counter += 1
+
+        # Draw route line
+        if route['geometry']:
+            folium.GeoJson(
+                route['geometry'],
+                style_function=lambda x, color=route_color, op=opacity, w=weight: {
+                    'color': color,
+                    'weight': w,
+                    'opacity': op
+                },
+                tooltip=label if show_markers else None
+            ).add_to(m)
+
+    return m._repr_html_()
+
+
+def route_map_response(plan, highlight_route=None):
+    """JSON body of the route endpoint for a stored plan"""
+    return {
+        'html': render_route_map(plan, highlight_route),
+        'plan_id': plan.id,
+        'stats': {
+            'total_routes': len(plan.routes),
+            'total_bins': plan.total_bins,
+            'total_distance': plan.total_distance,
+            'truck_capacity': plan.truck_capacity,
+            'trucks': plan.trucks,
+            'kind': plan.kind,
+            'target_time': plan.target_time.isoformat() if plan.target_time else None,
+            'expected_overflows': plan.expected_overflows,
+            'missed_overflows': plan.missed_overflows,
+            'fleet': plan.fleet,
+            'directions_cache': directions_cache.stats(),
+        },
+        'route_details': [
+            {
+                'route_number': route['route_number'],
+                'bins': [stop['id'] for stop in route['stops']],
+                'distance': route['distance'],
+            }
+            for route in plan.routes if route['geometry']
+        ],
+    }
@@ -0,0 +1,181 @@
+"""
+Prediction-aware bin selection
+
+Every bin is keyed by the time its predicted fill reaches 100%. With the
+linear model that time only depends on the bin's stored state (last
+emptied, fill rate, recent reading), not on the current time, so the keys
+stay valid until the bin is scanned or its rate is recomputed. The keys
+live in a min-heap: ingest views re-key the bins they touch, and a route
+plan pops the most urgent bins instead of scanning the whole fleet.
+
+Selection for a plan: with `slots` = trucks x capacity, take the bins that
+overflow within the horizon after the target time, earliest first. Taking
+them earliest-deadline-first minimizes the overflows before the next
+collection; bins that are due but don't fit are reported as missed.
+
+The heap is per process. Changes made by other processes (route_worker
+planning after the web workers' scans, update_predictions) arrive through
+a change feed: when the response cache's data version moved, only the
+bins whose BinPrediction.updated_at is newer than the last sync (minus
+FEED_OVERLAP_SECONDS for slow commits and clock skew) are re-keyed. The
+whole fleet is only read on a cold start, when bins were added or deleted,
+and every FULL_RELOAD_SECONDS for edits that bypass the prediction rows
+(e.g. last_emptied changed in the admin).
+"""
+import heapq
+import math
+import threading
+import time
+from datetime import timedelta
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .fill_rate import READING_BLEND_HOURS
+from .models import TrashCan, BinPrediction
+from .response_cache import get_data_version
+
+# Feed rows re-read before the last sync (commit delay, clock skew between hosts)
+FEED_OVERLAP_SECONDS = 300
+FULL_RELOAD_SECONDS = 3600
+
+
+def overflow_at(last_emptied, state):
+    """Epoch seconds at which the predicted fill reaches 100% (inf if it never does)"""
+    rate = state.daily_rate
+    if rate <= 0:
+        return math.inf
+    # Time-based prediction: days_since_emptied * rate
+    overflow = last_emptied + timedelta(days=100 / rate)
+
+    if state.last_reading is not None and state.last_reading_at is not None:
+        # While the reading is recent the prediction is 50% time-based, 50% reading
+        blend_until = state.last_reading_at + timedelta(hours=READING_BLEND_HOURS)
+        blended = last_emptied + timedelta(days=(200 - state.last_reading) / rate)
+        overflow = blended if blended <= blend_until else max(overflow, blend_until)
+    return overflow.timestamp()
+
+
+class OverflowQueue:
+    """Min-heap of (overflow time, bin id) with lazy deletion: `keys` is the source of truth"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.heap = []
+        self.keys = {}
+        self.version = None
+        self.fleet = None
+        self.synced_at = None
+        self.loaded_at = None
+
+    def fleet_fingerprint(self):
+        """(bin count, highest id): changes when bins are added or deleted"""
+        fleet = TrashCan.objects.aggregate(count=Count('id'), last=Max('id'))
+        return fleet['count'], fleet['last']
+
+    def load(self, version=None):
+        """Rebuild from the database (two queries; missing prediction rows are computed)"""
+        synced_at = timezone.now()
+        fleet = self.fleet_fingerprint()
+        trash_cans = list(TrashCan.objects.only('id', 'last_emptied'))
+        states = BinPrediction.for_bins(trash_cans)
+        keys = {can.id: overflow_at(can.last_emptied, states[can.id]) for can in trash_cans}
+        heap = [(key, bin_id) for bin_id, key in keys.items()]
+        heapq.heapify(heap)
+        with self.lock:
+            self.keys, self.heap = keys, heap
+            self.version, self.fleet = version, fleet
+            self.synced_at, self.loaded_at = synced_at, time.monotonic()
+
+    def sync(self, version=None):
+        """Re-key the bins whose prediction changed since the last sync; returns how many were read"""
+        synced_at = timezone.now()
+        changed = BinPrediction.objects.filter(
+            updated_at__gte=self.synced_at - timedelta(seconds=FEED_OVERLAP_SECONDS)
+        ).select_related('trashcan').only(
+            'daily_rate', 'last_reading', 'last_reading_at', 'trashcan__id', 'trashcan__last_emptied'
+        )
+        count = 0
+        for state in changed:
+            self.update(state.trashcan, state)
+            count += 1
+        with self.lock:
+            self.version, self.synced_at = version, synced_at
+        return count
+
+    def ensure_fresh(self):
+        """Catch up with changes made (in any process) since the last load or sync"""
+        version = get_data_version()
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > FULL_RELOAD_SECONDS:
+            self.load(version)
+        elif version != self.version:
+            # Read the version first: a bump during the sync triggers another one
+            if self.fleet_fingerprint() != self.fleet:
+                self.load(version)
+            else:
+                self.sync(version)
+
+    def update(self, trashcan, state):
+        """New key for a bin whose last_emptied or prediction state changed"""
+        key = overflow_at(trashcan.last_emptied, state)
+        with self.lock:
+            if self.loaded_at is None or self.keys.get(trashcan.id) == key:
+                return
+            self.keys[trashcan.id] = key
+            heapq.heappush(self.heap, (key, trashcan.id))
+            # Drop superseded entries once they make up most of the heap
+            if len(self.heap) > 2 * len(self.keys) + 64:
+                self.heap = [(key, bin_id) for bin_id, key in self.keys.items()]
+                heapq.heapify(self.heap)
+
+    def remove(self, bin_id):
+        with self.lock:
+            self.keys.pop(bin_id, None)
+
+    def due(self, until, limit=None):
+        """
+        Bins overflowing by `until` (epoch seconds), earliest first:
+        (up to `limit` bin ids, number of further due bins left out).
+        """
+        with self.lock:
+            popped, selected, missed = [], [], 0
+            while self.heap and self.heap[0][0] <= until:
+                entry = heapq.heappop(self.heap)
+                key, bin_id = entry
+                if self.keys.get(bin_id) != key:
+                    continue  # Superseded or removed
+                popped.append(entry)
+                if limit is None or len(selected) < limit:
+                    selected.append(bin_id)
+                else:
+                    missed += 1
+            for entry in popped:
+                heapq.heappush(self.heap, entry)
+        return selected, missed
+
+    def __len__(self):
+        return len(self.keys)
+
+
+_queue = OverflowQueue()
+
+
+def select_due_bins(target_time, horizon_days, slots=None):
+    """
+    Bins to collect at target_time: those overflowing within horizon_days,
+    earliest first, at most `slots` of them. Returns (bin ids, missed count).
+    """
+    _queue.ensure_fresh()
+    until = (target_time + timedelta(days=horizon_days)).timestamp()
+    return _queue.due(until, slots)
+
+
+def update_bins(updates):
+    """Re-key bins after a scan: [(trashcan, BinPrediction)]"""
+    for trashcan, state in updates:
+        _queue.update(trashcan, state)
+
+
+@receiver(post_delete, sender=TrashCan)
+def _trashcan_deleted(sender, instance, **kwargs):
+    _queue.remove(instance.id)
@@ -0,0 +1,225 @@
+"""
+Columnar snapshots of the fill history for offline analysis
+
+The snapshot_history command copies FillRecord and TrashCan into plain
+NumPy .npy files under settings.SNAPSHOT_DIR, one column per file:
+
+    manifest.json
+    trashcans-<version>/{id,latitude,longitude,nfc_uid}.npy
+    records/<YYYY-MM>-<version>/{id,trashcan_id,timestamp,fill_level,source}.npy
+
+Records are split by calendar month (UTC, like the PostgreSQL partitions)
+and sorted by (trashcan_id, timestamp, id) inside a month. Timestamps are
+epoch microseconds and sources are SOURCE_CODES, i.e. the packed layout
+fill_rate.analyze_fleet_arrays takes.
+
+Snapshots are incremental: the manifest keeps the highest record id copied
+(like the daily rollups), and a run only reads newer records plus the
+rollups' WATERMARK_OVERLAP_IDS below the watermark, which catches rows
+that committed after a higher id had already been copied. Rows already in
+a month are skipped by id. Months that get new rows are rewritten under a
+new version and the manifest is replaced last, so a reader never sees a
+half-written snapshot. Records
+purged from the database by cleanup_old_records stay in the snapshot;
+--full rebuilds it from what the database holds now.
+
+load_snapshot() memory-maps the columns, so opening a snapshot is
+instant and only the months an analysis touches are read from disk.
+"""
+import json
+import os
+import shutil
+import numpy as np
+from django.conf import settings
+from .fill_rate import SOURCE_CODES, to_epoch_us
+from .models import FillRecord, TrashCan
+from .rollups import WATERMARK_OVERLAP_IDS
+
+MANIFEST_FILE = 'manifest.json'
+RECORD_COLUMNS = {
+    'id': np.int64,
+    'trashcan_id': np.int64,
+    'timestamp': np.int64,
+    'fill_level': np.int16,
+    'source': np.int8,
+}
+# Records read from the database per round trip
+CHUNK_SIZE = 50000
+
+
+def snapshot_dir():
+    return str(settings.SNAPSHOT_DIR)
+
+
+def month_keys(timestamps):
+    """'YYYY-MM' (UTC) of epoch microsecond timestamps"""
+    return np.datetime_as_string(np.asarray(timestamps).astype('datetime64[us]').astype('datetime64[M]'))
+
+
+class Snapshot:
+    """Read-only view of a stored snapshot (columns are memory-mapped)"""
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.months = sorted(manifest['months'])
+
+    def __len__(self):
+        return sum(month['rows'] for month in self.manifest['months'].values())
+
+    def load_columns(self, folder, columns):
+        return {column: np.load(os.path.join(self.directory, folder, f'{column}.npy'), mmap_mode='r')
+                for column in columns}
+
+    def month(self, key):
+        """{column: array} of one month's records"""
+        return self.load_columns(os.path.join('records', self.manifest['months'][key]['folder']), RECORD_COLUMNS)
+
+    def trashcans(self):
+        """{column: array} of id, latitude, longitude, nfc_uid ('' if none)"""
+        return self.load_columns(self.manifest['trashcans'], ('id', 'latitude', 'longitude', 'nfc_uid'))
+
+    def records(self, since=None, until=None, bins=None):
+        """
+        {column: array} of the records with since <= timestamp < until
+        (aware datetimes or epoch microseconds), sorted by
+        (trashcan_id, timestamp, id). Only the months in range are read.
+        """
+        since = to_epoch_us(since) if hasattr(since, 'tzinfo') else since
+        until = to_epoch_us(until) if hasattr(until, 'tzinfo') else until
+        first = month_keys([since])[0] if since is not None else None
+        last = month_keys([until - 1])[0] if until is not None else None
+        parts = []
+        for key in self.months:
+            if (first and key < first) or (last and key > last):
+                continue
+            month = self.month(key)
+            keep = np.ones(len(month['id']), dtype=bool)
+            if since is not None:
+                keep &= month['timestamp'] >= since
+            if until is not None:
+                keep &= month['timestamp'] < until
+            if bins is not None:
+                keep &= np.isin(month['trashcan_id'], bins)
+            parts.append({column: values[keep] for column, values in month.items()})
+
+        if not parts:
+            return {column: np.zeros(0, dtype=dtype) for column, dtype in RECORD_COLUMNS.items()}
+        merged = {column: np.concatenate([part[column] for part in parts]) for column in RECORD_COLUMNS}
+        order = np.lexsort((merged['id'], merged['timestamp'], merged['trashcan_id']))
+        return {column: values[order] for column, values in merged.items()}
+
+
+def load_snapshot(directory=None):
+    """The stored Snapshot, None if there is none"""
+    directory = directory or snapshot_dir()
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return Snapshot(directory, json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def write_columns(path, columns):
+    os.makedirs(path, exist_ok=True)
+    for column, values in columns.items():
+        np.save(os.path.join(path, f'{column}.npy'), values)
+
+
+def read_new_records(after_id):
+    """Records with id > after_id as packed arrays, in chunks: yields {column: array}"""
+    predicted = SOURCE_CODES['predicted']
+    rows = FillRecord.objects.filter(id__gt=after_id).order_by('id').values_list(
+        'id', 'trashcan_id', 'timestamp', 'fill_level', 'source'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield pack(chunk, predicted)
+            chunk = []
+    if chunk:
+        yield pack(chunk, predicted)
+
+
+def pack(rows, predicted):
+    return {
+        'id': np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        'trashcan_id': np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+        'timestamp': np.fromiter((to_epoch_us(row[2]) for row in rows), dtype=np.int64, count=len(rows)),
+        'fill_level': np.fromiter((row[3] for row in rows), dtype=np.int16, count=len(rows)),
+        'source': np.fromiter((SOURCE_CODES.get(row[4], predicted) for row in rows), dtype=np.int8, count=len(rows)),
+    }
+
+
+def update_snapshot(full=False, directory=None):
+    """
+    Append records added since the last snapshot (or rebuild with full=True)
+    and refresh the bin table. Returns (new records, months rewritten).
+    """
+    directory = directory or snapshot_dir()
+    os.makedirs(os.path.join(directory, 'records'), exist_ok=True)
+    previous = load_snapshot(directory)
+    old = None if full else previous
+    version = previous.manifest['version'] + 1 if previous else 1
+    watermark = old.manifest['watermark'] if old else 0
+
+    # New records (and the overlap below the watermark) grouped by month
+    new_parts = {}
+    for chunk in read_new_records(max(0, watermark - WATERMARK_OVERLAP_IDS) if old else 0):
+        keys = month_keys(chunk['timestamp'])
+        for key in np.unique(keys):
+            mask = keys == key
+            new_parts.setdefault(str(key), []).append({column: values[mask] for column, values in chunk.items()})
+        watermark = max(watermark, int(chunk['id'][-1]))
+
+    months = dict(old.manifest['months']) if old else {}
+    added = rewritten = 0
+    for key, parts in new_parts.items():
+        merged = {column: np.concatenate([part[column] for part in parts]) for column in RECORD_COLUMNS}
+        if key in months:
+            stored = {column: np.asarray(values) for column, values in old.month(key).items()}
+            # Overlap rows already copied by an earlier run
+            fresh = ~np.isin(merged['id'], stored['id'])
+            if not fresh.any():
+                continue
+            merged = {column: np.concatenate([stored[column], values[fresh]]) for column, values in merged.items()}
+            added += int(fresh.sum())
+        else:
+            added += len(merged['id'])
+        rewritten += 1
+        order = np.lexsort((merged['id'], merged['timestamp'], merged['trashcan_id']))
+        folder = f'{key}-{version}'
+        write_columns(os.path.join(directory, 'records', folder), {c: v[order] for c, v in merged.items()})
+        months[key] = {'folder': folder, 'rows': len(order)}
+
+    # The bin table is small: rewritten every time
+    bins = list(TrashCan.objects.order_by('id').values_list('id', 'latitude', 'longitude', 'nfc_uid'))
+    trashcans = f'trashcans-{version}'
+    write_columns(os.path.join(directory, trashcans), {
+        'id': np.array([row[0] for row in bins], dtype=np.int64),
+        'latitude': np.array([row[1] for row in bins], dtype=np.float64),
+        'longitude': np.array([row[2] for row in bins], dtype=np.float64),
+        'nfc_uid': np.array([row[3] or '' for row in bins], dtype=str),
+    })
+
+    manifest = {
+        'version': version,
+        'watermark': watermark,
+        'trashcans': trashcans,
+        'months': months,
+    }
+    tmp_path = os.path.join(directory, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+    # Superseded folders can go; open memory maps keep working until closed
+    current = {month['folder'] for month in months.values()}
+    for name in os.listdir(os.path.join(directory, 'records')):
+        if name not in current:
+            shutil.rmtree(os.path.join(directory, 'records', name))
+    for name in os.listdir(directory):
+        if name.startswith('trashcans-') and name != trashcans:
+            shutil.rmtree(os.path.join(directory, name))
+    return added, rewritten
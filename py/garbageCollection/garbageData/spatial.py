@@ -0,0 +1,132 @@
+"""
+Spatial index over bin coordinates
+
+Coordinates are projected to local metres (equirectangular around the mean
+latitude, accurate to well under a percent across a city) and stored in a
+2-d tree. Every node keeps the number of points still present in its
+subtree, so removing a point only marks it and updates the counts on its
+path, and nearest-neighbour queries skip emptied subtrees entirely; the
+tree is rebuilt around the remaining points once half of them are gone. The
+greedy route builder keeps returning to the depot and the landfill after
+their neighbourhood has been collected, which is where a plain grid would
+have to walk through rings of empty cells.
+"""
+import math
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class KDTree:
+    """
+    Nearest-neighbour index with deletion.
+
+    Built from (key, lat, lon) tuples; nearest() returns the key of the closest
+    remaining point (ties go to the point added first), remove() deletes one.
+    """
+
+    def __init__(self, points):
+        points = list(points)
+        self.ref_lat = sum(lat for _, lat, _ in points) / len(points) if points else 0.0
+        self.kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(self.ref_lat))
+        self.ky = math.radians(1) * EARTH_RADIUS_M
+        self._build([(key,) + self.project(lat, lon) + (order,)
+                     for order, (key, lat, lon) in enumerate(points)])
+
+    def project(self, lat, lon):
+        """Local (x, y) in metres"""
+        return lon * self.kx, lat * self.ky
+
+    def _build(self, points):
+        """(Re)build the tree from (key, x, y, order) tuples"""
+        n = len(points)
+        self.points = points
+        self.axis = [0] * n
+        self.left = [-1] * n
+        self.right = [-1] * n
+        self.parent = [-1] * n
+        self.count = [0] * n
+        self.alive = [True] * n
+        self.node_of = {}
+        self.size = self.built_size = n
+        self.root = self._split(list(range(n)), -1)
+
+    def _split(self, idxs, parent):
+        """Median split on the wider axis; returns the subtree's root node"""
+        if not idxs:
+            return -1
+        points = self.points
+        xs = [points[i][1] for i in idxs]
+        ys = [points[i][2] for i in idxs]
+        axis = 1 if max(xs) - min(xs) >= max(ys) - min(ys) else 2
+        idxs.sort(key=lambda i: points[i][axis])
+        mid = len(idxs) // 2
+
+        node = idxs[mid]
+        self.axis[node] = axis
+        self.parent[node] = parent
+        self.count[node] = len(idxs)
+        self.node_of[points[node][0]] = node
+        self.left[node] = self._split(idxs[:mid], node)
+        self.right[node] = self._split(idxs[mid + 1:], node)
+        return node
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        node = self.node_of.get(key)
+        return node is not None and self.alive[node]
+
+    def remove(self, key):
+        node = self.node_of[key]
+        if not self.alive[node]:
+            raise KeyError(key)
+        self.alive[node] = False
+        self.size -= 1
+        while node != -1:
+            self.count[node] -= 1
+            node = self.parent[node]
+
+        # Removed points still bound the subtrees; rebuild tight once half are gone
+        if self.size and self.size <= self.built_size // 2:
+            self._build([p for node, p in enumerate(self.points) if self.alive[node]])
+
+    def nearest(self, lat, lon):
+        """Key of the closest remaining point, None if the index is empty"""
+        if not self.size:
+            return None
+        qx, qy = self.project(lat, lon)
+        points, count, alive, axes = self.points, self.count, self.alive, self.axis
+        best_node, best = -1, (math.inf, math.inf)
+
+        # (node, distance from the query to the node's region along x and y)
+        stack = [(self.root, 0.0, 0.0)]
+        while stack:
+            node, off_x, off_y = stack.pop()
+            if node == -1 or not count[node] or off_x * off_x + off_y * off_y > best[0]:
+                continue
+            _, x, y, order = points[node]
+            if alive[node]:
+                candidate = ((x - qx) ** 2 + (y - qy) ** 2, order)
+                if candidate < best:
+                    best_node, best = node, candidate
+
+            if axes[node] == 1:
+                diff = qx - x
+                far = (self.left[node], self.right[node])[diff < 0], max(off_x, abs(diff)), off_y
+            else:
+                diff = qy - y
+                far = (self.left[node], self.right[node])[diff < 0], off_x, max(off_y, abs(diff))
+            near = (self.right[node], self.left[node])[diff < 0]
+            stack.append(far)
+            stack.append((near, off_x, off_y))
+        return points[best_node][0]
@@ -1,3 +1,933 @@
-from django.test import TestCase
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from unittest import mock
+import csv
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from django.db import IntegrityError, connection, transaction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import api_keys, backtest, directions_cache, distance_matrix, rollups, route_jobs, routing, snapshots
+from .fleet import shift_duration, solve_fleet
+from .selection import OverflowQueue
+from .spatial import KDTree
+from .vrp import LANDFILL, haversine_matrix, plan_cost, solve_routes
+from .fill_rate import (analyze_fill_history, analyze_fleet_arrays, to_epoch_us,
+                        LOOKBACK_DAYS, READING_BLEND_HOURS, SOURCE_CODES, SPIKE_STATE_CODES)
+from .models import (APIKey, DailyBinSummary, DirectionsCache, FillRecord, RouteJob, RoutePlan, TrashCan,
+                     Truck)
 
-# Create your tests here.
+NOW = datetime(2025, 6, 15, 12, 0, tzinfo=dt_timezone.utc)
+
+
+def generate_history(rng, now, days=LOOKBACK_DAYS):
+    """Random (timestamp, fill_level, source) history: collections, spike days and noise"""
+    records = []
+    current_time = now - timedelta(days=days) + timedelta(seconds=rng.uniform(0, 3600))
+    current_fill = rng.choice([0, 0, 50, 80])
+    base_rate = rng.uniform(3, 30)
+
+    for _ in range(rng.choice([0, 1, 2, 5, 10, 20, 40])):
+        current_time += timedelta(hours=rng.uniform(0, 48), microseconds=rng.randint(0, 999999))
+        if current_time > now:
+            break
+
+        # Occasional spike days (3-4x normal rate)
+        multiplier = rng.choice([1, 1, 1, 3, 4])
+        current_fill += base_rate * rng.uniform(0.2, 1.5) * multiplier
+
+        if current_fill >= 70 and rng.random() < 0.6:
+            # Collection: AI reading then emptied
+            records.append((current_time, min(int(current_fill), 110), 'ai'))
+            records.append((current_time + timedelta(minutes=1), rng.choice([0, 5, 15, 25]), 'manual'))
+            current_fill = 0
+        else:
+            level = int(current_fill) if rng.random() < 0.8 else rng.randint(0, 110)
+            records.append((current_time, level, rng.choice(['ai', 'predicted', 'manual'])))
+
+    return records
+
+
+def spike_history(now, open_levels):
+    """Two 3-day cycles with low readings after each emptying, then an open cycle of `open_levels`"""
+    records = []
+    for k in range(3):
+        emptied = now - timedelta(days=7.5 - 3 * k)
+        records.append((emptied, 0, 'manual'))
+        if k < 2:
+            records += [(emptied + timedelta(days=days), level, 'ai')
+                        for days, level in ((0.5, 20), (1, 30), (2, 40), (3, 90))]
+    step = timedelta(days=1.4) / len(open_levels)
+    records += [(now - timedelta(days=1.5) + step * (i + 1), level, 'ai') for i, level in enumerate(open_levels)]
+    return records
+
+
+def pack_fleet(histories):
+    """Packed kernel arrays of {bin_id: history}, sorted by (bin_id, timestamp)"""
+    rows = [(bin_id, to_epoch_us(t), level, SOURCE_CODES[source])
+            for bin_id, history in sorted(histories.items()) for t, level, source in history]
+    if not rows:
+        return [np.zeros(0, dtype=np.int64)] * 3 + [np.zeros(0, dtype=np.int8)]
+    bin_ids, timestamps, levels, sources = zip(*rows)
+    return (np.array(bin_ids, dtype=np.int64), np.array(timestamps, dtype=np.int64),
+            np.array(levels, dtype=np.int64), np.array(sources, dtype=np.int8))
+
+
+def pack_records(histories):
+    """{bin_id: history} in the snapshot layout backtest.build_replay takes (ids in history order)"""
+    bin_ids, timestamps, levels, sources = pack_fleet(histories)
+    ids = np.arange(1, len(bin_ids) + 1, dtype=np.int64)
+    order = np.lexsort((ids, timestamps, bin_ids))
+    return {
+        'id': ids[order],
+        'trashcan_id': bin_ids[order],
+        'timestamp': timestamps[order],
+        'fill_level': levels[order].astype(np.int16),
+        'source': sources[order],
+    }
+
+
+def latest_reading(history, now):
+    """Latest AI/manual level in the blend window (what get_latest_reading returns)"""
+    blend_from = now - timedelta(hours=READING_BLEND_HOURS)
+    real = [level for t, level, source in history if source != 'predicted' and t >= blend_from]
+    return real[-1] if real else None
+
+
+class FleetKernelParityTests(SimpleTestCase):
+    """analyze_fleet_arrays against analyze_fill_history, bin by bin"""
+
+    def assert_parity(self, histories, now):
+        analysis = analyze_fleet_arrays(*pack_fleet(histories), to_epoch_us(now))
+        position = {bin_id: i for i, bin_id in enumerate(analysis.bin_ids.tolist())}
+        states = set()
+        for bin_id, history in histories.items():
+            expected = analyze_fill_history([(t, level) for t, level, _ in history], now)
+            states.add(expected.spike_state)
+            if not history:
+                self.assertNotIn(bin_id, position)
+                continue
+            i = position[bin_id]
+            with self.subTest(bin_id=bin_id):
+                self.assertEqual(float(analysis.daily_rate[i]), expected.daily_rate)
+                self.assertEqual(SPIKE_STATE_CODES[analysis.spike_state[i]], expected.spike_state)
+                if expected.baseline is None:
+                    self.assertTrue(np.isnan(analysis.baseline[i]))
+                else:
+                    self.assertAlmostEqual(float(analysis.baseline[i]), expected.baseline, places=9)
+                reading = latest_reading(history, now)
+                if reading is None:
+                    self.assertTrue(np.isnan(analysis.last_reading[i]))
+                else:
+                    self.assertEqual(analysis.last_reading[i], reading)
+        return states
+
+    def test_random_fleet(self):
+        rng = random.Random(42)
+        histories = {bin_id: generate_history(rng, NOW) for bin_id in range(1, 1501)}
+        states = self.assert_parity(histories, NOW)
+        self.assertTrue({'default', 'normal', 'sustained'} <= states)
+
+    def test_edge_bins(self):
+        ts = [NOW - timedelta(days=9, hours=-h) for h in range(0, 200, 20)]
+        histories = {
+            1: [],                                                     # no records
+            2: [(ts[0], 40, 'ai')],                                    # one record
+            3: [(ts[0], 10, 'ai'), (ts[1], 80, 'ai')],                 # two records
+            4: [(t, 0 if i % 2 else 90, 'ai') for i, t in enumerate(ts)],           # regular cycles
+            5: [(t, 55, 'predicted') for t in ts],                     # no real readings
+            6: [(ts[0], 0, 'manual'), (NOW - timedelta(hours=1), 95, 'ai')],      # open cycle only
+            7: spike_history(NOW, [70]),                               # spike after a high reading
+            8: spike_history(NOW, [20, 30, 40, 70]),                   # spike after low readings
+        }
+        states = self.assert_parity(histories, NOW)
+        self.assertEqual(analyze_fill_history([(t, level) for t, level, _ in histories[7]], NOW).spike_state,
+                         'sustained')
+        self.assertEqual(analyze_fill_history([(t, level) for t, level, _ in histories[8]], NOW).spike_state,
+                         'false_alarm')
+        # 'spike' and 'unvalidated' can't come out of the algorithm: the open
+        # cycle is always the latest, so the one before it is validated or not
+        self.assertEqual(states, {'default', 'normal', 'sustained', 'false_alarm'})
+
+    def test_empty_fleet(self):
+        analysis = analyze_fleet_arrays(*pack_fleet({}), to_epoch_us(NOW))
+        self.assertEqual(len(analysis.bin_ids), 0)
+
+
+class FleetEngineParityTests(TestCase):
+    """TrashCan.get_fleet_fill_analysis against the per-bin model methods"""
+
+    def setUp(self):
+        rng = random.Random(7)
+        records = []
+        for bin_id in range(1, 61):
+            TrashCan.objects.create(id=bin_id, latitude=42.6 + bin_id / 1000, longitude=25.4)
+            # Older records too, so the lookback window is actually applied
+            records += [FillRecord(trashcan_id=bin_id, timestamp=t, fill_level=level, source=source)
+                        for t, level, source in generate_history(rng, NOW, days=LOOKBACK_DAYS + 5)]
+        FillRecord.objects.bulk_create(records)
+
+    def test_matches_per_bin_methods(self):
+        with mock.patch('django.utils.timezone.now', return_value=NOW):
+            fleet = TrashCan.get_fleet_fill_analysis()
+            _, analysis = TrashCan.analyze_fleet()
+            position = {bin_id: i for i, bin_id in enumerate(analysis.bin_ids.tolist())}
+            for can in TrashCan.objects.order_by('id'):
+                with self.subTest(bin_id=can.id):
+                    expected = can.analyze_fill_rate()
+                    self.assertEqual(fleet[can.id].daily_rate, can.get_average_daily_fill_rate())
+                    self.assertEqual(fleet[can.id].spike_state, expected.spike_state)
+                    if expected.baseline is None:
+                        self.assertIsNone(fleet[can.id].baseline)
+                    else:
+                        self.assertTrue(math.isclose(fleet[can.id].baseline, expected.baseline, rel_tol=1e-12))
+                    latest = can.get_latest_reading()
+                    i = position.get(can.id)
+                    if latest is None:
+                        self.assertTrue(i is None or np.isnan(analysis.last_reading[i]))
+                    else:
+                        self.assertEqual(analysis.last_reading[i], latest.fill_level)
+
+
+class RollupWatermarkTests(TestCase):
+    """Rows that commit below the watermark (slow transactions) still get rolled up"""
+
+    def setUp(self):
+        TrashCan.objects.create(id=1, latitude=42.6, longitude=25.4)
+        self.day = timezone.make_aware(datetime(2025, 6, 10, 12, 0))
+
+    def record(self, record_id, when, level=50):
+        FillRecord.objects.create(id=record_id, trashcan_id=1, timestamp=when, fill_level=level, source='ai')
+
+    def test_late_commit_below_watermark(self):
+        self.record(10, self.day)
+        self.record(20, self.day + timedelta(hours=1))
+        rollups.rollup_records()
+        self.assertEqual(rollups.watermark(), 20)
+
+        # Ids 15 and 16 were handed out before 20 but committed after the rollup
+        self.record(15, self.day + timedelta(hours=2), level=105)
+        self.record(16, self.day + timedelta(days=1))
+        rollups.rollup_records()
+
+        summary = DailyBinSummary.objects.get(trashcan_id=1, date=self.day.date())
+        self.assertEqual(summary.record_count, 3)
+        self.assertTrue(summary.overflow)
+        self.assertTrue(DailyBinSummary.objects.filter(trashcan_id=1, date=(self.day + timedelta(days=1)).date(),
+                                                       record_count=1).exists())
+        # Nothing left to do: the overlap is checked, not recomputed
+        self.assertEqual(rollups.rollup_records(), (0, 0))
+
+    def test_overlap_is_bounded(self):
+        self.record(1, self.day)
+        self.record(rollups.WATERMARK_OVERLAP_IDS + 100, self.day + timedelta(days=5))
+        rollups.rollup_records()
+        self.record(2, self.day + timedelta(days=3))  # Further below the watermark than the overlap
+        self.assertEqual(rollups.late_days(rollups.watermark()), {})
+        self.record(rollups.WATERMARK_OVERLAP_IDS + 50, self.day + timedelta(days=3, minutes=5))
+        self.assertEqual(rollups.late_days(rollups.watermark()), {1: {(self.day + timedelta(days=3)).date()}})
+
+
+class SnapshotWatermarkTests(TestCase):
+    """Snapshots pick up rows committed below their watermark, once"""
+
+    def setUp(self):
+        TrashCan.objects.create(id=1, latitude=42.6, longitude=25.4)
+        self.day = timezone.make_aware(datetime(2025, 6, 10, 12, 0))
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def record(self, record_id, when):
+        FillRecord.objects.create(id=record_id, trashcan_id=1, timestamp=when, fill_level=50, source='ai')
+
+    def test_late_commit_below_watermark(self):
+        self.record(10, self.day)
+        self.record(20, self.day + timedelta(hours=1))
+        self.assertEqual(snapshots.update_snapshot(directory=self.directory), (2, 1))
+
+        self.record(15, self.day + timedelta(hours=2))
+        self.record(16, self.day + timedelta(days=30))  # Next month
+        self.assertEqual(snapshots.update_snapshot(directory=self.directory), (2, 2))
+        snapshot = snapshots.load_snapshot(self.directory)
+        self.assertEqual(snapshot.manifest['watermark'], 20)
+        self.assertEqual(list(snapshot.records()['id']), [10, 20, 15, 16])
+
+        # Overlap rows already copied are neither added again nor rewritten
+        self.assertEqual(snapshots.update_snapshot(directory=self.directory), (0, 0))
+        self.assertEqual(len(snapshots.load_snapshot(self.directory)), 4)
+
+
+class BatchIngestTests(TestCase):
+    """/api/update/batch/: per-item results, duplicates and retries"""
+
+    def setUp(self):
+        now = timezone.now()
+        TrashCan.objects.create(id=1, latitude=42.6, longitude=25.4, nfc_uid='04A1B2',
+                                last_emptied=now - timedelta(days=2))
+        TrashCan.objects.create(id=2, latitude=42.61, longitude=25.41, last_emptied=now - timedelta(days=2))
+        self.key = APIKey.objects.create(device_name='test').key
+        self.first = (now - timedelta(hours=3)).isoformat()
+        self.second = (now - timedelta(hours=1)).isoformat()
+
+    def post(self, scans):
+        return self.client.post('/api/update/batch/', json.dumps({'scans': scans}), content_type='application/json',
+                                HTTP_X_API_KEY=self.key, secure=True)
+
+    def ai_records(self):
+        return FillRecord.objects.filter(source='ai').count()
+
+    def test_mixed_items(self):
+        response = self.post([
+            {'trashcan_id': 1, 'category': 'is_full', 'timestamp': self.first},
+            {'nfc_uid': '04A1B2', 'category': 'is_half', 'timestamp': self.second},
+            {'trashcan_id': 99, 'category': 'is_full'},
+            {'nfc_uid': 'FFFF', 'category': 'is_full'},
+            {'trashcan_id': 2, 'category': 'is_empty', 'timestamp': 'yesterday'},
+            'not a scan',
+            {'trashcan_id': 1, 'category': 'is_full', 'timestamp': self.first},  # Same scan twice
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['recorded'], data['duplicates'], data['failed']), (2, 1, 4))
+        results = data['results']
+        self.assertEqual([result['index'] for result in results], list(range(7)))
+        self.assertEqual(results[0]['collected_at_fill_level'], 95)
+        self.assertEqual(results[1]['collected_at_fill_level'], 50)
+        self.assertEqual(results[2]['error'], 'Bin 99 not found')
+        self.assertIn('FFFF', results[3]['error'])
+        self.assertIn('Invalid timestamp', results[4]['error'])
+        self.assertEqual(results[5]['error'], 'Scan must be an object')
+        self.assertTrue(results[6]['duplicate'])
+
+        self.assertEqual(self.ai_records(), 2)
+        self.assertEqual(FillRecord.objects.filter(source='manual', fill_level=0).count(), 2)
+        self.assertEqual(TrashCan.objects.get(id=1).last_emptied,
+                         datetime.fromisoformat(self.second) + timedelta(seconds=1))
+
+    def test_retry_is_reported_as_duplicate(self):
+        scans = [{'trashcan_id': 1, 'category': 'is_full', 'timestamp': self.first},
+                 {'trashcan_id': 2, 'category': 'is_half', 'timestamp': self.second}]
+        self.assertEqual(self.post(scans).json()['recorded'], 2)
+        last_emptied = TrashCan.objects.get(id=1).last_emptied
+
+        data = self.post(scans).json()
+        self.assertEqual((data['recorded'], data['duplicates'], data['failed']), (0, 2, 0))
+        self.assertEqual(self.ai_records(), 2)
+        self.assertEqual(FillRecord.objects.count(), 4)
+        self.assertEqual(TrashCan.objects.get(id=1).last_emptied, last_emptied)
+
+    def test_scan_stored_concurrently(self):
+        # The constraint backs up the duplicate check ...
+        FillRecord.objects.create(trashcan_id=1, fill_level=80, source='ai', timestamp=datetime.fromisoformat(self.first))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FillRecord.objects.create(trashcan_id=1, fill_level=60, source='ai',
+                                      timestamp=datetime.fromisoformat(self.first))
+
+        # ... and a violation inside the upload rolls it back as a retryable 409
+        with mock.patch('garbageData.views.FillRecord.objects.bulk_create', side_effect=IntegrityError):
+            response = self.post([{'trashcan_id': 2, 'category': 'is_full', 'timestamp': self.second}])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(FillRecord.objects.filter(trashcan_id=2).exists())
+        self.assertEqual(self.post([{'trashcan_id': 2, 'category': 'is_full', 'timestamp': self.second}])
+                         .json()['recorded'], 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        response = self.client.post('/api/update/batch/', '{', content_type='application/json',
+                                    HTTP_X_API_KEY=self.key, secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/update/batch/', json.dumps({'scans': [{'trashcan_id': 1}]}),
+                                    content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 401)
+
+
+class BacktestTests(SimpleTestCase):
+    """Backtest scores on a seeded history (pinned, so scoring changes show up)"""
+
+    def setUp(self):
+        rng = random.Random(25)
+        histories = {bin_id: generate_history(rng, NOW, days=60) for bin_id in range(1, 41)}
+        histories[41] = spike_history(NOW, [20, 95, 100])
+        self.replay = backtest.build_replay(pack_records(histories))
+
+    def test_replay(self):
+        self.assertEqual(len(self.replay.queries), 95)
+        self.assertEqual(self.replay.skipped, 124)
+
+    def test_predictors(self):
+        expected = {
+            'hybrid': (68.492631579, 41.290526316),
+            'constant': (50.045263158, -12.430526316),
+        }
+        for name, (mae, bias) in expected.items():
+            predictor = backtest.get_predictor(name)
+            with self.subTest(predictor=name):
+                self.assertEqual(backtest.check_parity(predictor, self.replay, len(self.replay.queries)), [])
+                result = backtest.run_backtest(predictor, self.replay)
+                self.assertEqual(result.predictions, 95)
+                self.assertAlmostEqual(result.mae, mae, places=6)
+                self.assertAlmostEqual(result.bias, bias, places=6)
+                self.assertEqual((result.spike_readings, result.spike_episodes, result.recovered), (24, 12, 2))
+
+
+class KDTreeTests(SimpleTestCase):
+    """KDTree.nearest and remove against brute force"""
+
+    def brute_nearest(self, tree, points, removed, lat, lon):
+        qx, qy = tree.project(lat, lon)
+        best = None
+        for order, (key, p_lat, p_lon) in enumerate(points):
+            if key in removed:
+                continue
+            x, y = tree.project(p_lat, p_lon)
+            candidate = ((x - qx) ** 2 + (y - qy) ** 2, order, key)
+            best = min(best, candidate) if best else candidate
+        return best[2] if best else None
+
+    def random_points(self, rng, n):
+        points = [(f'bin-{i}', 42.6 + rng.uniform(0, 0.05), 25.38 + rng.uniform(0, 0.08)) for i in range(n)]
+        # Duplicates and a tight cluster: ties go to the point added first
+        points += [(f'dup-{i}', lat, lon) for i, (_, lat, lon) in enumerate(points[:n // 10])]
+        points += [(f'cluster-{i}', 42.62 + rng.uniform(0, 1e-5), 25.4) for i in range(n // 10)]
+        return points
+
+    def test_nearest_and_remove(self):
+        rng = random.Random(3)
+        for n in (1, 2, 7, 60, 400):
+            points = self.random_points(rng, n)
+            tree = KDTree(points)
+            removed = set()
+            order = [key for key, _, _ in points]
+            rng.shuffle(order)
+            for step, key in enumerate(order):
+                for _ in range(3):
+                    lat, lon = 42.58 + rng.uniform(0, 0.09), 25.36 + rng.uniform(0, 0.12)
+                    if rng.random() < 0.3:  # Right on a point
+                        _, lat, lon = rng.choice(points)
+                    with self.subTest(n=n, step=step):
+                        self.assertEqual(tree.nearest(lat, lon), self.brute_nearest(tree, points, removed, lat, lon))
+                tree.remove(key)
+                removed.add(key)
+                self.assertNotIn(key, tree)
+                self.assertEqual(len(tree), len(points) - len(removed))
+                with self.assertRaises(KeyError):
+                    tree.remove(key)
+            self.assertIsNone(tree.nearest(42.6, 25.4))
+
+    def test_empty(self):
+        tree = KDTree([])
+        self.assertEqual(len(tree), 0)
+        self.assertIsNone(tree.nearest(42.6, 25.4))
+
+
+class RouteSolverTests(SimpleTestCase):
+    """solve_routes keeps every bin exactly once, respects capacity and never gets worse than its seed"""
+
+    def seed_routes(self, d, bins, capacity):
+        """Nearest-neighbour loads from the depot, then from the landfill"""
+        remaining, routes = set(bins), []
+        while remaining:
+            route, current = [], 0 if not routes else LANDFILL
+            while remaining and len(route) < capacity:
+                current = min(remaining, key=lambda node: (d[current][node], node))
+                remaining.remove(current)
+                route.append(current)
+            routes.append(route)
+        return routes
+
+    def assert_valid(self, routes, bins, capacity):
+        self.assertEqual(sorted(node for route in routes for node in route), sorted(bins))
+        for route in routes:
+            self.assertTrue(0 < len(route) <= capacity)
+
+    def test_random_instances(self):
+        rng = random.Random(11)
+        for case in range(24):
+            n = rng.choice([1, 2, 5, 20, 60, 120])
+            capacity = rng.choice([1, 3, 8, 20, 200])
+            points = [(42.6 + rng.uniform(0, 0.05), 25.38 + rng.uniform(0, 0.08)) for _ in range(n + 2)]
+            matrix = haversine_matrix(points)
+            if case % 2:
+                # Road distances aren't symmetric
+                matrix = matrix * np.array([[rng.uniform(1.0, 1.6) for _ in points] for _ in points])
+                np.fill_diagonal(matrix, 0)
+            d = matrix.tolist()
+            bins = list(range(2, n + 2))
+            seed = self.seed_routes(d, bins, capacity)
+
+            with self.subTest(case=case, n=n, capacity=capacity):
+                solved = solve_routes(matrix, capacity, seed, time_limit=0.2)
+                self.assert_valid(solved, bins, capacity)
+                self.assertLessEqual(plan_cost(d, solved), plan_cost(d, seed) + 1e-6)
+
+    def test_improves_a_bad_seed(self):
+        rng = random.Random(5)
+        points = [(42.6 + rng.uniform(0, 0.05), 25.38 + rng.uniform(0, 0.08)) for _ in range(42)]
+        matrix = haversine_matrix(points)
+        d = matrix.tolist()
+        bins = list(range(2, 42))
+        shuffled = bins[:]
+        rng.shuffle(shuffled)
+        seed = [shuffled[i:i + 10] for i in range(0, len(shuffled), 10)]
+        solved = solve_routes(matrix, 10, seed, time_limit=1.0)
+        self.assert_valid(solved, bins, 10)
+        self.assertLess(plan_cost(d, solved), plan_cost(d, seed) * 0.8)
+
+    def test_degenerate_inputs(self):
+        matrix = haversine_matrix([(42.6, 25.4), (42.61, 25.41), (42.62, 25.42)])
+        self.assertEqual(solve_routes(matrix, 5, []), [])
+        self.assertEqual(solve_routes(matrix, 5, [[2]]), [[2]])
+        self.assertEqual(solve_routes(matrix, 0, [[2]]), [[2]])
+
+
+class RouteJobSubmitTests(TestCase):
+    """/api/route/jobs/: dashboard-only, bounded capacities and queue"""
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.get('/', secure=True)  # Sets the CSRF cookie
+        self.token = self.client.cookies['csrftoken'].value
+
+    def submit(self, capacity, token=True):
+        headers = {'HTTP_X_CSRFTOKEN': self.token} if token else {}
+        return self.client.post('/api/route/jobs/', {'truck_capacity': capacity}, secure=True,
+                                HTTP_REFERER='https://testserver/', **headers)
+
+    def test_needs_csrf_token(self):
+        self.assertEqual(self.submit(20, token=False).status_code, 403)
+        response = self.submit(20)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['queue_position'], 1)
+
+    def test_capacity_range(self):
+        for capacity in ('0', '-3', 'abc', route_jobs.MAX_TRUCK_CAPACITY + 1):
+            with self.subTest(capacity=capacity):
+                self.assertEqual(self.submit(capacity).status_code, 400)
+        self.assertEqual(self.submit(route_jobs.MAX_TRUCK_CAPACITY).status_code, 202)
+        self.assertFalse(RouteJob.objects.exclude(truck_capacity=route_jobs.MAX_TRUCK_CAPACITY).exists())
+
+    def test_pending_queue_is_bounded(self):
+        for capacity in range(1, route_jobs.MAX_PENDING_JOBS + 1):
+            self.assertEqual(self.submit(capacity).status_code, 202)
+        # An identical job is still reused, a new one is refused
+        self.assertEqual(self.submit(1).status_code, 202)
+        response = self.submit(route_jobs.MAX_PENDING_JOBS + 1)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(RouteJob.objects.count(), route_jobs.MAX_PENDING_JOBS)
+
+    def test_fleet_jobs(self):
+        response = self.client.post('/api/route/jobs/', {'fleet': 1}, secure=True,
+                                    HTTP_REFERER='https://testserver/', HTTP_X_CSRFTOKEN=self.token)
+        self.assertEqual(response.status_code, 400)  # No active trucks
+        truck = Truck.objects.create(name='North')
+        response = self.client.post('/api/route/jobs/', {'fleet': 1}, secure=True,
+                                    HTTP_REFERER='https://testserver/', HTTP_X_CSRFTOKEN=self.token)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['fleet'])
+        self.assertIsNone(response.json()['truck_capacity'])
+
+        # Planned by the worker, never in the request
+        self.assertEqual(self.client.get('/api/route/?fleet=1', secure=True).status_code, 400)
+        job = route_jobs.claim('test')
+        with mock.patch('garbageData.route_jobs.plan_fleet', return_value=None) as plan_fleet:
+            route_jobs.run(job)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(plan_fleet.call_args.args[0], [truck])
+
+    def test_result_highlight(self):
+        job = route_jobs.submit(20)
+        RouteJob.objects.filter(id=job.id).update(status='done', plan=RoutePlan.objects.create(truck_capacity=20))
+        for highlight in ('abc', '-1'):
+            with self.subTest(highlight=highlight):
+                response = self.client.get(f'/api/route/jobs/{job.id}/result/?highlight={highlight}', secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+
+class RouteViewParamTests(TestCase):
+    """/api/route/ rejects bad query parameters before planning"""
+
+    def test_bad_params(self):
+        for query in ('trucks=abc', 'trucks=-1', 'trucks=0', 'truck_capacity=0',
+                      f'truck_capacity={route_jobs.MAX_TRUCK_CAPACITY + 1}', 'highlight=x', 'highlight=-1'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/route/?{query}', secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+
+class OverflowQueueTests(TestCase):
+    """The selection heap follows changes made in other processes"""
+
+    def test_reloads_on_data_version_change(self):
+        TrashCan.objects.create(id=1, latitude=42.6, longitude=25.4)
+        queue = OverflowQueue()
+        queue.ensure_fresh()
+        self.assertEqual(len(queue), 1)
+        with self.assertNumQueries(0):
+            queue.ensure_fresh()
+
+        # A bin added elsewhere bumps the version (as a scan or update_predictions would)
+        TrashCan.objects.create(id=2, latitude=42.61, longitude=25.41)
+        queue.ensure_fresh()
+        self.assertEqual(len(queue), 2)
+
+    def test_scan_rekeys_only_that_bin(self):
+        for bin_id in range(1, 4):
+            TrashCan.objects.create(id=bin_id, latitude=42.6 + bin_id / 100, longitude=25.4,
+                                    last_emptied=timezone.now() - timedelta(days=2))
+        queue = OverflowQueue()
+        queue.ensure_fresh()
+        keys, heap_size = dict(queue.keys), len(queue.heap)
+
+        # Emptied through another process: this queue only sees it in the change feed
+        TrashCan.objects.get(id=2).mark_as_emptied()
+        with mock.patch.object(queue, 'load', side_effect=AssertionError("full reload")):
+            queue.ensure_fresh()
+        self.assertEqual({bin_id for bin_id in keys if queue.keys[bin_id] != keys[bin_id]}, {2})
+        self.assertEqual(len(queue.heap), heap_size + 1)
+        # The superseded entry is skipped: bin 2 is no longer due
+        self.assertEqual(sorted(queue.due(keys[2])[0]), sorted(b for b in (1, 3) if keys[b] <= keys[2]))
+
+
+class TruckShiftTests(SimpleTestCase):
+    """Fleet plans only give a truck the part of its shift after the target time"""
+
+    def test_available_seconds(self):
+        day = Truck(name='Day', shift_start=dt_time(6, 0), shift_end=dt_time(14, 0))
+        night = Truck(name='Night', shift_start=dt_time(22, 0), shift_end=dt_time(6, 0))
+        for hour, day_hours, night_hours in ((6, 8, 8), (10, 4, 8), (14, 8, 8), (23, 8, 7), (3, 8, 3)):
+            at = timezone.make_aware(datetime(2025, 6, 15, hour))
+            with self.subTest(hour=hour):
+                self.assertEqual(day.available_seconds(at), day_hours * 3600)
+                self.assertEqual(night.available_seconds(at), night_hours * 3600)
+
+
+class FleetSolverTests(SimpleTestCase):
+    """solve_fleet respects every truck's capacity and remaining shift, and assigns each bin once"""
+
+    def setUp(self):
+        rng = random.Random(22)
+        self.points = [(42.60, 25.40), (42.66, 25.45)] + [
+            (42.6 + rng.uniform(-0.04, 0.04), 25.4 + rng.uniform(-0.06, 0.06)) for _ in range(80)
+        ]
+        self.distance = haversine_matrix(self.points)
+        self.duration = self.distance / 8.0  # ~30 km/h
+        self.priority = list(range(2, len(self.points)))
+        rng.shuffle(self.priority)
+        # At 10:00 the day truck has 4 of its 8 hours left, the night truck a whole shift
+        at = timezone.make_aware(datetime(2025, 6, 15, 10))
+        trucks = [
+            Truck(name='Day', capacity=10, shift_start=dt_time(6, 0), shift_end=dt_time(14, 0)),
+            Truck(name='Night', capacity=6, shift_start=dt_time(22, 0), shift_end=dt_time(6, 0)),
+            Truck(name='Short', capacity=4, shift_start=dt_time(9, 0), shift_end=dt_time(11, 0)),
+        ]
+        self.vehicles = [(truck.capacity, truck.available_seconds(at)) for truck in trucks]
+
+    def solve(self, workers):
+        return solve_fleet(self.points, self.distance, self.duration, self.vehicles, self.priority,
+                           time_limit=1.0, time_budget=3.0, workers=workers)
+
+    def test_constraints(self):
+        fleet_trips, unassigned = self.solve(workers=1)
+        durations = self.duration.tolist()
+        for (capacity, seconds), trips in zip(self.vehicles, fleet_trips):
+            self.assertTrue(all(0 < len(trip) <= capacity for trip in trips))
+            self.assertLessEqual(shift_duration(durations, trips), seconds)
+        assigned = [node for trips in fleet_trips for trip in trips for node in trip]
+        self.assertEqual(len(assigned), len(set(assigned)))
+        self.assertFalse(set(assigned) & set(unassigned))
+        self.assertEqual(sorted(assigned + unassigned), sorted(self.priority))
+        # The shifts are too short for all 80 bins, and every truck does some
+        self.assertTrue(unassigned)
+        self.assertTrue(all(fleet_trips))
+
+    def test_same_result_with_worker_processes(self):
+        expected = self.solve(workers=1)
+        for workers in (2, 3):
+            with self.subTest(workers=workers):
+                self.assertEqual(self.solve(workers=workers), expected)
+
+
+class FakeMatrixProvider:
+    """Asymmetric costs from the coordinates, recording every table() request"""
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = []
+
+    def table(self, sources, destinations):
+        self.calls.append((list(sources), list(destinations)))
+        src = np.asarray(sources, dtype=float).reshape(-1, 2)[:, None, :]
+        dst = np.asarray(destinations, dtype=float).reshape(-1, 2)[None, :, :]
+        distance = np.abs(dst - src) @ np.array([1e5, 2e5]) + 100 * (src[..., 0] - 42)
+        return distance, distance / 10
+
+
+class DistanceMatrixUpdateTests(SimpleTestCase):
+    """Incremental matrix updates only compute changed nodes and match a full rebuild"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.points = [('depot', 42.60, 25.40), ('landfill', 42.66, 25.45)] + [
+            (bin_id, 42.6 + bin_id / 1000, 25.4 + bin_id / 700) for bin_id in range(1, 7)
+        ]
+
+    def test_move_delete_add(self):
+        distance_matrix.update_matrix(self.points, FakeMatrixProvider(), directory=self.directory)
+        moved, added = (2, 42.615, 25.43), (7, 42.607, 25.41)
+        points = [moved if point[0] == 2 else point for point in self.points if point[0] != 3] + [added]
+
+        provider = FakeMatrixProvider()
+        nodes, computed, removed = distance_matrix.update_matrix(points, provider, directory=self.directory)
+        self.assertEqual((nodes, computed, removed), (8, 2, 1))
+        # One block: the changed rows against every node, then their columns
+        changed = [moved[1:], added[1:]]
+        (row_sources, row_destinations), (column_sources, column_destinations) = provider.calls
+        self.assertEqual((row_sources, column_destinations), (changed, changed))
+        self.assertEqual(len(row_destinations), 8)
+        self.assertEqual(len(column_sources), 8)
+
+        full_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, full_directory)
+        distance_matrix.update_matrix(points, FakeMatrixProvider(), directory=full_directory)
+        incremental = distance_matrix.load_matrix(self.directory)
+        full = distance_matrix.load_matrix(full_directory)
+        keys = [point[0] for point in points]
+        self.assertCountEqual(incremental.keys, keys)
+        self.assertTrue(incremental.covers(points))
+        for metric in distance_matrix.METRICS:
+            with self.subTest(metric=metric):
+                np.testing.assert_allclose(incremental.submatrix(keys, metric), full.submatrix(keys, metric),
+                                           rtol=1e-6)
+
+    def test_unchanged_points(self):
+        distance_matrix.update_matrix(self.points, FakeMatrixProvider(), directory=self.directory)
+        provider = FakeMatrixProvider()
+        self.assertEqual(distance_matrix.update_matrix(self.points, provider, directory=self.directory), (8, 0, 0))
+        self.assertEqual(provider.calls, [])
+
+
+class DirectionsCacheTests(TestCase):
+    """Content-addressed keys, LRU eviction and hit/miss counters"""
+
+    def setUp(self):
+        cache.clear()
+        self.base = timezone.now() - timedelta(days=1)
+        self.routes = [[[25.4 + i / 100, 42.6], [25.41, 42.61 + i / 100]] for i in range(5)]
+        self.keys = [directions_cache.cache_key(coordinates, 'driving-car') for coordinates in self.routes]
+        directions_cache.store({key: (coordinates, {'type': 'FeatureCollection', 'route': i})
+                                for i, (key, coordinates) in enumerate(zip(self.keys, self.routes))}, 'driving-car')
+        for i, key in enumerate(self.keys):
+            DirectionsCache.objects.filter(key=key).update(last_used=self.base + timedelta(hours=i))
+
+    def test_cache_key(self):
+        route = self.routes[0]
+        self.assertEqual(directions_cache.cache_key([list(point) for point in route], 'driving-car'), self.keys[0])
+        # Rounded to ~1 m
+        nudged = [[lon + 1e-7, lat - 1e-7] for lon, lat in route]
+        self.assertEqual(directions_cache.cache_key(nudged, 'driving-car'), self.keys[0])
+        self.assertNotEqual(directions_cache.cache_key(route[::-1], 'driving-car'), self.keys[0])
+        self.assertNotEqual(directions_cache.cache_key(route, 'driving-hgv'), self.keys[0])
+
+    def test_least_recently_used_evicted_first(self):
+        # Looking up the oldest entry makes it the most recent
+        with mock.patch('django.utils.timezone.now', return_value=self.base + timedelta(hours=10)):
+            self.assertEqual(directions_cache.lookup([self.keys[0]])[self.keys[0]]['route'], 0)
+        self.assertEqual(DirectionsCache.objects.get(key=self.keys[0]).hits, 1)
+
+        with override_settings(DIRECTIONS_CACHE_MAX_ENTRIES=3):
+            self.assertEqual(directions_cache.evict(), 2)
+        self.assertCountEqual(DirectionsCache.objects.values_list('key', flat=True),
+                              [self.keys[0], self.keys[3], self.keys[4]])
+        with override_settings(DIRECTIONS_CACHE_MAX_ENTRIES=3):
+            self.assertEqual(directions_cache.evict(), 0)
+
+    def test_stats(self):
+        found = directions_cache.lookup([self.keys[1], self.keys[1], 'f' * 64])
+        self.assertEqual(list(found), [self.keys[1]])
+        stats = directions_cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']), (5, 2, 1, 0.667))
+
+
+class SlowDirectionsClient:
+    """ORS stub: the route ending at a stalled bin never answers before the test releases it"""
+
+    def __init__(self, stalled_lon):
+        self.stalled_lon = stalled_lon
+        self.release = threading.Event()
+
+    def directions(self, coordinates, profile, format):
+        if any(lon == self.stalled_lon for lon, _ in coordinates):
+            self.release.wait(10)
+        return {'type': 'FeatureCollection', 'features': [{'properties': {'summary': {'distance': 1000}}}]}
+
+
+class DirectionsDeadlineTests(TestCase):
+    """Route drawing returns at ORS_DEADLINE with the routes that finished"""
+
+    def test_deadline(self):
+        routes = [[TrashCan(id=i, latitude=42.6 + i / 100, longitude=25.4 + i / 100)] for i in range(1, 4)]
+        client = SlowDirectionsClient(stalled_lon=routes[1][0].longitude)
+        self.addCleanup(client.release.set)
+
+        start = time.monotonic()
+        with override_settings(ORS_DEADLINE=0.3), self.assertLogs('garbageData.routing', 'WARNING') as logs:
+            results = routing.fetch_all_directions(client, routes)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertIsNotNone(results[0])
+        self.assertIsNone(results[1])
+        self.assertIsNotNone(results[2])
+        self.assertIn('1 route(s) without geometry', logs.output[0])
+        # Only the finished routes are cached
+        self.assertEqual(DirectionsCache.objects.count(), 2)
+
+
+class ResponseCacheTests(TestCase):
+    """Cached map responses are served until the data version moves"""
+
+    def setUp(self):
+        cache.clear()
+        self.trashcan = TrashCan.objects.create(id=1, latitude=42.6, longitude=25.4,
+                                                last_emptied=timezone.now() - timedelta(days=2))
+        self.key = APIKey.objects.create(device_name='test').key
+
+    def heatmap(self):
+        response = self.client.get('/api/heatmap/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def test_cached_response_served(self):
+        self.assertEqual(self.heatmap(), 'MISS')
+        self.assertEqual(self.heatmap(), 'HIT')
+
+    def test_trashcan_save_invalidates(self):
+        self.heatmap()
+        self.trashcan.latitude = 42.61
+        self.trashcan.save()
+        self.assertEqual(self.heatmap(), 'MISS')
+
+    def test_truck_save_invalidates(self):
+        self.heatmap()
+        Truck.objects.create(name='North')
+        self.assertEqual(self.heatmap(), 'MISS')
+
+    def test_scan_invalidates(self):
+        self.heatmap()
+        response = self.client.post('/api/update/batch/', json.dumps({'scans': [
+            {'trashcan_id': 1, 'category': 'is_half', 'timestamp': (timezone.now() - timedelta(hours=1)).isoformat()},
+        ]}), content_type='application/json', HTTP_X_API_KEY=self.key, secure=True)
+        self.assertEqual(response.json()['recorded'], 1)
+        self.assertEqual(self.heatmap(), 'MISS')
+
+
+class APIKeyCacheTests(TestCase):
+    """Active keys are cached in-process; last_used is written in bulk"""
+
+    def setUp(self):
+        api_keys.invalidate()
+        api_keys.flush_last_used()
+        self.api_key = APIKey.objects.create(device_name='test')
+
+    def get(self):
+        return self.client.get('/api/trashcans/', HTTP_X_API_KEY=self.api_key.key, secure=True).status_code
+
+    def test_deactivated_key_rejected_after_invalidate(self):
+        self.assertEqual(self.get(), 200)
+        # What the admin deactivate action does: update() sends no post_save
+        APIKey.objects.filter(id=self.api_key.id).update(is_active=False)
+        self.assertEqual(self.get(), 200)  # Still cached
+        api_keys.invalidate()
+        self.assertEqual(self.get(), 403)
+
+    def test_saved_key_invalidates(self):
+        self.assertEqual(self.get(), 200)
+        self.api_key.is_active = False
+        self.api_key.save()
+        self.assertEqual(self.get(), 403)
+
+    def test_last_used_flushed_in_bulk(self):
+        with mock.patch.object(api_keys, 'LAST_USED_FLUSH_SECONDS', 3600), \
+                CaptureQueriesContext(connection) as queries:
+            for _ in range(5):
+                self.assertEqual(self.get(), 200)
+        table = APIKey._meta.db_table
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE') and table in q['sql']])
+        self.assertIsNone(APIKey.objects.get(id=self.api_key.id).last_used)
+
+        with self.assertNumQueries(1):
+            api_keys.flush_last_used()
+        self.assertIsNotNone(APIKey.objects.get(id=self.api_key.id).last_used)
+        with self.assertNumQueries(0):
+            api_keys.flush_last_used()  # Nothing pending
+
+
+class ExportTests(TestCase):
+    """/api/export/records/ and export_records: filters and both formats round-trip"""
+
+    def setUp(self):
+        api_keys.invalidate()
+        self.key = APIKey.objects.create(device_name='test').key
+        for bin_id in (1, 2):
+            TrashCan.objects.create(id=bin_id, latitude=42.6, longitude=25.4)
+        self.records = []
+        for day in range(1, 5):
+            for bin_id, source in ((1, 'ai'), (2, 'manual')):
+                self.records.append(FillRecord.objects.create(
+                    trashcan_id=bin_id, source=source, fill_level=10 * day + bin_id,
+                    timestamp=datetime(2025, 6, day, 9, 30, 15, 250000, tzinfo=dt_timezone.utc),
+                ))
+        # Days 2 and 3 (UTC bounds), bin 1 only
+        self.expected = [record for record in self.records if record.trashcan_id == 1 and 2 <= record.timestamp.day <= 3]
+        self.query = {'since': '2025-06-02T00:00:00+00:00', 'until': '2025-06-04T00:00:00+00:00', 'bin': '1'}
+
+    def export(self, **params):
+        response = self.client.get('/api/export/records/', {**self.query, **params}, HTTP_X_API_KEY=self.key,
+                                   secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def assert_rows(self, rows):
+        self.assertEqual([(int(row['id']), int(row['trashcan_id']), datetime.fromisoformat(row['timestamp']),
+                           int(row['fill_level']), row['source']) for row in rows],
+                         [(record.id, record.trashcan_id, record.timestamp, record.fill_level, record.source)
+                          for record in self.expected])
+
+    def test_ndjson(self):
+        response, body = self.export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertRegex(response['Content-Disposition'], r'^attachment; filename="fill-records-\d{8}\.ndjson"$')
+        self.assert_rows([json.loads(line) for line in body.splitlines()])
+
+    def test_csv(self):
+        response, body = self.export(format='csv', source='ai,manual')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertTrue(response['Content-Disposition'].endswith('.csv"'))
+        self.assert_rows(list(csv.DictReader(io.StringIO(body))))
+
+        # The command writes the same export
+        path = os.path.join(tempfile.mkdtemp(), 'records.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('export_records', format='csv', since=self.query['since'], until=self.query['until'],
+                     bins=[1], output=path, stdout=io.StringIO())
+        with open(path, newline='') as f:
+            self.assertEqual(f.read(), body)
+
+    def test_bad_params(self):
+        for params in ({'format': 'xml'}, {'since': 'yesterday'}, {'source': 'robot'}, {'bin': 'x'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/export/records/', params, HTTP_X_API_KEY=self.key, secure=True)
+                self.assertEqual(response.status_code, 400)
@@ -8,11 +8,18 @@ urlpatterns = [
     
     # Map generation endpoints
     path('api/heatmap/', views.generate_heatmap_view, name='generate_heatmap'),
+    path('api/heatmap/data/', views.api_heatmap_data, name='api_heatmap_data'),
     path('api/route/', views.generate_route_view, name='generate_route'),
+    path('api/route/scheduled/', views.api_scheduled_route, name='api_scheduled_route'),
+    path('api/route/jobs/', views.api_submit_route_job, name='api_submit_route_job'),
+    path('api/route/jobs/<int:job_id>/', views.api_route_job_status, name='api_route_job_status'),
+    path('api/route/jobs/<int:job_id>/result/', views.api_route_job_result, name='api_route_job_result'),
     
     # API endpoints for Raspberry Pi
     path('api/trashcan/<int:trashcan_id>/', views.api_get_trashcan, name='api_get_trashcan'),
     path('api/update/', views.api_update_fill_level, name='api_update_fill_level'),
+    path('api/update/batch/', views.api_update_fill_level_batch, name='api_update_fill_level_batch'),
     path('api/emptied/', views.api_mark_emptied, name='api_mark_emptied'),
     path('api/trashcans/', views.api_list_trashcans, name='api_list_trashcans'),
+    path('api/export/records/', views.api_export_records, name='api_export_records'),
 ]
\ No newline at end of file
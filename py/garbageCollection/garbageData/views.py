@@ -1,15 +1,22 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from .models import TrashCan, FillRecord, APIKey
+from django.views.decorators.http import require_http_methods, etag
+from django.utils.cache import patch_cache_control
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Sum, Exists, OuterRef, Subquery, Q
+from .models import TrashCan, FillRecord, BinPrediction, RoutePlan, RouteJob, Truck
+from .routing import plan_routes, route_map_response, get_ors_client
+from . import api_keys, exports, route_jobs, selection
+from .response_cache import cached_by_data_version, bump_data_version
 import json
-from datetime import datetime, timedelta
+import zlib
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 import folium
 from folium.plugins import HeatMap, MarkerCluster
-import openrouteservice
-from decouple import config
 import pytz
 
 # Sofia timezone for display
@@ -21,20 +28,30 @@ def format_local_time(dt):
         return dt.astimezone(SOFIA_TZ).strftime('%Y-%m-%d %H:%M')
     return '-'
 
-# --- CONFIGURABLE LOCATIONS ---
-DEPOT_LOCATION = {
-    'lat': 42.616416,
-    'lon': 25.420107,
-    'name': 'Depot (Starting Point)'
-}
+# Fill status by predicted fill level: (lower bound, status), highest first
+FILL_STATUSES = [(100, 'overflow'), (80, 'full'), (60, 'high'), (40, 'medium'), (0, 'low')]
 
-LANDFILL_LOCATION = {
-    'lat': 42.592689,
-    'lon': 25.469143,
-    'name': 'Landfill (Disposal Site)'
-}
+# A scheduled plan is still served this long after its shift started
+SCHEDULED_PLAN_GRACE = timedelta(hours=12)
+
+# Heatmap data predictions are snapshotted to this interval so ETags stay stable
+HEATMAP_SNAPSHOT_SECONDS = 300
+
+
+def fill_status(predicted_fill):
+    for lower_bound, status in FILL_STATUSES:
+        if predicted_fill >= lower_bound:
+            return status
+    return 'low'
 
-ROUTE_COLORS = ['blue', 'red', 'green', 'purple', 'orange', 'brown', 'pink', 'cyan']
+
+def with_latest_record(trash_cans):
+    """Annotate bins with their latest fill record in the same query"""
+    latest = FillRecord.objects.filter(trashcan=OuterRef('pk')).order_by('-timestamp')
+    return trash_cans.annotate(
+        latest_fill=Subquery(latest.values('fill_level')[:1]),
+        latest_timestamp=Subquery(latest.values('timestamp')[:1]),
+    )
 
 # Mapping from AI categories to fill levels
 # is_scattered = overflowing (trash spilling outside bin)
@@ -45,6 +62,12 @@ AI_CATEGORY_MAP = {
     'is_scattered': 110  # OVERFLOWING - more than 100% full, trash outside bin
 }
 
+# Batched uploads (offline RPi queue, fleet gateways)
+MAX_BATCH_SCANS = 500
+EMPTIED_AFTER_SCAN = timedelta(seconds=1)  # 0% record goes right after the AI reading
+MAX_CLOCK_SKEW = timedelta(minutes=5)  # Tolerated for device clocks running ahead
+MAX_BATCH_BODY_BYTES = 5 * 1024 * 1024  # Limit for gzip-compressed bodies once inflated
+
 # --- AUTHENTICATION DECORATOR ---
 def require_api_key(view_func):
     """Simple API key check - no rate limiting"""
@@ -59,23 +82,20 @@ def require_api_key(view_func):
                 'hint': 'Include X-API-Key header or ?api_key= parameter'
             }, status=401)
         
-        # Check if key exists and is active
-        try:
-            key_obj = APIKey.objects.get(key=api_key, is_active=True)
-            
-            # Update last used timestamp
-            key_obj.last_used = timezone.now()
-            key_obj.save(update_fields=['last_used'])
-            
-            # Store device name in request for logging
-            request.api_device = key_obj.device_name
-            
-        except APIKey.DoesNotExist:
+        # Check if key exists and is active (in-process cache, no query per request)
+        key_obj = api_keys.get_active_key(api_key)
+        if key_obj is None:
             return JsonResponse({
                 'success': False,
                 'error': 'Invalid or inactive API key'
             }, status=403)
         
+        # Update last used timestamp (coalesced, written in bulk)
+        api_keys.touch(key_obj)
+        
+        # Store device name in request for logging
+        request.api_device = key_obj.device_name
+        
         return view_func(request, *args, **kwargs)
     
     return wrapper
@@ -96,10 +116,23 @@ def home(request):
     warning_count = 0   # 70-89%
     total_collections_last_week = 0
     
-    for can in TrashCan.objects.all():
-        predicted_fill = can.get_predicted_fill_level()
-        days_until_full = can.get_days_until_full()
-        daily_rate = can.get_average_daily_fill_rate()
+    trash_cans = list(TrashCan.objects.all())
+    predictions = TrashCan.get_fleet_predictions(trash_cans)
+    
+    # Count recent collections (last 7 days) for all bins in one query
+    week_ago = timezone.now() - timedelta(days=7)
+    weekly_counts = dict(
+        FillRecord.objects.filter(
+            fill_level=0,  # Empty records indicate collection
+            timestamp__gte=week_ago
+        ).values('trashcan').annotate(count=Count('id')).values_list('trashcan', 'count')
+    )
+    
+    for can in trash_cans:
+        prediction = predictions[can.id]
+        predicted_fill = prediction['predicted_fill']
+        days_until_full = prediction['days_until_full']
+        daily_rate = prediction['daily_rate']
         
         # Count by severity
         if predicted_fill >= 100:
@@ -109,13 +142,7 @@ def home(request):
         elif predicted_fill >= 70:
             warning_count += 1
         
-        # Count recent collections (last 7 days)
-        week_ago = timezone.now() - timedelta(days=7)
-        weekly_collections = FillRecord.objects.filter(
-            trashcan=can,
-            fill_level=0,  # Empty records indicate collection
-            timestamp__gte=week_ago
-        ).count()
+        weekly_collections = weekly_counts.get(can.id, 0)
         total_collections_last_week += weekly_collections
         
         can_stats.append({
@@ -172,20 +199,18 @@ def home(request):
 
 # Generate heatmap (separate endpoint)
 @require_http_methods(["GET"])
+@cached_by_data_version('heatmap')
 def generate_heatmap_view(request):
-    trash_cans = TrashCan.objects.all()
+    trash_cans = list(with_latest_record(TrashCan.objects.all()))
+    predictions = TrashCan.get_fleet_predictions(trash_cans)
     
-    # Get latest record for each trash can
-    latest_records = []
-    for can in trash_cans:
-        latest = FillRecord.objects.filter(trashcan=can).order_by('-timestamp').first()
-        if latest:
-            latest_records.append((can, latest))
+    # Bins that have at least one record
+    latest_records = [can for can in trash_cans if can.latest_timestamp is not None]
     
     # Create map
-    if trash_cans.exists():
-        avg_lat = sum(can.latitude for can in trash_cans) / trash_cans.count()
-        avg_lon = sum(can.longitude for can in trash_cans) / trash_cans.count()
+    if trash_cans:
+        avg_lat = sum(can.latitude for can in trash_cans) / len(trash_cans)
+        avg_lon = sum(can.longitude for can in trash_cans) / len(trash_cans)
     else:
         avg_lat, avg_lon = 42.6181, 25.3954
     
@@ -193,20 +218,21 @@ def generate_heatmap_view(request):
     
     # Build heatmap data (cap at 100% for visualization)
     heat_data = []
-    for can, record in latest_records:
+    for can in latest_records:
         heat_data.append([
             can.latitude,
             can.longitude,
-            min(record.fill_level, 100) / 100.0
+            min(can.latest_fill, 100) / 100.0
         ])
     
     HeatMap(heat_data, radius=25, blur=20, max_zoom=1).add_to(m)
     
     # Add individual markers with detailed info
-    for can, record in latest_records:
-        daily_rate = can.get_average_daily_fill_rate()
-        predicted_fill = can.get_predicted_fill_level()
-        days_until_full = can.get_days_until_full()
+    for can in latest_records:
+        prediction = predictions[can.id]
+        daily_rate = prediction['daily_rate']
+        predicted_fill = prediction['predicted_fill']
+        days_until_full = prediction['days_until_full']
         
         # Determine color based on predicted fill level
         if predicted_fill >= 100:  # Overflowing
@@ -226,7 +252,7 @@ def generate_heatmap_view(request):
             status = '✓ LOW'
         
         # Show actual fill level (may be >100%)
-        display_fill = record.fill_level if record.fill_level <= 100 else f"{record.fill_level}% (OVERFLOW)"
+        display_fill = can.latest_fill if can.latest_fill <= 100 else f"{can.latest_fill}% (OVERFLOW)"
         
         popup_html = f"""
         <div style="font-family: Arial; font-size: 12px; width: 240px;">
@@ -245,7 +271,7 @@ def generate_heatmap_view(request):
             <b>Fill Rate:</b> {daily_rate}% per day<br>
             <b>Days Until Full:</b> {days_until_full}<br>
             <b>Last Emptied:</b> {format_local_time(can.last_emptied)}<br>
-            <b>Last Update:</b> {format_local_time(record.timestamp)}<br>
+            <b>Last Update:</b> {format_local_time(can.latest_timestamp)}<br>
             <b>Location:</b> {can.latitude:.4f}, {can.longitude:.4f}
         </div>
         """
@@ -265,283 +291,183 @@ def generate_heatmap_view(request):
     return JsonResponse({'html': m._repr_html_()})
 
 
+def heatmap_data_etag(request):
+    """
+    ETag of the heatmap data without computing it: changes when records,
+    predictions or bins change, and every HEATMAP_SNAPSHOT_SECONDS.
+    """
+    now = timezone.now()
+    snapshot = int(now.timestamp()) // HEATMAP_SNAPSHOT_SECONDS * HEATMAP_SNAPSHOT_SECONDS
+    request.heatmap_snapshot = datetime.fromtimestamp(snapshot, tz=dt_timezone.utc)
+    
+    bins = TrashCan.objects.aggregate(count=Count('id'), emptied=Max('last_emptied'),
+                                      lat=Sum('latitude'), lon=Sum('longitude'))
+    latest_record = FillRecord.objects.aggregate(Max('id'))['id__max']
+    latest_prediction = BinPrediction.objects.aggregate(Max('updated_at'))['updated_at__max']
+    
+    version = f"{snapshot}:{bins}:{latest_record}:{latest_prediction}"
+    return hashlib.sha1(version.encode()).hexdigest()
+
+
+# Heatmap data for the client-side renderer (no server-side map rendering)
+@require_http_methods(["GET"])
+@etag(heatmap_data_etag)
+def api_heatmap_data(request):
+    """
+    Compact heatmap data: {"fields": [...], "bins": [[id, lat, lon, predicted_fill, status], ...]}
+    
+    Supports If-None-Match, so an unchanged map costs a 304 and three aggregate queries.
+    """
+    has_records = Exists(FillRecord.objects.filter(trashcan=OuterRef('pk')))
+    trash_cans = list(TrashCan.objects.filter(has_records).order_by('id'))
+    predictions = TrashCan.get_fleet_predictions(trash_cans, now=request.heatmap_snapshot)
+    
+    bins = []
+    for can in trash_cans:
+        predicted_fill = predictions[can.id]['predicted_fill']
+        bins.append([can.id, round(can.latitude, 6), round(can.longitude, 6),
+                     predicted_fill, fill_status(predicted_fill)])
+    
+    response = JsonResponse({
+        'fields': ['id', 'lat', 'lon', 'predicted_fill', 'status'],
+        'bins': bins,
+        'generated_at': request.heatmap_snapshot.isoformat(),
+    })
+    # Always revalidate; the ETag makes that cheap
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def highlight_param(request):
+    """?highlight= route index (None if absent); ValueError unless a non-negative integer"""
+    highlight_route = request.GET.get('highlight')
+    if highlight_route is None:
+        return None
+    highlight_route = int(highlight_route)
+    if highlight_route < 0:
+        raise ValueError(highlight_route)
+    return highlight_route
+
+
 # Generate route optimization map (separate endpoint)
 @require_http_methods(["GET"])
+@cached_by_data_version('route', params=('truck_capacity', 'trucks', 'highlight', 'plan_id'))
 def generate_route_view(request):
-    truck_capacity = int(request.GET.get('truck_capacity', 20))
-    highlight_route = request.GET.get('highlight', None)
-    if highlight_route is not None:
-        highlight_route = int(highlight_route)
+    """
+    Plan routes and render them; with ?plan_id= re-render a stored plan
+    (e.g. to highlight one route) without recomputing it or calling ORS.
+    Fleet plans take too long for a request: they are only computed by the
+    route worker (POST /api/route/jobs/ with fleet=1).
+    """
+    try:
+        truck_capacity = int(request.GET.get('truck_capacity', 20))
+        if not 1 <= truck_capacity <= route_jobs.MAX_TRUCK_CAPACITY:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': f'truck_capacity must be an integer from 1 to {route_jobs.MAX_TRUCK_CAPACITY}'
+        }, status=400)
+    trucks = request.GET.get('trucks')
+    if trucks:
+        try:
+            trucks = int(trucks)
+            if trucks < 1:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'trucks must be a positive integer'}, status=400)
+    else:
+        trucks = None
+    try:
+        highlight_route = highlight_param(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'highlight must be a route number'}, status=400)
+    
+    plan_id = request.GET.get('plan_id')
+    if plan_id:
+        try:
+            plan = RoutePlan.objects.get(id=int(plan_id))
+        except (ValueError, RoutePlan.DoesNotExist):
+            return JsonResponse({'success': False, 'error': f'Route plan {plan_id} not found'}, status=404)
+    elif request.GET.get('fleet'):
+        return JsonResponse({
+            'success': False,
+            'error': 'Fleet plans are computed in the background: POST /api/route/jobs/ with fleet=1'
+        }, status=400)
+    else:
+        plan = plan_routes(truck_capacity, get_ors_client(), trucks=trucks)
     
+    return JsonResponse(route_map_response(plan, highlight_route))
+
+
+# Plan computed ahead of the shift by `manage.py plan_tomorrow`
+@require_http_methods(["GET"])
+def api_scheduled_route(request):
+    """Upcoming (or current shift's) scheduled plan, rendered like /api/route/"""
+    plan = RoutePlan.objects.filter(
+        kind='scheduled', target_time__gte=timezone.now() - SCHEDULED_PLAN_GRACE
+    ).order_by('target_time', '-created_at').first()
+    if plan is None:
+        return JsonResponse({'success': False, 'error': 'No scheduled plan yet (run plan_tomorrow)'}, status=404)
+    return JsonResponse(route_map_response(plan))
+
+
+# Background route planning (computed by `manage.py route_worker`)
+@require_http_methods(["POST"])
+def api_submit_route_job(request):
+    """
+    Queue a route plan (dashboard only: needs the CSRF token); poll status_url,
+    then fetch result_url. fleet=1 plans for all active trucks instead of one capacity.
+    """
+    fleet = bool(request.POST.get('fleet'))
+    if fleet and not Truck.objects.filter(active=True).exists():
+        return JsonResponse({'success': False, 'error': 'No active trucks, add them in the admin'}, status=400)
     try:
-        ORS_API_KEY = config('API_KEY')
-        client = openrouteservice.Client(key=ORS_API_KEY)
-    except:
-        client = None
-    
-    # Get all bins that need collection (>60% OR <1 days until full)
-    bins_to_collect = []
-    for can in TrashCan.objects.all():
-        predicted_fill = can.get_predicted_fill_level()
-        days_until_full = can.get_days_until_full()
-        
-        # Collect if >60% OR overflowing OR will be full soon (≤1 day)
-        if predicted_fill >= 60 or predicted_fill >= 100 or days_until_full <= 1:
-            bins_to_collect.append(can)
-    
-    if not bins_to_collect:
-        # No urgent bins, show top 20 closest to depot
-        all_bins = list(TrashCan.objects.all())
-        # Sort by distance from depot
-        all_bins.sort(key=lambda b: ((b.latitude - DEPOT_LOCATION['lat'])**2 + 
-                                     (b.longitude - DEPOT_LOCATION['lon'])**2)**0.5)
-        bins_to_collect = all_bins[:20]
-    
-    # Split bins into routes based on truck capacity
-    # Use geographic clustering to minimize distance
-    routes = []
-    remaining_bins = bins_to_collect.copy()
-    
-    while remaining_bins:
-        current_route = []
-        
-        # Start route from depot or landfill
-        if not routes:
-            start_point = (DEPOT_LOCATION['lat'], DEPOT_LOCATION['lon'])
-        else:
-            start_point = (LANDFILL_LOCATION['lat'], LANDFILL_LOCATION['lon'])
-        
-        # Greedy nearest-neighbor algorithm for this route
-        current_location = start_point
-        
-        while len(current_route) < truck_capacity and remaining_bins:
-            # Find nearest bin to current location
-            nearest_bin = min(remaining_bins, 
-                            key=lambda b: ((b.latitude - current_location[0])**2 + 
-                                         (b.longitude - current_location[1])**2)**0.5)
-            
-            current_route.append(nearest_bin)
-            remaining_bins.remove(nearest_bin)
-            current_location = (nearest_bin.latitude, nearest_bin.longitude)
-        
-        routes.append(current_route)
-    
-    # Center map
-    all_lats = [DEPOT_LOCATION['lat'], LANDFILL_LOCATION['lat']] + [bin.latitude for bin in bins_to_collect]
-    all_lons = [DEPOT_LOCATION['lon'], LANDFILL_LOCATION['lon']] + [bin.longitude for bin in bins_to_collect]
-    
-    avg_lat = sum(all_lats) / len(all_lats) if all_lats else 42.6181
-    avg_lon = sum(all_lons) / len(all_lons) if all_lons else 25.3954
-    
-    m = folium.Map(location=[avg_lat, avg_lon], zoom_start=14, 
-                   tiles='OpenStreetMap',
-                   zoom_control=True,
-                   scrollWheelZoom=True,
-                   dragging=True)
-    
-    # Add Depot marker
-    folium.Marker(
-        location=[DEPOT_LOCATION['lat'], DEPOT_LOCATION['lon']],
-        popup=f"<b>{DEPOT_LOCATION['name']}</b>",
-        icon=folium.Icon(color='green', icon='home', prefix='fa'),
-        tooltip=DEPOT_LOCATION['name']
-    ).add_to(m)
-    
-    # Add Landfill marker
-    folium.Marker(
-        location=[LANDFILL_LOCATION['lat'], LANDFILL_LOCATION['lon']],
-        popup=f"<b>{LANDFILL_LOCATION['name']}</b>",
-        icon=folium.Icon(color='black', icon='recycle', prefix='fa'),
-        tooltip=LANDFILL_LOCATION['name']
-    ).add_to(m)
-    
-    total_distance = 0
-    bin_counter = 1
-    
-    # Store route details for response
-    route_details = []
-    
-    # Draw each route
-    for route_idx, route_bins in enumerate(routes):
-        route_color = ROUTE_COLORS[route_idx % len(ROUTE_COLORS)]
-        
-        # Adjust opacity based on highlight
-        if highlight_route is not None:
-            opacity = 1.0 if route_idx == highlight_route else 0.15
-            weight = 7 if route_idx == highlight_route else 2
-            show_markers = (route_idx == highlight_route)
-        else:
-            opacity = 0.7
-            weight = 5
-            show_markers = True
-        
-        # Further optimize with ORS optimization API (for exact routing)
-        optimized_bins = route_bins
-        
-        if client and len(route_bins) > 2:
-            try:
-                if route_idx == 0:
-                    start_location = [DEPOT_LOCATION['lon'], DEPOT_LOCATION['lat']]
-                else:
-                    start_location = [LANDFILL_LOCATION['lon'], LANDFILL_LOCATION['lat']]
-                
-                end_location = [LANDFILL_LOCATION['lon'], LANDFILL_LOCATION['lat']]
-                
-                jobs = [{'id': idx, 'location': [bin.longitude, bin.latitude]} 
-                       for idx, bin in enumerate(route_bins)]
-                
-                optimization_result = client.optimization(
-                    jobs=jobs,
-                    vehicles=[{
-                        'id': 0,
-                        'start': start_location,
-                        'end': end_location,
-                        'capacity': [truck_capacity]
-                    }],
-                    geometry=True
-                )
-                
-                optimized_order = optimization_result['routes'][0]['steps']
-                optimized_bins = []
-                for step in optimized_order:
-                    if step['type'] == 'job':
-                        optimized_bins.append(route_bins[step['job']])
-                
-                if not optimized_bins:
-                    optimized_bins = route_bins
-                    
-            except Exception as e:
-                print(f"ORS optimization failed for route {route_idx + 1}: {e}")
-                optimized_bins = route_bins
-        
-        # Add numbered markers
-        route_bin_ids = []
-        for bin in optimized_bins:
-            predicted_fill = bin.get_predicted_fill_level()
-            daily_rate = bin.get_average_daily_fill_rate()
-            days_until_full = bin.get_days_until_full()
-            
-            route_bin_ids.append(bin.id)
-            
-            if show_markers:
-                # Determine status
-                if predicted_fill >= 100:
-                    status = '🚨 OVERFLOWING'
-                    status_color = '#d32f2f'
-                elif predicted_fill >= 80:
-                    status = '⚠️ FULL'
-                    status_color = '#f44336'
-                elif predicted_fill >= 60:
-                    status = '⚡ HIGH'
-                    status_color = '#ff9800'
-                else:
-                    status = '✓ MEDIUM'
-                    status_color = '#4caf50'
-                
-                popup_html = f"""
-                <div style="font-family: Arial; font-size: 13px;">
-                    <b>🚛 Route {route_idx + 1}, Stop {bin_counter}</b><br>
-                    <div style="background: {status_color}; 
-                                color: white; 
-                                padding: 5px; 
-                                margin: 5px 0; 
-                                border-radius: 3px; 
-                                text-align: center;">
-                        <strong>{status}</strong>
-                    </div>
-                    <hr style="margin: 5px 0;">
-                    <b>Bin ID:</b> {bin.id}<br>
-                    <b>Predicted Fill:</b> {predicted_fill:.1f}%<br>
-                    <b>Fill Rate:</b> {daily_rate:.1f}% /day<br>
-                    <b>Days Until Full:</b> {days_until_full:.1f}<br>
-                    <b>Last Emptied:</b> {bin.last_emptied.strftime('%Y-%m-%d')}
-                </div>
-                """
-                
-                # Use different marker color for overflowing bins
-                marker_color = 'darkred' if predicted_fill >= 100 else 'red'
-                
-                folium.Marker(
-                    location=[bin.latitude, bin.longitude],
-                    popup=folium.Popup(popup_html, max_width=250),
-                    icon=folium.Icon(color=marker_color, icon='trash', prefix='fa'),
-                    tooltip=f"Stop {bin_counter}: {predicted_fill:.0f}%"
-                ).add_to(m)
-                
-                # Add number label
-                folium.Marker(
-                    location=[bin.latitude - 0.0002, bin.longitude],
-                    icon=folium.DivIcon(html=f"""
-                        <div style="
-                            font-size: 14px;
-                            font-weight: bold;
-                            color: white;
-                            background-color: {route_color};
-                            border-radius: 50%;
-                            width: 32px;
-                            height: 32px;
-                            display: flex;
-                            align-items: center;
-                            justify-content: center;
-                            border: 3px solid white;
-                            box-shadow: 0 2px 8px rgba(0,0,0,0.5);
-                        ">
-                            {bin_counter}
-                        </div>
-                    """)
-                ).add_to(m)
-            
-            bin_counter += 1
-        
-        # Draw route line
-        if client and len(optimized_bins) >= 1:
-            try:
-                if route_idx == 0:
-                    coords = [[DEPOT_LOCATION['lon'], DEPOT_LOCATION['lat']]]
-                else:
-                    coords = [[LANDFILL_LOCATION['lon'], LANDFILL_LOCATION['lat']]]
-                
-                coords += [[bin.longitude, bin.latitude] for bin in optimized_bins]
-                coords.append([LANDFILL_LOCATION['lon'], LANDFILL_LOCATION['lat']])
-                
-                directions = client.directions(
-                    coordinates=coords,
-                    profile='driving-car',
-                    format='geojson'
-                )
-                
-                folium.GeoJson(
-                    directions,
-                    style_function=lambda x, color=route_color, op=opacity, w=weight: {
-                        'color': color,
-                        'weight': w,
-                        'opacity': op
-                    },
-                    tooltip=f"Route {route_idx + 1}" if show_markers else None
-                ).add_to(m)
-                
-                route_distance = directions['features'][0]['properties']['segments'][0]['distance'] / 1000
-                total_distance += route_distance
-                
-                route_details.append({
-                    'route_number': route_idx + 1,
-                    'bins': route_bin_ids,
-                    'distance': round(route_distance, 1)
-                })
-                
-            except Exception as e:
-                print(f"Route drawing failed for route {route_idx + 1}: {e}")
-    
-    return JsonResponse({
-        'html': m._repr_html_(),
-        'stats': {
-            'total_routes': len(routes),
-            'total_bins': len(bins_to_collect),
-            'total_distance': round(total_distance, 1),
-            'truck_capacity': truck_capacity
-        },
-        'route_details': route_details
-    })
+        truck_capacity = int(request.POST.get('truck_capacity', 20))
+        if not 1 <= truck_capacity <= route_jobs.MAX_TRUCK_CAPACITY:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': f'truck_capacity must be an integer from 1 to {route_jobs.MAX_TRUCK_CAPACITY}'
+        }, status=400)
+    
+    job = route_jobs.submit(truck_capacity, fleet=fleet)
+    if job is None:
+        response = JsonResponse({'success': False, 'error': 'Route planning queue is full, try again shortly'},
+                                status=429)
+        response['Retry-After'] = '30'
+        return response
+    return JsonResponse(route_jobs.job_status(job), status=202)
+
+
+@require_http_methods(["GET"])
+def api_route_job_status(request, job_id):
+    try:
+        job = RouteJob.objects.get(id=job_id)
+    except RouteJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': f'Route job {job_id} not found'}, status=404)
+    return JsonResponse(route_jobs.job_status(job))
+
+
+@require_http_methods(["GET"])
+def api_route_job_result(request, job_id):
+    """Rendered plan of a finished job (same body as /api/route/)"""
+    try:
+        job = RouteJob.objects.select_related('plan').get(id=job_id)
+    except RouteJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': f'Route job {job_id} not found'}, status=404)
+    
+    if job.status != 'done':
+        return JsonResponse(route_jobs.job_status(job), status=409)
+    if job.plan is None:
+        return JsonResponse({'success': False, 'error': f'Plan of route job {job_id} was deleted'}, status=410)
+    
+    try:
+        highlight_route = highlight_param(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'highlight must be a route number'}, status=400)
+    return JsonResponse(route_map_response(job.plan, highlight_route))
 
 
 # --- SECURED API ENDPOINTS ---
@@ -597,18 +523,18 @@ def api_update_fill_level(request):
         category = data.get('category')
         confidence = data.get('confidence', 0)
         
+        # STEP 1: Get current prediction (what we THINK it should be at)
+        predicted_before = trashcan.get_cached_prediction()['predicted_fill']
+        
         # Convert AI category to fill level
         if category:
             ai_fill_level = AI_CATEGORY_MAP.get(category.lower(), 50)
         else:
             # If no AI data, use predicted level as fallback
-            ai_fill_level = int(trashcan.get_predicted_fill_level())
+            ai_fill_level = int(predicted_before)
         
         # ============ CRITICAL FIX: PROPER SEQUENCE ============
         
-        # STEP 1: Get current prediction (what we THINK it should be at)
-        predicted_before = trashcan.get_predicted_fill_level()
-        
         # STEP 2: Record what AI actually saw (pre-collection state)
         # This is the END of the fill cycle (0% → X%)
         collection_record = FillRecord.objects.create(
@@ -619,8 +545,11 @@ def api_update_fill_level(request):
         )
         
         # STEP 3: Now mark bin as empty (START of new cycle)
-        # This creates a 0% record and updates last_emptied timestamp
+        # This creates a 0% record, updates last_emptied timestamp
+        # and refreshes the bin's materialized prediction
         trashcan.mark_as_emptied()
+        bump_data_version()  # Cached maps are out of date
+        selection.update_bins([(trashcan, trashcan.prediction)])
         
         # ============ RESULT: DATABASE SHOWS CORRECT SEQUENCE ============
         # Before: Last record was 0% (previous collection)
@@ -629,9 +558,10 @@ def api_update_fill_level(request):
         # Algorithm sees: 0% → X% over Y days = rate ✓
         
         # ============ GET UPDATED PREDICTIONS ============
-        new_predicted_fill = trashcan.get_predicted_fill_level()  # Should be ~0-5%
-        updated_daily_rate = trashcan.get_average_daily_fill_rate()  # Recalculated!
-        days_until_full = trashcan.get_days_until_full()
+        updated = trashcan.get_cached_prediction()  # Recalculated on mark_as_emptied!
+        new_predicted_fill = updated['predicted_fill']  # Should be ~0-5%
+        updated_daily_rate = updated['daily_rate']
+        days_until_full = updated['days_until_full']
         
         # Calculate accuracy
         prediction_accuracy = 100 - abs(predicted_before - ai_fill_level)
@@ -663,6 +593,226 @@ def api_update_fill_level(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def request_body(request):
+    """Raw body, inflated if sent with Content-Encoding: gzip (raises ValueError if too large)"""
+    if request.headers.get('Content-Encoding', '').lower() != 'gzip':
+        return request.body
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    body = decompressor.decompress(request.body, MAX_BATCH_BODY_BYTES)
+    if decompressor.unconsumed_tail:
+        raise ValueError('Request body too large')
+    return body
+
+
+def parse_scan_timestamp(value, now):
+    """Client timestamp (ISO 8601 or Unix seconds, naive = UTC) → aware datetime, None if invalid"""
+    if value is None:
+        return now
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            timestamp = datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        elif isinstance(value, str):
+            timestamp = parse_datetime(value)
+            if timestamp is None:
+                return None
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    
+    if timestamp > now + MAX_CLOCK_SKEW:
+        return None
+    return timestamp
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@require_api_key
+def api_update_fill_level_batch(request):
+    """
+    SECURED: Many NFC collection scans in one request
+    
+    Body: {"scans": [{"nfc_uid" or "trashcan_id", "category", "confidence", "timestamp"}, ...]}
+    (may be sent gzip-compressed with Content-Encoding: gzip)
+    
+    Every scan is recorded like api_update_fill_level (AI reading, then 0%)
+    but at its own client timestamp, so scans buffered offline keep the time
+    they happened. All bins are resolved in one query and everything is
+    written in one transaction. A scan that is already stored (same bin and
+    timestamp) is reported as a duplicate, so retrying an upload is safe: the
+    scanned bins are locked before that check, so a retry racing the original
+    upload waits for it instead of storing the scan twice.
+    """
+    try:
+        data = json.loads(request_body(request))
+    except zlib.error:
+        return JsonResponse({'success': False, 'error': 'Invalid gzip body'}, status=400)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=413)
+    
+    scans = data.get('scans') if isinstance(data, dict) else None
+    if not isinstance(scans, list) or not scans:
+        return JsonResponse({'success': False, 'error': 'Missing scans array'}, status=400)
+    if len(scans) > MAX_BATCH_SCANS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Too many scans ({len(scans)}), max {MAX_BATCH_SCANS} per request'
+        }, status=413)
+    
+    try:
+        now = timezone.now()
+        results = [None] * len(scans)
+        valid = []
+        
+        # ============ STEP 1: VALIDATE ============
+        for index, scan in enumerate(scans):
+            if not isinstance(scan, dict):
+                results[index] = {'index': index, 'success': False, 'error': 'Scan must be an object'}
+                continue
+            
+            nfc_uid = scan.get('nfc_uid')
+            trashcan_id = scan.get('trashcan_id')
+            if not nfc_uid and not trashcan_id:
+                results[index] = {'index': index, 'success': False, 'error': 'Missing nfc_uid or trashcan_id'}
+                continue
+            if not nfc_uid:
+                try:
+                    trashcan_id = int(trashcan_id)
+                except (TypeError, ValueError):
+                    results[index] = {'index': index, 'success': False, 'error': f'Invalid trashcan_id: {trashcan_id}'}
+                    continue
+            
+            timestamp = parse_scan_timestamp(scan.get('timestamp'), now)
+            if timestamp is None:
+                results[index] = {'index': index, 'success': False, 'error': f"Invalid timestamp: {scan.get('timestamp')}"}
+                continue
+            
+            valid.append((index, str(nfc_uid) if nfc_uid else None, trashcan_id, scan, timestamp))
+        
+        # ============ STEP 2: RESOLVE ALL BINS IN ONE QUERY ============
+        uids = {nfc_uid for _, nfc_uid, _, _, _ in valid if nfc_uid}
+        ids = {trashcan_id for _, nfc_uid, trashcan_id, _, _ in valid if not nfc_uid}
+        trash_cans = list(TrashCan.objects.filter(Q(nfc_uid__in=uids) | Q(id__in=ids))) if valid else []
+        by_uid = {can.nfc_uid: can for can in trash_cans if can.nfc_uid}
+        by_id = {can.id: can for can in trash_cans}
+        
+        found = []
+        for index, nfc_uid, trashcan_id, scan, timestamp in valid:
+            trashcan = by_uid.get(nfc_uid) if nfc_uid else by_id.get(trashcan_id)
+            if trashcan is None:
+                error = f'No bin registered with NFC UID: {nfc_uid}' if nfc_uid else f'Bin {trashcan_id} not found'
+                results[index] = {'index': index, 'success': False, 'error': error}
+                continue
+            found.append((index, trashcan, scan, timestamp))
+        
+        # ============ STEP 3: CHECK AND WRITE IN ONE TRANSACTION ============
+        try:
+            with transaction.atomic():
+                # Lock the scanned bins: a retry racing the original upload
+                # waits here and then sees the original's records
+                by_id = {can.id: can for can in TrashCan.objects.select_for_update().filter(
+                    id__in={trashcan.id for _, trashcan, _, _ in found}).order_by('id')}
+                locked = []
+                for index, trashcan, scan, timestamp in found:
+                    if trashcan.id in by_id:
+                        locked.append((index, by_id[trashcan.id], scan, timestamp))
+                    else:  # Deleted since it was looked up
+                        results[index] = {'index': index, 'success': False, 'error': f'Bin {trashcan.id} not found'}
+                found = locked
+                
+                # Already uploaded? (a retry after a lost response)
+                stored = set(
+                    FillRecord.objects.filter(
+                        trashcan_id__in=list(by_id),
+                        timestamp__in=[timestamp for _, _, _, timestamp in found],
+                        source='ai',
+                    ).values_list('trashcan_id', 'timestamp')
+                ) if found else set()
+                
+                # Records in scan order
+                states = BinPrediction.for_bins(list(by_id.values()))
+                records = []
+                emptied = {}
+                collected = []
+                
+                for index, trashcan, scan, timestamp in sorted(found, key=lambda item: item[3]):
+                    if (trashcan.id, timestamp) in stored:
+                        results[index] = {'index': index, 'success': True, 'duplicate': True, 'trashcan_id': trashcan.id}
+                        continue
+                    stored.add((trashcan.id, timestamp))
+                    
+                    # What we THOUGHT the bin was at when it was scanned
+                    last_emptied = emptied.get(trashcan.id, trashcan.last_emptied)
+                    predicted_before = states[trashcan.id].get_predictions(last_emptied, timestamp)['predicted_fill']
+                    
+                    category = scan.get('category')
+                    if category:
+                        ai_fill_level = AI_CATEGORY_MAP.get(str(category).lower(), 50)
+                    else:
+                        ai_fill_level = int(predicted_before)
+                    
+                    # Same sequence as a single scan: X% seen by the AI, then emptied
+                    emptied_at = timestamp + EMPTIED_AFTER_SCAN
+                    records.append(FillRecord(trashcan=trashcan, fill_level=int(ai_fill_level), source='ai', timestamp=timestamp))
+                    records.append(FillRecord(trashcan=trashcan, fill_level=0, source='manual', timestamp=emptied_at))
+                    # A late upload must not move last_emptied back in time
+                    emptied[trashcan.id] = max(last_emptied, emptied_at)
+                    collected.append((index, trashcan, category, scan.get('confidence', 0), ai_fill_level, predicted_before))
+                
+                changed = [by_id[bin_id] for bin_id, emptied_at in emptied.items() if emptied_at != by_id[bin_id].last_emptied]
+                for trashcan in changed:
+                    trashcan.last_emptied = emptied[trashcan.id]
+                
+                FillRecord.objects.bulk_create(records)
+                TrashCan.objects.bulk_update(changed, ['last_emptied'])
+                if emptied:
+                    states.update(BinPrediction.refresh_fleet([by_id[bin_id] for bin_id in emptied]))
+        except IntegrityError:
+            # The unique AI-scan constraint caught a scan stored outside the
+            # lock; nothing was written, and the retry will see it as a duplicate
+            return JsonResponse({'success': False, 'error': 'Scan stored concurrently, retry'}, status=409)
+        if records:
+            bump_data_version()
+        selection.update_bins((by_id[bin_id], states[bin_id]) for bin_id in emptied)
+        
+        # ============ STEP 4: PER-SCAN RESULTS ============
+        for index, trashcan, category, confidence, ai_fill_level, predicted_before in collected:
+            updated = states[trashcan.id].get_predictions(trashcan.last_emptied, now)
+            results[index] = {
+                'index': index,
+                'success': True,
+                'trashcan_id': trashcan.id,
+                'nfc_uid': trashcan.nfc_uid,
+                'collected_at_fill_level': int(ai_fill_level),
+                'ai_category': category,
+                'ai_confidence': confidence,
+                'predicted_fill_was': round(predicted_before, 1),
+                'prediction_accuracy': round(max(0, 100 - abs(predicted_before - ai_fill_level)), 1),
+                'updated_predictions': {
+                    'current_fill': round(updated['predicted_fill'], 1),
+                    'daily_rate': round(updated['daily_rate'], 1),
+                    'days_until_full': round(updated['days_until_full'], 1),
+                },
+            }
+        
+        return JsonResponse({
+            'success': True,
+            'received': len(scans),
+            'recorded': len(collected),
+            'duplicates': sum(1 for result in results if result.get('duplicate')),
+            'failed': sum(1 for result in results if not result['success']),
+            'results': results,
+            'device': request.api_device,
+        })
+        
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 @require_api_key
@@ -697,7 +847,7 @@ def api_mark_emptied(request):
                 }, status=404)
         
         # Get predicted fill before emptying
-        predicted_before = trashcan.get_predicted_fill_level()
+        predicted_before = trashcan.get_cached_prediction()['predicted_fill']
         
         # Record predicted level before collection
         FillRecord.objects.create(
@@ -709,6 +859,8 @@ def api_mark_emptied(request):
         
         # Mark as emptied
         trashcan.mark_as_emptied()
+        bump_data_version()
+        selection.update_bins([(trashcan, trashcan.prediction)])
         
         return JsonResponse({
             'success': True,
@@ -732,12 +884,13 @@ def api_mark_emptied(request):
 def api_get_trashcan(request, trashcan_id):
     """SECURED: Get trash can status"""
     try:
-        trashcan = TrashCan.objects.get(id=trashcan_id)
+        trashcan = TrashCan.objects.select_related('prediction').get(id=trashcan_id)
         latest_record = FillRecord.objects.filter(trashcan=trashcan).order_by('-timestamp').first()
         
-        predicted_fill = trashcan.get_predicted_fill_level()
-        daily_rate = trashcan.get_average_daily_fill_rate()
-        days_until_full = trashcan.get_days_until_full()
+        prediction = trashcan.get_cached_prediction()
+        predicted_fill = prediction['predicted_fill']
+        daily_rate = prediction['daily_rate']
+        days_until_full = prediction['days_until_full']
         
         return JsonResponse({
             'success': True,
@@ -759,23 +912,55 @@ def api_get_trashcan(request, trashcan_id):
 @require_api_key
 def api_list_trashcans(request):
     """SECURED: Get all trash cans"""
-    trash_cans = TrashCan.objects.all()
+    trash_cans = list(with_latest_record(TrashCan.objects.all()))
+    predictions = TrashCan.get_fleet_predictions(trash_cans)
     
     data = []
     for can in trash_cans:
-        latest = FillRecord.objects.filter(trashcan=can).order_by('-timestamp').first()
-        predicted_fill = can.get_predicted_fill_level()
-        daily_rate = can.get_average_daily_fill_rate()
+        predicted_fill = predictions[can.id]['predicted_fill']
+        daily_rate = predictions[can.id]['daily_rate']
         
         data.append({
             'id': can.id,
             'latitude': can.latitude,
             'longitude': can.longitude,
-            'current_fill': latest.fill_level if latest else 0,
+            'current_fill': can.latest_fill if can.latest_timestamp else 0,
             'predicted_fill': predicted_fill,
             'daily_rate': daily_rate,
             'last_emptied': format_local_time(can.last_emptied),
-            'last_update': format_local_time(latest.timestamp) if latest else None
+            'last_update': format_local_time(can.latest_timestamp) if can.latest_timestamp else None
         })
     
     return JsonResponse({'success': True, 'total_bins': len(data), 'trash_cans': data})
+
+
+@require_http_methods(["GET"])
+@require_api_key
+def api_export_records(request):
+    """
+    SECURED: Stream raw fill records as NDJSON or CSV
+
+    ?format=ndjson|csv, ?since= and ?until= (ISO date or datetime, local time
+    if no offset; since inclusive, until exclusive), ?bin= and ?source=
+    (repeatable or comma-separated)
+    """
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in exports.FORMATS:
+        return JsonResponse({'success': False, 'error': f"format must be one of {', '.join(exports.FORMATS)}"},
+                            status=400)
+    try:
+        bins = [int(value) for param in request.GET.getlist('bin') for value in param.split(',') if value]
+        sources = [value for param in request.GET.getlist('source') for value in param.split(',') if value]
+        records = exports.export_queryset(
+            since=exports.parse_time_bound(request.GET.get('since')),
+            until=exports.parse_time_bound(request.GET.get('until')),
+            bins=bins,
+            sources=sources,
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    response = StreamingHttpResponse(exports.stream_records(records, fmt), content_type=exports.CONTENT_TYPES[fmt])
+    filename = f"fill-records-{timezone.localdate():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
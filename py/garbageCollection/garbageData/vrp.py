@@ -0,0 +1,232 @@
+"""
+Capacitated route solver
+
+Builds the truck loads in-process instead of chunking the greedy order and
+asking ORS to reorder each chunk. Every load is one trip: the first starts
+at the depot, later ones at the landfill, and every trip ends at the
+landfill to empty the truck. A trip holds at most `capacity` bins.
+
+The solver starts from the cheaper of the greedy nearest-neighbour loads and
+a Clarke-Wright savings construction, then improves it with local search
+until no move helps or the time budget runs out:
+
+- 2-opt: reverse a stretch of one trip
+- or-opt / relocate: move 1-3 consecutive bins (optionally reversed) to
+  another place in the same or another trip, so bins can change trucks
+
+Costs come from a node matrix: 0 = depot, 1 = landfill, 2.. = bins. It
+doesn't have to be symmetric (road distances aren't); haversine_matrix()
+gives straight-line metres.
+"""
+import time
+import numpy as np
+from .spatial import EARTH_RADIUS_M
+
+DEPOT = 0
+LANDFILL = 1
+
+# Candidate moves only look at this many nearest bins per bin
+NEIGHBOURS = 15
+MAX_SEGMENT = 3
+# Larger inputs keep the greedy loads (the matrix grows quadratically)
+MAX_SOLVER_BINS = 1500
+
+EPSILON = 1e-6
+
+
+def haversine_matrix(points):
+    """Straight-line metres between all (lat, lon) points"""
+    lat = np.radians([p[0] for p in points])[:, None]
+    lon = np.radians([p[1] for p in points])[:, None]
+    a = np.sin((lat - lat.T) / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin((lon - lon.T) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def trip_start(route_idx):
+    return DEPOT if route_idx == 0 else LANDFILL
+
+
+def route_cost(d, route, route_idx):
+    prev, cost = trip_start(route_idx), 0.0
+    for node in route:
+        cost += d[prev][node]
+        prev = node
+    return cost + d[prev][LANDFILL]
+
+
+def plan_cost(d, routes):
+    return sum(route_cost(d, route, idx) for idx, route in enumerate(routes))
+
+
+def nearest_neighbours(matrix, bins, k=NEIGHBOURS):
+    """{bin: [closest other bins]} from the matrix rows"""
+    columns = np.array(bins)
+    sub = matrix[np.ix_(columns, columns)] + np.diag(np.full(len(bins), np.inf))
+    k = min(k, len(bins) - 1)
+    if k <= 0:
+        return {node: [] for node in bins}
+    closest = np.argpartition(sub, k - 1, axis=1)[:, :k]
+    return {node: [bins[j] for j in sorted(row, key=lambda j: sub[i, j])]
+            for i, (node, row) in enumerate(zip(bins, closest))}
+
+
+def savings_routes(d, bins, capacity, neighbours):
+    """Clarke-Wright savings over landfill round trips; the trip that gains most from the depot goes first"""
+    route_of = {node: [node] for node in bins}
+    savings = []
+    for i in bins:
+        for j in neighbours[i]:
+            saving = d[i][LANDFILL] + d[LANDFILL][j] - d[i][j]
+            if saving > EPSILON:
+                savings.append((saving, i, j))
+    savings.sort(reverse=True)
+
+    for _, i, j in savings:
+        first, second = route_of[i], route_of[j]
+        if first is second or first[-1] != i or second[0] != j or len(first) + len(second) > capacity:
+            continue
+        first.extend(second)
+        for node in second:
+            route_of[node] = first
+
+    routes = list({id(route): route for route in route_of.values()}.values())
+    routes.sort(key=lambda route: d[DEPOT][route[0]] - d[LANDFILL][route[0]])
+    return routes
+
+
+class LocalSearch:
+    """First-improvement 2-opt and or-opt over a set of trips"""
+
+    def __init__(self, d, routes, capacity, neighbours, deadline):
+        self.d = d
+        self.routes = [list(route) for route in routes]
+        self.capacity = capacity
+        self.neighbours = neighbours
+        self.deadline = deadline
+        self.where = {}
+        for r in range(len(self.routes)):
+            self.reindex(r)
+
+    def reindex(self, r):
+        for pos, node in enumerate(self.routes[r]):
+            self.where[node] = (r, pos)
+
+    def timed_out(self):
+        return time.monotonic() > self.deadline
+
+    def run(self):
+        improved = True
+        while improved and not self.timed_out():
+            improved = False
+            for r in range(len(self.routes)):
+                improved |= self.two_opt(r)
+            improved |= self.or_opt()
+        return [route for route in self.routes if route]
+
+    def two_opt(self, r):
+        """Reverse stretches of trip r while that shortens it"""
+        d = self.d
+        improved = True
+        any_improvement = False
+        while improved and not self.timed_out():
+            improved = False
+            seq = [trip_start(r)] + self.routes[r] + [LANDFILL]
+            # Prefix costs forwards and backwards, so reversed stretches cost O(1)
+            fwd, bwd = [0.0], [0.0]
+            for t in range(len(seq) - 1):
+                fwd.append(fwd[-1] + d[seq[t]][seq[t + 1]])
+                bwd.append(bwd[-1] + d[seq[t + 1]][seq[t]])
+
+            for i in range(1, len(seq) - 2):
+                for j in range(i + 1, len(seq) - 1):
+                    delta = (d[seq[i - 1]][seq[j]] + d[seq[i]][seq[j + 1]]
+                             - d[seq[i - 1]][seq[i]] - d[seq[j]][seq[j + 1]]
+                             + (bwd[j] - bwd[i]) - (fwd[j] - fwd[i]))
+                    if delta < -EPSILON:
+                        self.routes[r][i - 1:j] = reversed(self.routes[r][i - 1:j])
+                        self.reindex(r)
+                        improved = any_improvement = True
+                        break
+                if improved:
+                    break
+        return any_improvement
+
+    def or_opt(self):
+        """Move segments of 1-3 bins next to one of their nearest bins"""
+        improved = False
+        for node in list(self.where):
+            if self.timed_out():
+                break
+            for length in range(1, MAX_SEGMENT + 1):
+                if self.move_segment(node, length):
+                    improved = True
+                    break
+        return improved
+
+    def move_segment(self, node, length):
+        d = self.d
+        r, p = self.where[node]
+        route = self.routes[r]
+        segment = route[p:p + length]
+        if len(segment) < length:
+            return False
+        a, z = segment[0], segment[-1]
+        prev = route[p - 1] if p > 0 else trip_start(r)
+        nxt = route[p + length] if p + length < len(route) else LANDFILL
+        inner = sum(d[segment[t]][segment[t + 1]] for t in range(length - 1))
+        inner_reversed = sum(d[segment[t + 1]][segment[t]] for t in range(length - 1))
+        removal_gain = d[prev][a] + inner + d[z][nxt] - d[prev][nxt]
+
+        for near in self.neighbours[a] + self.neighbours[z]:
+            r2, q = self.where[near]
+            if r2 == r and p - 1 <= q <= p + length:
+                continue  # Next to or inside the segment
+            if r2 != r and len(self.routes[r2]) + length > self.capacity:
+                continue
+            target = self.routes[r2]
+            # Insert right after `near`, or right before it
+            for pos in (q + 1, q):
+                u = target[pos - 1] if pos > 0 else trip_start(r2)
+                v = target[pos] if pos < len(target) else LANDFILL
+                for seg, seg_inner in ((segment, inner), (segment[::-1], inner_reversed)):
+                    if r2 == r:
+                        new_route = route[:p] + route[p + length:]
+                        at = pos if pos < p else pos - length
+                        new_route[at:at] = seg
+                        delta = route_cost(d, new_route, r) - route_cost(d, route, r)
+                    else:
+                        delta = d[u][seg[0]] + seg_inner + d[seg[-1]][v] - d[u][v] - removal_gain
+                        new_route = None
+                    if delta < -EPSILON:
+                        if new_route is not None:
+                            self.routes[r] = new_route
+                        else:
+                            del route[p:p + length]
+                            target[pos:pos] = seg
+                            self.reindex(r2)
+                        self.reindex(r)
+                        return True
+                    if length == 1:
+                        break  # Reversing a single bin changes nothing
+        return False
+
+
+def solve_routes(matrix, capacity, seed_routes, time_limit=2.0):
+    """
+    Improve seed trips ([[node]] over the matrix; see the module docstring).
+    Returns the cheaper of the seed and the improved trips, empty trips dropped.
+    """
+    deadline = time.monotonic() + time_limit
+    bins = [node for route in seed_routes for node in route]
+    if not bins or capacity <= 0:
+        return seed_routes
+
+    d = matrix.tolist()
+    neighbours = nearest_neighbours(matrix, bins)
+    seed_routes = [list(route) for route in seed_routes if route]
+    start = min(
+        (seed_routes, savings_routes(d, bins, capacity, neighbours)),
+        key=lambda routes: plan_cost(d, routes)
+    )
+    solved = LocalSearch(d, start, capacity, neighbours, deadline).run()
+    return min((seed_routes, solved), key=lambda routes: plan_cost(d, routes))
@@ -3,12 +3,12 @@ import threading
 import sys
 import os
 import queue
-import requests
 from flask import Flask, Response, jsonify, request
 import cv2
 import numpy as np
 import tensorflow as tf
 from decouple import config
+from upload_queue import ScanQueue, ScanUploader, UploadSession
 
 API_KEY = config("API_KEY")
 
@@ -43,6 +43,17 @@ with open(LABELS_PATH, 'r') as f:
 DJANGO_SERVER_URL = "https://zabravih.org"  # Your server
 CONFIDENCE_THRESHOLD = 60.0  # Only send if confidence > 60%
 
+# Scans are queued on disk and uploaded in the background (survives offline periods and reboots)
+UPLOAD_QUEUE_PATH = config("UPLOAD_QUEUE_PATH", default="upload_queue.sqlite3")
+UPLOAD_BATCH_SIZE = config("UPLOAD_BATCH_SIZE", default=100, cast=int)
+UPLOAD_RETRIES = config("UPLOAD_RETRIES", default=3, cast=int)      # Per request, before queue backoff
+UPLOAD_GZIP = config("UPLOAD_GZIP", default=True, cast=bool)        # Compress batch bodies
+UPLOAD_HTTP2 = config("UPLOAD_HTTP2", default=False, cast=bool)     # Needs httpx[http2]
+scan_queue = ScanQueue(UPLOAD_QUEUE_PATH)
+upload_session = UploadSession(API_KEY, timeout=10, retries=UPLOAD_RETRIES,
+                               compress=UPLOAD_GZIP, http2=UPLOAD_HTTP2)
+uploader = ScanUploader(scan_queue, DJANGO_SERVER_URL, upload_session, batch_size=UPLOAD_BATCH_SIZE)
+
 # ---------------- GLOBALS -----------------
 app = Flask(__name__)
 current_frame = None
@@ -134,53 +145,19 @@ def classify_frame_local(frame):
         print("Classification error:", e, file=sys.stderr)
 
 def send_to_django(nfc_uid, category, confidence):
-    """Send classification result to Django with API key authentication"""
+    """
+    Queue a classification result for upload to Django.
+    
+    Only writes to the local queue (never blocks the NFC loop on the network);
+    the uploader thread sends it with the scan time, retrying until it gets through.
+    """
     try:
-        headers = {
-            "Content-Type": "application/json",
-            "X-API-Key": API_KEY
-        }
-        
-        # Send NFC UID directly, not a hash!
-        data = {
-            'nfc_uid': str(nfc_uid),  # ← Send actual UID
-            'category': category,
-            'confidence': confidence
-        }
-        
-        response = requests.post(
-            f"{DJANGO_SERVER_URL}/api/update/",
-            json=data,
-            headers=headers,
-            timeout=10,
-            verify=True
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            print(f"✅ Sent to Django successfully!")
-            print(f"   Bin ID: {result.get('trashcan_id', 'unknown')}")
-            print(f"   NFC UID: {result.get('nfc_uid', 'unknown')}")
-            print(f"   Device: {result.get('device', 'unknown')}")
-            print(f"   Message: {result.get('message', 'OK')}")
-            return True
-        elif response.status_code == 401:
-            print("❌ Authentication failed: Missing API key", file=sys.stderr)
-            return False
-        elif response.status_code == 403:
-            print("❌ Access denied: Invalid or inactive API key", file=sys.stderr)
-            return False
-        elif response.status_code == 404:
-            error_data = response.json()
-            print(f"❌ {error_data.get('error', 'Bin not found')}", file=sys.stderr)
-            print(f"   Hint: {error_data.get('hint', 'Register this NFC tag first')}", file=sys.stderr)
-            return False
-        else:
-            print(f"❌ Server error: {response.status_code}", file=sys.stderr)
-            return False
-            
+        scan_queue.put(nfc_uid, category, confidence)
+        uploader.notify()
+        print(f"📥 Scan queued for upload ({len(scan_queue)} pending)")
+        return True
     except Exception as e:
-        print(f"❌ Failed to send: {e}", file=sys.stderr)
+        print(f"❌ Failed to queue scan: {e}", file=sys.stderr)
         return False
 
 def classifier_loop():
@@ -446,8 +423,13 @@ def api_status():
 
 @app.route('/api/nfc_status')
 def api_nfc_status():
-    """Return current NFC tag status"""
-    return jsonify(nfc_last_tag)
+    """Return current NFC tag status ("sent" = queued for upload)"""
+    return jsonify({**nfc_last_tag, "upload_queue": scan_queue.stats()})
+
+@app.route('/api/uploader_stats')
+def api_uploader_stats():
+    """Upload queue and network cost (latency, connections opened, bytes on the wire)"""
+    return jsonify(uploader.stats())
 
 @app.route('/api/classify')
 def api_classify():
@@ -637,6 +619,7 @@ if __name__ == "__main__":
     print("=" * 70)
     print(f"📡 Django Server: {DJANGO_SERVER_URL}")
     print(f"🎯 Confidence Threshold: {CONFIDENCE_THRESHOLD}%")
+    print(f"📥 Upload queue: {UPLOAD_QUEUE_PATH} ({len(scan_queue)} pending)")
     
     # Initialize NFC reader
     nfc_reader = init_nfc_reader()
@@ -657,6 +640,7 @@ if __name__ == "__main__":
     threading.Thread(target=classifier_loop, daemon=True).start()
     threading.Thread(target=inference_worker, daemon=True).start()
     threading.Thread(target=encoder_loop, daemon=True).start()
+    uploader.start()
     
     # Start NFC background thread if reader was initialized
     if nfc_reader is not None:
@@ -0,0 +1,360 @@
+"""
+Store-and-forward queue for NFC collection scans.
+
+The NFC loop only appends a scan to a local SQLite file, which takes a few
+milliseconds and never touches the network. A background ScanUploader
+thread drains the queue in batches to Django's /api/update/batch/ endpoint
+with retries and exponential backoff. Scans survive network drops and
+reboots; every scan carries the time it happened, so late uploads land at
+the right point in the bin's history (the server ignores duplicates, so a
+batch can safely be resent after a lost response).
+
+Uploads go through one long-lived UploadSession, so the TCP + TLS handshake
+over the cellular link is paid once per connection instead of per scan.
+"""
+import gzip
+import json
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx  # Optional, only for HTTP/2 (pip install "httpx[http2]")
+except ImportError:
+    httpx = None
+
+
+class ScanQueue:
+    """Durable FIFO of pending scans in a SQLite file (safe to share between threads)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL keeps appends cheap; FULL sync so a power cut (truck ignition off) loses nothing
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        # Scans the server rejected for good (e.g. unregistered tag), kept for inspection
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS rejected_scans (
+                id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                error TEXT
+            )
+        """)
+
+    def put(self, nfc_uid, category, confidence, timestamp=None):
+        """Append a scan; returns its queue id"""
+        now = time.time()
+        scan = {
+            'nfc_uid': str(nfc_uid),
+            'category': category,
+            'confidence': confidence,
+            'timestamp': datetime.fromtimestamp(timestamp or now, tz=timezone.utc).isoformat(),
+        }
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO scans (payload, created_at) VALUES (?, ?)", (json.dumps(scan), now)
+            )
+        return cursor.lastrowid
+
+    def peek(self, limit):
+        """Oldest pending scans as [(id, scan)] without removing them"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, payload FROM scans ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(scan_id, json.loads(payload)) for scan_id, payload in rows]
+
+    def ack(self, ids):
+        """Remove uploaded scans"""
+        if not ids:
+            return
+        with self.lock:
+            self.db.executemany("DELETE FROM scans WHERE id = ?", [(i,) for i in ids])
+
+    def retry_later(self, ids, error):
+        """Keep scans queued, remembering why the upload failed"""
+        if not ids:
+            return
+        with self.lock:
+            self.db.executemany(
+                "UPDATE scans SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                [(str(error), i) for i in ids]
+            )
+
+    def reject(self, rejected):
+        """Move scans the server refused for good: [(id, error)]"""
+        if not rejected:
+            return
+        with self.lock:
+            self.db.execute("BEGIN")
+            for scan_id, error in rejected:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO rejected_scans (id, payload, created_at, error) "
+                    "SELECT id, payload, created_at, ? FROM scans WHERE id = ?", (str(error), scan_id)
+                )
+                self.db.execute("DELETE FROM scans WHERE id = ?", (scan_id,))
+            self.db.execute("COMMIT")
+
+    def stats(self):
+        with self.lock:
+            pending, oldest = self.db.execute("SELECT count(*), min(created_at) FROM scans").fetchone()
+            rejected = self.db.execute("SELECT count(*) FROM rejected_scans").fetchone()[0]
+        return {
+            'pending': pending,
+            'oldest_pending_age': round(time.time() - oldest, 1) if oldest else 0,
+            'rejected': rejected,
+        }
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT count(*) FROM scans").fetchone()[0]
+
+
+class UploadSession:
+    """
+    Pooled keep-alive HTTP client for the uploader.
+
+    requests.Session with a small connection pool and a urllib3 retry policy
+    for transient failures (connection resets, 502/503/504). Optionally
+    gzips request bodies and/or uses HTTP/2 through httpx when installed.
+    Keeps latency and connection counters for /api/uploader_stats.
+    """
+
+    GZIP_MIN_BYTES = 1024  # Smaller bodies aren't worth compressing
+
+    def __init__(self, api_key, timeout=10, retries=3, backoff_factor=0.5,
+                 compress=False, http2=False, pool_size=2):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=100)
+        self.counters = {'requests': 0, 'errors': 0, 'bytes_raw': 0, 'bytes_sent': 0}
+
+        self.http2 = bool(http2 and httpx is not None)
+        if http2 and not self.http2:
+            print("⚠️  HTTP/2 requested but httpx is not installed, using HTTP/1.1 keep-alive", file=sys.stderr)
+
+        if self.http2:
+            self.client = httpx.Client(
+                http2=True,
+                timeout=timeout,
+                transport=httpx.HTTPTransport(http2=True, retries=retries),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        else:
+            retry = Retry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({'POST'}),  # Safe: the server ignores duplicate scans
+                raise_on_status=False,
+            )
+            self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+            self.client = requests.Session()
+            self.client.mount('https://', self.adapter)
+            self.client.mount('http://', self.adapter)
+
+    def post_json(self, url, payload):
+        """POST a JSON body; returns (status_code, parsed JSON or None). Raises on network errors."""
+        body = json.dumps(payload).encode('utf-8')
+        headers = {"Content-Type": "application/json", "X-API-Key": self.api_key}
+        raw_size = len(body)
+        if self.compress and raw_size >= self.GZIP_MIN_BYTES:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        start = time.perf_counter()
+        try:
+            response = self.client.post(url, content=body, headers=headers) if self.http2 else \
+                self.client.post(url, data=body, headers=headers, timeout=self.timeout, verify=True)
+        except Exception:
+            with self.lock:
+                self.counters['errors'] += 1
+            raise
+        latency = time.perf_counter() - start
+
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['bytes_raw'] += raw_size
+            self.counters['bytes_sent'] += len(body)
+            self.latencies.append(latency)
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        return response.status_code, data
+
+    def new_connections(self):
+        """TCP/TLS connections opened so far (None when unknown, e.g. HTTP/2 via httpx)"""
+        if self.http2:
+            return None
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            last = self.latencies[-1] if self.latencies else None
+            latencies = sorted(self.latencies)
+        connections = self.new_connections()
+        requests_made = counters['requests']
+        return {
+            **counters,
+            'protocol': 'HTTP/2' if self.http2 else 'HTTP/1.1 keep-alive',
+            'gzip': self.compress,
+            'new_connections': connections,
+            'requests_per_connection': round(requests_made / connections, 1) if connections else None,
+            'latency_ms': {
+                'last': round(last * 1000, 1) if last is not None else None,
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                'max': round(latencies[-1] * 1000, 1) if latencies else None,
+                'samples': len(latencies),
+            },
+        }
+
+    def close(self):
+        self.client.close()
+
+
+# Backoff doubles at most this many times (2.0s x 2**16 is far above any backoff_max)
+MAX_BACKOFF_EXPONENT = 16
+
+
+class ScanUploader(threading.Thread):
+    """Background thread that uploads queued scans in batches with exponential backoff."""
+
+    def __init__(self, scan_queue, server_url, session, batch_size=100,
+                 backoff_base=2.0, backoff_max=300.0, idle_interval=30.0):
+        super().__init__(daemon=True, name="scan-uploader")
+        self.queue = scan_queue
+        self.url = f"{server_url.rstrip('/')}/api/update/batch/"
+        self.session = session
+        self.batch_size = batch_size
+        self.max_batch_size = batch_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_interval = idle_interval
+        self.failures = 0
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.last_success = None
+        self.last_error = None
+
+    def notify(self):
+        """Wake the uploader right away (called after enqueueing a scan)"""
+        self.wakeup.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+
+    def backoff_delay(self):
+        """Exponential backoff with jitter so a fleet of trucks doesn't retry in lockstep"""
+        # Capped exponent: days offline must not overflow the float conversion
+        exponent = min(max(self.failures - 1, 0), MAX_BACKOFF_EXPONENT)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** exponent))
+        return delay * random.uniform(0.5, 1.0)
+
+    def run(self):
+        while not self.stopped.is_set():
+            # Nothing may end the thread: scans would pile up until a restart
+            try:
+                try:
+                    uploaded = self.upload_batch()
+                except Exception as e:
+                    print(f"⚠️  Uploader error: {e}", file=sys.stderr)
+                    uploaded = None
+
+                if uploaded is None:
+                    # Failed: back off (an enqueue doesn't cut the wait short)
+                    self.failures += 1
+                    self.stopped.wait(self.backoff_delay())
+                elif uploaded == 0:
+                    # Queue empty: sleep until a scan arrives
+                    self.wakeup.wait(self.idle_interval)
+                    self.wakeup.clear()
+                # Otherwise keep draining
+            except Exception as e:
+                print(f"⚠️  Uploader loop error: {e}", file=sys.stderr)
+                self.stopped.wait(self.backoff_max)
+
+    def upload_batch(self):
+        """
+        Upload one batch. Returns the number of scans handled (0 if the queue
+        is empty) or None if the upload failed and should be retried later.
+        """
+        batch = self.queue.peek(self.batch_size)
+        if not batch:
+            return 0
+        ids = [scan_id for scan_id, _ in batch]
+
+        try:
+            status, data = self.session.post_json(self.url, {'scans': [scan for _, scan in batch]})
+        except Exception as e:
+            return self.failed(ids, f"network: {e}")
+
+        if status == 413 and self.batch_size > 1:
+            self.batch_size = max(1, self.batch_size // 2)
+            return self.failed(ids, "batch too large")
+        if status != 200 or data is None:
+            # 401/403 (key revoked), 429 and 5xx are all worth retrying later
+            return self.failed(ids, f"HTTP {status}")
+
+        results = data.get('results', [])
+        done, rejected = [], []
+        for scan_id, result in zip(ids, results):
+            if result.get('success'):
+                done.append(scan_id)
+            else:
+                rejected.append((scan_id, result.get('error', 'rejected')))
+                print(f"❌ Scan rejected by server: {result.get('error')}", file=sys.stderr)
+
+        self.queue.ack(done)
+        self.queue.reject(rejected)
+        self.failures = 0
+        self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+        self.last_success = time.time()
+        print(f"✅ Uploaded {len(done)} scan(s), {len(self.queue)} pending")
+        return len(batch)
+
+    def stats(self):
+        return {
+            'queue': self.queue.stats(),
+            'batch_size': self.batch_size,
+            'consecutive_failures': self.failures,
+            'last_success': datetime.fromtimestamp(self.last_success, tz=timezone.utc).isoformat()
+                            if self.last_success else None,
+            'last_error': self.last_error,
+            'network': self.session.stats(),
+        }
+
+    def failed(self, ids, error):
+        self.queue.retry_later(ids, error)
+        self.last_error = error
+        print(f"⚠️  Upload failed ({error}), {len(ids)} scan(s) kept in queue", file=sys.stderr)
+        return None